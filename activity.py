@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import ACTIVITY_FLUSH_INTERVAL, ACTIVITY_FLUSH_BATCH
+from db_connection import touch_users_activity
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker(BaseMiddleware):
+    """
+    Внешний middleware диспетчера: запоминает в памяти, когда пользователь
+    последний раз писал боту, и периодически сохраняет накопленное в users.last_activity
+    пачками по ACTIVITY_FLUSH_BATCH — один UPDATE на пачку вместо записи на каждое сообщение.
+    """
+
+    def __init__(self):
+        self._touches: dict[int, datetime] = {}
+
+    def touch(self, user_id: int) -> None:
+        self._touches[user_id] = datetime.now()
+
+    async def flush(self) -> None:
+        """Сохраняет накопленные отметки. При ошибке они вернутся в очередь до следующей попытки"""
+        if not self._touches:
+            return
+        touches, self._touches = self._touches, {}
+        items = list(touches.items())
+        for i in range(0, len(items), ACTIVITY_FLUSH_BATCH):
+            chunk = dict(items[i:i + ACTIVITY_FLUSH_BATCH])
+            try:
+                await asyncio.to_thread(touch_users_activity, chunk)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить активность {len(chunk)} пользователей: {e}")
+                # Более свежие отметки, пришедшие за время записи, не перезаписываем
+                for user_id, moment in chunk.items():
+                    self._touches.setdefault(user_id, moment)
+
+    async def run_flusher(self) -> None:
+        """Фоновая задача: записывает активность раз в ACTIVITY_FLUSH_INTERVAL"""
+        try:
+            while True:
+                await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+                await self.flush()
+        finally:
+            # При остановке сохраняем последние отметки
+            await self.flush()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            self.touch(user.id)
+        return await handler(event, data)
+
+
+activity_tracker = ActivityTracker()
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import (
+    Table, Column, Index, MetaData, BigInteger, Integer, DateTime, Boolean, JSON,
+    select, insert, update, delete, inspect, text, union_all, literal
+)
+
+from channels import Channel, get_channel
+from config import JOB_RETENTION_DAYS, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE, ARCHIVE_DELETE_ATTEMPTS
+from db_base import SessionLocal, engine, serialized_write
+from dedup import prune_fingerprints
+from models import Job
+from search import vacancy_index
+
+logger = logging.getLogger(__name__)
+
+# Холодное хранилище вакансий.
+# В Postgres это секционированная по месяцам таблица jobs_archive (PARTITION BY RANGE),
+# в SQLite/MySQL — отдельная таблица на каждый месяц: jobs_archive_YYYYMM.
+ARCHIVE_PREFIX = "jobs_archive"
+DELETE_CHUNK = 100  # максимум сообщений в одном вызове deleteMessages
+
+archive_metadata = MetaData()
+_ready_tables: set[str] = set()
+
+
+def _archive_columns() -> list[Column]:
+    return [
+        Column("id", BigInteger, primary_key=True, autoincrement=False),
+        Column("created_at", DateTime(timezone=True), primary_key=True),
+        Column("user_id", BigInteger, nullable=False),
+        Column("message_id", BigInteger, nullable=False),
+        Column("channel_id", BigInteger, nullable=True),  # канал с постом; None — основной CHANNEL_ID
+        Column("all_info", JSON, nullable=False),
+        Column("archived_at", DateTime(timezone=True), nullable=False),
+        Column("channel_deleted", Boolean, nullable=False, default=False),
+        Column("delete_attempts", Integer, nullable=False, default=0),  # попытки удалить пост из канала
+    ]
+
+
+def _table(name: str, **kwargs) -> Table:
+    """Описание архивной таблицы (создается в базе отдельно, в _archive_table)"""
+    table = archive_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, archive_metadata, *_archive_columns(),
+            # Посты, которые не удалось удалить из канала, повторно ищутся по этому индексу
+            Index(f"ix_{name}_channel_deleted", "channel_deleted", "delete_attempts"),
+            **kwargs
+        )
+    return table
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _archive_table(conn, period_start: datetime, created: set[str]) -> Table:
+    """
+    Возвращает таблицу, в которую нужно писать вакансии за указанный месяц,
+    создавая ее (или секцию в Postgres) при первом обращении — в транзакции conn,
+    вместе с самим переносом. Имена созданных таблиц добавляются в created.
+    """
+    if _is_postgres():
+        table = _table(ARCHIVE_PREFIX, postgresql_partition_by="RANGE (created_at)")
+        partition = f"{ARCHIVE_PREFIX}_{period_start:%Y%m}"
+        if partition not in _ready_tables and partition not in created:
+            next_start = _month_start(period_start + timedelta(days=32))
+            table.create(conn, checkfirst=True)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {ARCHIVE_PREFIX} "
+                f"FOR VALUES FROM ('{period_start:%Y-%m-%d}') TO ('{next_start:%Y-%m-%d}')"
+            ))
+            created.add(partition)
+        return table
+
+    name = f"{ARCHIVE_PREFIX}_{period_start:%Y%m}"
+    table = _table(name)
+    if name not in _ready_tables and name not in created:
+        table.create(conn, checkfirst=True)
+        created.add(name)
+    return table
+
+
+def _load_expired_batch(cutoff: datetime, limit: int) -> list[dict]:
+    """Самые старые вакансии, срок хранения которых истек (диапазон по индексу created_at)"""
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(Job.id, Job.user_id, Job.message_id, Job.channel_id, Job.all_info, Job.created_at)
+            .where(Job.created_at < cutoff, Job.message_id.isnot(None))
+            .order_by(Job.created_at)
+            .limit(limit)
+        ).all()
+    return [row._asdict() for row in rows]
+
+
+@serialized_write
+def _write_archive(rows: list[dict], deleted_message_ids: set[tuple[int | None, int]]) -> set[str]:
+    """Переносит вакансии в архив и удаляет их из jobs одной транзакцией. Возвращает созданные таблицы"""
+    archived_at = datetime.now()
+    created: set[str] = set()
+    by_table: dict[str, tuple[Table, list[dict]]] = {}
+    with SessionLocal() as session:
+        conn = session.connection()
+        for row in rows:
+            created_at = row["created_at"] or archived_at
+            table = _archive_table(conn, _month_start(created_at), created)
+            by_table.setdefault(table.name, (table, []))[1].append({
+                **row,
+                "created_at": created_at,
+                "archived_at": archived_at,
+                "channel_deleted": (row["channel_id"], row["message_id"]) in deleted_message_ids,
+                "delete_attempts": 1,
+            })
+
+        for table, items in by_table.values():
+            session.execute(insert(table), items)
+        # Счетчики вакансий у пользователей не уменьшаются: архивная вакансия
+        # по-прежнему считается опубликованной (правило первой бесплатной публикации)
+        session.execute(delete(Job).where(Job.id.in_([row["id"] for row in rows])))
+        session.commit()
+    return created
+
+
+def _move_to_archive(rows: list[dict], deleted_message_ids: set[tuple[int | None, int]]) -> None:
+    """Переносит вакансии в архив. Таблицы считаются готовыми только после commit: при откате их не будет"""
+    _ready_tables.update(_write_archive(rows, deleted_message_ids))
+
+
+async def _delete_channel_messages(bot: Bot, channel: Channel, message_ids: list[int]) -> set[int]:
+    """
+    Удаляет сообщения из канала пачками по DELETE_CHUNK с ограничением частоты этого канала.
+    Возвращает множество message_id, которые удалось удалить.
+    """
+    deleted = set()
+    for i in range(0, len(message_ids), DELETE_CHUNK):
+        chunk = message_ids[i:i + DELETE_CHUNK]
+        while True:
+            await channel.delete_limiter.acquire()
+            try:
+                await bot.delete_messages(chat_id=channel.chat_id, message_ids=chunk)
+                deleted.update(chunk)
+                break
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood control при удалении сообщений, ждем {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                # Например, нет прав на удаление — вакансии все равно уходят в архив
+                # с channel_deleted = False, удаление повторит retry_channel_deletes
+                logger.error(f"Не удалось удалить сообщения из канала {channel.chat_id}: {e}")
+                break
+    return deleted
+
+
+async def _delete_posts(bot: Bot, rows: list[dict]) -> set[tuple[int | None, int]]:
+    """Удаляет посты вакансий из их каналов (каналы параллельно). Возвращает (channel_id, message_id) удаленных"""
+    by_channel: dict[int | None, list[int]] = {}
+    for row in rows:
+        by_channel.setdefault(row["channel_id"], []).append(row["message_id"])
+
+    channel_ids = list(by_channel)
+    results = await asyncio.gather(*(
+        _delete_channel_messages(bot, get_channel(channel_id), by_channel[channel_id])
+        for channel_id in channel_ids
+    ))
+    return {
+        (channel_id, message_id)
+        for channel_id, deleted in zip(channel_ids, results)
+        for message_id in deleted
+    }
+
+
+async def archive_expired_jobs(bot: Bot) -> int:
+    """
+    Один проход архиватора. Сначала удаляет посты из канала, затем переносит
+    строки в архив: если бот упадет между шагами, вакансии останутся в jobs
+    и будут обработаны повторно (повторное удаление постов безопасно).
+    """
+    cutoff = datetime.now() - timedelta(days=JOB_RETENTION_DAYS)
+    total = 0
+    while True:
+        rows = await asyncio.to_thread(_load_expired_batch, cutoff, ARCHIVE_BATCH_SIZE)
+        if not rows:
+            break
+
+        deleted = await _delete_posts(bot, rows)
+        await asyncio.to_thread(_move_to_archive, rows, deleted)
+        vacancy_index.remove_many(row["id"] for row in rows)
+        total += len(rows)
+
+        if len(rows) < ARCHIVE_BATCH_SIZE:
+            break
+    return total
+
+
+def _archive_tables() -> list[Table]:
+    """Существующие архивные таблицы (в Postgres — одна секционированная)"""
+    names = set(inspect(engine).get_table_names())
+    if _is_postgres():
+        return [_table(ARCHIVE_PREFIX, postgresql_partition_by="RANGE (created_at)")] if ARCHIVE_PREFIX in names else []
+    return [
+        _table(name) for name in sorted(names)
+        if name.startswith(f"{ARCHIVE_PREFIX}_") and name[len(ARCHIVE_PREFIX) + 1:].isdigit()
+    ]
+
+
+def _load_undeleted_posts(limit: int) -> list[dict]:
+    """Архивные вакансии, пост которых остался в канале и попытки удалить его еще не исчерпаны"""
+    tables = _archive_tables()
+    if not tables:
+        return []
+    query = union_all(*(
+        select(literal(table.name).label("table"), table.c.id, table.c.channel_id, table.c.message_id)
+        .where(table.c.channel_deleted == False, table.c.delete_attempts < ARCHIVE_DELETE_ATTEMPTS)
+        for table in tables
+    )).limit(limit)
+    with SessionLocal() as session:
+        return [row._asdict() for row in session.execute(query).all()]
+
+
+@serialized_write
+def _mark_deleted_posts(rows: list[dict], deleted_message_ids: set[tuple[int | None, int]]) -> None:
+    """Отмечает удаленные посты архивных вакансий, остальным засчитывает неудачную попытку"""
+    by_table: dict[str, tuple[list[int], list[int]]] = {}
+    for row in rows:
+        done, failed = by_table.setdefault(row["table"], ([], []))
+        (done if (row["channel_id"], row["message_id"]) in deleted_message_ids else failed).append(row["id"])
+    with SessionLocal() as session:
+        for name, (done, failed) in by_table.items():
+            table = archive_metadata.tables[name]
+            if done:
+                session.execute(update(table).where(table.c.id.in_(done)).values(
+                    channel_deleted=True, delete_attempts=table.c.delete_attempts + 1
+                ))
+            if failed:
+                session.execute(update(table).where(table.c.id.in_(failed)).values(
+                    delete_attempts=table.c.delete_attempts + 1
+                ))
+        session.commit()
+
+
+async def retry_channel_deletes(bot: Bot) -> int:
+    """
+    Повторно удаляет из каналов посты вакансий, ушедших в архив без удаления
+    поста (channel_deleted = False), — не больше ARCHIVE_DELETE_ATTEMPTS попыток
+    на пост и ARCHIVE_BATCH_SIZE постов за проход. Возвращает число удаленных.
+    """
+    rows = await asyncio.to_thread(_load_undeleted_posts, ARCHIVE_BATCH_SIZE)
+    if not rows:
+        return 0
+    deleted = await _delete_posts(bot, rows)
+    await asyncio.to_thread(_mark_deleted_posts, rows, deleted)
+    return len(deleted)
+
+
+async def run_archiver(bot: Bot):
+    """
+    Фоновая задача: периодически переносит старые вакансии в архив
+    и удаляет устаревшие отпечатки для поиска дублей
+    """
+    if JOB_RETENTION_DAYS <= 0:
+        logger.info("Архивирование вакансий отключено (JOB_RETENTION_DAYS=0)")
+
+    while True:
+        try:
+            if JOB_RETENTION_DAYS > 0:
+                archived = await archive_expired_jobs(bot)
+                if archived:
+                    logger.info(f"Перенесено в архив вакансий: {archived}")
+                removed = await retry_channel_deletes(bot)
+                if removed:
+                    logger.info(f"Удалено из каналов постов архивных вакансий: {removed}")
+            pruned = await asyncio.to_thread(prune_fingerprints)
+            if pruned:
+                logger.info(f"Удалено устаревших отпечатков вакансий: {pruned}")
+        except Exception as e:
+            logger.error(f"Ошибка архиватора вакансий: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
@@ -0,0 +1,248 @@
+"""
+Бенчмарк запросов бота на большой базе: каждый запрос из db_connection.py,
+handlers.py и фоновых задач выполняется несколько раз, для него снимается
+план (EXPLAIN) и время. Полные проходы по таблице на горячих путях
+(запросы на каждое сообщение или нажатие кнопки) помечаются отдельно —
+и по самой таблице, и по всему индексу.
+
+Запуск (базу удобно заполнить через gen_dataset.py):
+    python bench_queries.py --database-url sqlite:///bench.db [--repeat 20] [--output plans.txt]
+
+С --fail-on-scan скрипт завершается с кодом 1, если на горячем пути есть полный проход.
+Все запросы только читают данные.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN (FORMAT JSON) ",
+    "mysql": "EXPLAIN ",
+}
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+SQLITE_INDEX_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)? USING (?:COVERING )?INDEX")
+
+
+def _explain_hook(conn, cursor, statement, parameters, context, executemany):
+    """Подменяет запрос на EXPLAIN, пока в conn.info выставлен префикс"""
+    prefix = conn.info.get("explain_prefix")
+    if prefix:
+        statement = prefix + statement
+    return statement, parameters
+
+
+def _pg_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _pg_nodes(child)
+
+
+def explain(conn, stmt) -> tuple[list[str], list[str], list[str]]:
+    """План запроса: (строки плана, таблицы с полным проходом, таблицы с полным проходом по индексу)"""
+    dialect = conn.dialect.name
+    conn.info["explain_prefix"] = EXPLAIN_PREFIX[dialect]
+    try:
+        # Колонки плана не совпадают с колонками запроса — читаем строки курсора напрямую
+        result = conn.execute(stmt)
+        names = [column[0] for column in result.cursor.description]
+        rows = result.cursor.fetchall()
+        result.close()
+    finally:
+        conn.info.pop("explain_prefix", None)
+
+    lines, scans, index_scans = [], [], []
+    if dialect == "sqlite":
+        # (id, parent, notused, detail); вложенность показываем отступом
+        depth = {0: -1}
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+            if match := SQLITE_SCAN.match(detail):
+                scans.append(match.group(1))
+            elif match := SQLITE_INDEX_SCAN.match(detail):
+                index_scans.append(match.group(1))
+    elif dialect == "postgresql":
+        plan = rows[0][0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        for node in _pg_nodes(plan[0]["Plan"]):
+            relation = node.get("Relation Name")
+            lines.append(f"{node['Node Type']}" + (f" on {relation}" if relation else "")
+                         + (f" using {node['Index Name']}" if "Index Name" in node else ""))
+            if node["Node Type"] == "Seq Scan":
+                scans.append(relation)
+    else:
+        for row in rows:
+            row = dict(zip(names, row))
+            lines.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+            if row.get("type") == "ALL":
+                scans.append(row.get("table"))
+            elif row.get("type") == "index":
+                index_scans.append(row.get("table"))
+    return lines, scans, index_scans
+
+
+def measure(conn, stmt, repeat: int) -> tuple[float, float, int]:
+    """Медиана и p95 времени выполнения в мс, число строк результата"""
+    timings = []
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(conn.execute(stmt).all())
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))], count
+
+
+def pick_params(conn) -> dict:
+    """Параметры запросов: самый активный работодатель, обычный пользователь и одна из вакансий"""
+    from sqlalchemy import select, func
+    from models import User, Job
+
+    heavy = conn.execute(
+        select(Job.user_id).group_by(Job.user_id).order_by(func.count(Job.id).desc()).limit(1)
+    ).scalar()
+    low, high = conn.execute(select(func.min(User.id), func.max(User.id))).one()
+    if heavy is None or low is None:
+        sys.exit("В базе нет пользователей или вакансий — заполните ее через gen_dataset.py")
+    typical = conn.execute(
+        select(User.telegram_id).where(User.id >= random.randint(low, high)).order_by(User.id).limit(1)
+    ).scalar()
+    job_id = conn.execute(select(Job.id).where(Job.user_id == heavy).limit(1)).scalar()
+    username = conn.execute(
+        select(User.username).where(User.username.isnot(None), User.id >= random.randint(low, high))
+        .order_by(User.id).limit(1)
+    ).scalar()
+    return {"heavy": heavy, "typical": typical, "job_id": job_id, "username": username or ""}
+
+
+def build_queries(params: dict) -> list[tuple[str, bool, object]]:
+    """(название, горячий путь, запрос) — в том виде, в каком их выполняет бот"""
+    from sqlalchemy import select, func
+    from models import User, Job, PublishTask
+
+    now = datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    heavy, typical, job_id = params["heavy"], params["typical"], params["job_id"]
+    return [
+        # Каждое сообщение и нажатие кнопки
+        ("пользователь по telegram_id", True, select(User).where(User.telegram_id == typical).limit(1)),
+        ("проверка спама за 5 минут", True, select(User.last_post_at).where(User.telegram_id == heavy)),
+        ("мои вакансии (активный)", True,
+         select(Job).where(Job.user_id == heavy).order_by(Job.created_at.desc())),
+        ("мои вакансии (обычный)", True,
+         select(Job).where(Job.user_id == typical).order_by(Job.created_at.desc())),
+        ("вакансия автора по id", True, select(Job).where(Job.id == job_id, Job.user_id == heavy).limit(1)),
+        ("ожидающие публикации автора", True, select(PublishTask).where(
+            PublishTask.user_id == heavy, PublishTask.status.in_(["pending", "sending"])
+        ).order_by(PublishTask.publish_at)),
+        ("участник вышел: пригласивший", True,
+         select(User).where(User.invites > 0).order_by(User.invites.desc()).limit(1)),
+        # Публикатор, архиватор, подписки
+        ("очередь: задачи к публикации", True, select(
+            PublishTask.id, PublishTask.job_id, PublishTask.user_id, PublishTask.all_info,
+            PublishTask.attempts, PublishTask.notify_user
+        ).where(PublishTask.status == "pending", PublishTask.publish_at <= now)
+         .order_by(PublishTask.publish_at, PublishTask.id).limit(20)),
+        ("очередь: ближайшая публикация", True,
+         select(func.min(PublishTask.publish_at)).where(PublishTask.status == "pending")),
+        ("пост вакансии", True, select(Job.message_id, Job.channel_id).where(Job.id == job_id)),
+        ("архив: истекшие вакансии", True, select(
+            Job.id, Job.user_id, Job.message_id, Job.channel_id, Job.all_info, Job.created_at
+        ).where(Job.created_at < now - timedelta(days=30), Job.message_id.isnot(None))
+         .order_by(Job.created_at).limit(500)),
+        ("подписки: скоро истекают", True, select(User.telegram_id, User.can_post_until).where(
+            User.can_post_until > now, User.can_post_until <= now + timedelta(days=1),
+            (User.expiry_notified_until.is_(None)) | (User.expiry_notified_until != User.can_post_until)
+        ).order_by(User.can_post_until).limit(500)),
+        ("подписки: истекшие", True,
+         select(User.telegram_id).where(User.can_post_until <= now).limit(500)),
+        # Команды админов и запуск
+        ("пользователь по username", False,
+         select(User).where(User.username == params["username"]).limit(1)),
+        ("/stats: пользователи", False, select(func.count(User.id))),
+        ("/stats: активны сегодня", False, select(func.count(User.id)).where(User.last_activity >= today)),
+        ("/stats: вакансии", False, select(func.count(Job.id))),
+        ("/stats: подписки", False, select(func.count(User.id)).where(User.can_post_until > now)),
+        ("/stats: без ограничений", False, select(func.count(User.id)).where(User.can_post == True)),
+        ("статистика за день: вакансии", False, select(func.count(Job.id)).where(Job.created_at >= today)),
+        ("статистика за день: пользователи", False, select(func.count(User.id)).where(User.created_at >= today)),
+        ("запуск: зависшие публикации", False, select(
+            PublishTask.id, PublishTask.job_id, PublishTask.message_id, PublishTask.channel_id
+        ).where(PublishTask.status == "sending")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Планы и время запросов бота")
+    parser.add_argument("--database-url", required=True, help="например sqlite:///bench.db")
+    parser.add_argument("--repeat", type=int, default=20, help="сколько раз выполнить каждый запрос")
+    parser.add_argument("--output", help="файл для отчета (кроме вывода в консоль)")
+    parser.add_argument("--fail-on-scan", action="store_true",
+                        help="код выхода 1, если на горячем пути есть полный проход по таблице")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    random.seed(args.seed)
+
+    from sqlalchemy import event, make_url
+    from db_base import engine
+
+    # При ошибке подключения db_base молча переключается на bot_database.db
+    if engine.url != make_url(args.database_url):
+        sys.exit(f"Не удалось подключиться к {make_url(args.database_url)!r}")
+    if engine.dialect.name not in EXPLAIN_PREFIX:
+        sys.exit(f"EXPLAIN для {engine.dialect.name} не поддерживается")
+    event.listen(engine, "before_cursor_execute", _explain_hook, retval=True)
+
+    report = []
+    flagged = []
+    with engine.connect() as conn:
+        params = pick_params(conn)
+        report.append(f"База: {make_url(args.database_url)!r}, параметры: {params}")
+        report.append(f"{'запрос':<40} {'hot':>3} {'median':>9} {'p95':>9} {'rows':>7}  план")
+        details = []
+        for name, hot, stmt in build_queries(params):
+            lines, scans, index_scans = explain(conn, stmt)
+            median, p95, rows = measure(conn, stmt, args.repeat)
+            verdict = []
+            if scans:
+                verdict.append("SEQ SCAN " + ",".join(scans))
+            if index_scans:
+                verdict.append("full index " + ",".join(index_scans))
+            # Полный проход по индексу (например, по created_at ради сортировки) на большой
+            # таблице обходится не дешевле полного прохода по самой таблице
+            full = scans + index_scans
+            mark = "!" if hot and full else " "
+            if hot and full:
+                flagged.append(f"{name}: полный проход по {', '.join(full)}")
+            report.append(f"{name:<40} {'да' if hot else '':>3} {median:>7.2f}ms {p95:>7.2f}ms {rows:>7} {mark}"
+                          f"{'; '.join(verdict) or 'ok'}")
+            details.append(f"\n{name}:\n" + "\n".join("    " + line for line in lines))
+        conn.rollback()
+
+    report.extend(details)
+    if flagged:
+        report.append("\nПолные проходы по таблицам на горячих путях:")
+        report.extend("  " + item for item in flagged)
+    else:
+        report.append("\nПолных проходов на горячих путях нет")
+
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if flagged and args.fail_on_scan:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Бенчмарк режима SQLite: стандартная настройка (журнал отката, запись из
+каждого потока) против WAL + прагмы + один поток-писатель + пул читателей.
+
+Запуск:
+    python bench_sqlite.py [--writers 8] [--readers 8] [--seconds 10]
+
+Каждый сценарий работает с отдельным временным файлом базы. Писатели
+имитируют постановку вакансии в очередь (вставка + обновление счетчика
+в одной транзакции), читатели — "Мои вакансии" и проверку прав.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import (
+    create_engine, MetaData, Table, Column, Integer, BigInteger, DateTime, JSON,
+    select, insert, update, func
+)
+from sqlalchemy.exc import OperationalError
+
+from sqlite_backend import configure_sqlite, SQLiteWriter
+
+USERS = 1000
+
+metadata = MetaData()
+jobs = Table(
+    "jobs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", BigInteger, nullable=False, index=True),
+    Column("all_info", JSON, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+users = Table(
+    "users", metadata,
+    Column("telegram_id", BigInteger, primary_key=True),
+    Column("allowed_posts", Integer, nullable=False, default=0),
+)
+
+
+def _write(conn, user_id: int) -> None:
+    conn.execute(insert(jobs).values(
+        user_id=user_id,
+        all_info={"title": "Грузчик", "address": "Бишкек", "payment": "1500 сом", "contact": "+996555123456"},
+        created_at=func.now(),
+    ))
+    conn.execute(update(users).where(users.c.telegram_id == user_id).values(allowed_posts=users.c.allowed_posts + 1))
+
+
+def _read(conn, user_id: int) -> None:
+    conn.execute(select(jobs).where(jobs.c.user_id == user_id).order_by(jobs.c.created_at.desc()).limit(20)).all()
+    conn.execute(select(func.count(jobs.c.id)).where(jobs.c.user_id == user_id)).scalar()
+
+
+def run_scenario(name: str, tuned: bool, writers: int, readers: int, seconds: float) -> dict:
+    fd, path = tempfile.mkstemp(prefix="bench_", suffix=".db")
+    os.close(fd)
+    url = f"sqlite:///{path}"
+    if tuned:
+        engine = create_engine(url, pool_size=readers + 1, max_overflow=readers)
+        configure_sqlite(engine, busy_timeout_ms=5000, mmap_size=256 * 1024 * 1024)
+        writer = SQLiteWriter(engine, batch_size=64)
+    else:
+        # Как резервный движок в db_base до этого изменения
+        engine = create_engine(url)
+        writer = None
+
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(users), [{"telegram_id": i, "allowed_posts": 0} for i in range(USERS)])
+
+    stop = time.monotonic() + seconds
+    write_latencies: list[float] = []
+    read_latencies: list[float] = []
+    errors = {"write": 0, "read": 0}
+    lock = threading.Lock()
+
+    def do_write(user_id: int):
+        with engine.begin() as conn:
+            _write(conn, user_id)
+
+    def tuned_write(user_id: int):
+        # Внутри потока-писателя соединение уже в пакетной транзакции
+        from sqlite_backend import writer_connection
+        _write(writer_connection.get(), user_id)
+
+    def writer_loop():
+        while time.monotonic() < stop:
+            user_id = random.randrange(USERS)
+            started = time.perf_counter()
+            try:
+                if writer:
+                    writer.call(tuned_write, user_id)
+                else:
+                    do_write(user_id)
+            except OperationalError:
+                with lock:
+                    errors["write"] += 1
+                continue
+            with lock:
+                write_latencies.append(time.perf_counter() - started)
+
+    def reader_loop():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    _read(conn, random.randrange(USERS))
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+                continue
+            with lock:
+                read_latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=writer_loop) for _ in range(writers)]
+    threads += [threading.Thread(target=reader_loop) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if writer:
+        writer.stop()
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+    def p95(values: list[float]) -> float:
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 20 else float("nan")
+
+    return {
+        "name": name,
+        "writes_per_s": len(write_latencies) / seconds,
+        "reads_per_s": len(read_latencies) / seconds,
+        "write_p95_ms": p95(write_latencies),
+        "read_p95_ms": p95(read_latencies),
+        "write_errors": errors["write"],
+        "read_errors": errors["read"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов SQLite")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"Писателей: {args.writers}, читателей: {args.readers}, длительность: {args.seconds:g} с\n")
+    header = f"{'сценарий':<28}{'записей/с':>11}{'чтений/с':>11}{'p95 записи':>12}{'p95 чтения':>12}{'ошибок зап.':>13}{'ошибок чт.':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, tuned in (("по умолчанию (journal)", False), ("WAL + писатель + пул", True)):
+        r = run_scenario(name, tuned, args.writers, args.readers, args.seconds)
+        print(
+            f"{r['name']:<28}{r['writes_per_s']:>11.0f}{r['reads_per_s']:>11.0f}"
+            f"{r['write_p95_ms']:>10.1f}мс{r['read_p95_ms']:>10.1f}мс"
+            f"{r['write_errors']:>13}{r['read_errors']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
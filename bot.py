@@ -4,14 +4,11 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
+from config import BOT_TOKEN, TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
 from db_connection import init_db
+from logging_setup import LogContextMiddleware
 
-# Настройка логирования с более подробной информацией
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Логирование настраивается в config (очередь + фоновый поток, JSON)
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +27,13 @@ def check_environment():
     return True
 
 
+def register_event_middleware(dp: Dispatcher, middleware) -> None:
+    """Подключает внутренний middleware ко всем событиям, кроме самого апдейта и ошибок"""
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(middleware)
+
+
 async def main():
     """
     Основная функция, инициализирует бота и запускает его.
@@ -51,15 +55,87 @@ async def main():
         # Создание диспетчера
         dp = Dispatcher(storage=MemoryStorage())
 
-        # Импортируем роутер здесь, чтобы избежать циклического импорта
+        # Повторно доставленные апдейты отбрасываются до роутеров и фильтров
+        from update_dedup import UpdateDeduplicationMiddleware
+        update_dedup = UpdateDeduplicationMiddleware()
+        dp.update.outer_middleware(update_dedup)
+
+        # Активность пользователей копится в памяти и пишется в базу пачками
+        from activity import activity_tracker
+        dp.update.outer_middleware(activity_tracker)
+
+        # Контекст логов: update_id и user_id для апдейта, имя хендлера для событий
+        log_context = LogContextMiddleware()
+        dp.update.outer_middleware(log_context)
+        register_event_middleware(dp, log_context)
+
+        # Приоритеты апдейтов: админы > личные сообщения > кнопки > модерация групп.
+        # При перегрузке модерация групп отбрасывается первой
+        from scheduler import PriorityScheduler
+        dp.update.outer_middleware(PriorityScheduler())
+
+        # Трассировка: спаны апдейта, хендлера, SQL-запросов и вызовов Bot API
+        if TRACE_FILE:
+            from db_base import engine
+            from tracing import setup_tracing, TracingMiddleware
+            setup_tracing(TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT, engine, bot)
+            tracing_middleware = TracingMiddleware()
+            dp.update.outer_middleware(tracing_middleware)
+            register_event_middleware(dp, tracing_middleware)
+            logger.info(f"Трассировка апдейтов пишется в {TRACE_FILE}")
+
+        # Контроль блокировок event loop: по стеку определяется хендлер-виновник
+        from loop_watchdog import LoopWatchdog
+        loop_watchdog = LoopWatchdog()
+        register_event_middleware(dp, loop_watchdog)
+
+        # Импортируем роутеры здесь, чтобы избежать циклического импорта.
+        # Роутеры админских функций подключаются раньше основного,
+        # иначе их сообщения перехватит общий обработчик приватного чата
+        from bulk_import import router as bulk_import_router
+        from broadcast import router as broadcast_router, resume_broadcasts
+        from export import router as export_router
+        from profiler import router as profiler_router
+        from search import router as search_router, vacancy_index
         from handlers import router
+        dp.include_router(bulk_import_router)
+        dp.include_router(broadcast_router)
+        dp.include_router(export_router)
+        dp.include_router(profiler_router)
+        dp.include_router(search_router)
         dp.include_router(router)
 
+        # Фоновые задачи запускаются вместе с поллингом и отменяются при остановке
+        from archiver import run_archiver
+        from publisher import run_publisher
+        from subscriptions import run_subscription_sweeper
+        background_tasks = []
+
+        async def on_startup(bot: Bot):
+            # Индекс инлайн-поиска загружается до запуска публикатора, который его пополняет
+            indexed = await asyncio.to_thread(vacancy_index.load)
+            logger.info(f"Индекс инлайн-поиска загружен: {indexed} вакансий")
+            await asyncio.to_thread(update_dedup.load_watermark)
+            background_tasks.append(asyncio.create_task(update_dedup.run_flusher()))
+            background_tasks.append(asyncio.create_task(activity_tracker.run_flusher()))
+            background_tasks.append(asyncio.create_task(run_archiver(bot)))
+            background_tasks.append(asyncio.create_task(run_publisher(bot)))
+            background_tasks.append(asyncio.create_task(run_subscription_sweeper(bot)))
+            background_tasks.append(asyncio.create_task(loop_watchdog.run()))
+            await resume_broadcasts(bot)
+
         # Регистрация обработчика завершения
         async def on_shutdown(dispatcher):
             logger.warning("Завершение работы бота...")
-            # Здесь можно добавить код для корректного завершения работы
-
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            # Писатель SQLite дописывает очередь (в том числе финальные сбросы задач выше)
+            from db_base import sqlite_writer
+            if sqlite_writer is not None:
+                await asyncio.to_thread(sqlite_writer.stop)
+
+        dp.startup.register(on_startup)
         dp.shutdown.register(on_shutdown)
 
         # Запуск бота
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from aiogram import Router, Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from sqlalchemy import select, update, func
+
+from config import ADMINS, BROADCAST_CONCURRENCY, BROADCAST_FETCH_SIZE, BROADCAST_STATUS_INTERVAL
+from db_base import SessionLocal, serialized_write
+from models import User, Broadcast
+from notifier import deliver, SENT, BLOCKED, DEACTIVATED, FAILED
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+COUNTERS = (SENT, BLOCKED, DEACTIVATED, FAILED)
+STATUS_TITLES = {
+    "running": "⏳ выполняется",
+    "done": "✅ завершена",
+    "cancelled": "⛔ остановлена",
+}
+
+# Ссылки на запущенные рассылки, чтобы задачи не собрал сборщик мусора
+_running_broadcasts: set[asyncio.Task] = set()
+
+
+class _UserCursor:
+    """
+    Курсор по users в порядке telegram_id, начиная после checkpoint.
+    Каждая пачка — диапазонное чтение по индексу telegram_id с LIMIT,
+    таблица целиком в память не загружается.
+    Между пачками транзакция закрывается: рассылка идет часами, и долгая
+    читающая транзакция мешала бы записи (в SQLite — блокировала бы ее).
+    Методы синхронные — вызываются через asyncio.to_thread.
+    """
+
+    def __init__(self, after_id: int):
+        self._after_id = after_id
+
+    def next_chunk(self) -> list[int]:
+        with SessionLocal() as session:
+            chunk = session.execute(
+                select(User.telegram_id)
+                .where(User.telegram_id > self._after_id)
+                .order_by(User.telegram_id)
+                .limit(BROADCAST_FETCH_SIZE)
+            ).scalars().all()
+        if chunk:
+            self._after_id = chunk[-1]
+        return chunk
+
+
+def _get_broadcast(broadcast_id: int) -> dict | None:
+    with SessionLocal() as session:
+        broadcast = session.get(Broadcast, broadcast_id)
+        if not broadcast:
+            return None
+        return {column.name: getattr(broadcast, column.name) for column in Broadcast.__table__.columns}
+
+
+@serialized_write
+def _create_broadcast(admin_id: int, from_chat_id: int, message_id: int, status_message_id: int) -> int | None:
+    """Создает рассылку, если другой активной рассылки нет"""
+    with SessionLocal() as session:
+        if session.execute(select(Broadcast.id).where(Broadcast.status == "running")).first():
+            return None
+        broadcast = Broadcast(
+            admin_id=admin_id,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            status_message_id=status_message_id,
+            status="running",
+            total=session.query(func.count(User.id)).scalar(),
+        )
+        session.add(broadcast)
+        session.commit()
+        return broadcast.id
+
+
+@serialized_write
+def _save_checkpoint(broadcast_id: int, last_user_id: int, counters: dict[str, int]) -> bool:
+    """
+    Сохраняет прогресс рассылки. Возвращает False, если рассылку остановили
+    командой /broadcast_stop — тогда отправка прекращается.
+    """
+    with SessionLocal() as session:
+        result = session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == "running")
+            .values(last_user_id=last_user_id, **counters)
+        )
+        session.commit()
+    return result.rowcount == 1
+
+
+@serialized_write
+def _finish_broadcast(broadcast_id: int) -> None:
+    with SessionLocal() as session:
+        session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == "running")
+            .values(status="done", finished_at=datetime.now())
+        )
+        session.commit()
+
+
+@serialized_write
+def _cancel_broadcasts() -> int:
+    with SessionLocal() as session:
+        result = session.execute(
+            update(Broadcast)
+            .where(Broadcast.status == "running")
+            .values(status="cancelled", finished_at=datetime.now())
+        )
+        session.commit()
+    return result.rowcount
+
+
+def _running_broadcast_ids() -> list[int]:
+    with SessionLocal() as session:
+        return list(session.execute(select(Broadcast.id).where(Broadcast.status == "running")).scalars())
+
+
+def _status_text(broadcast: dict) -> str:
+    processed = sum(broadcast[counter] for counter in COUNTERS)
+    return (
+        f"📣 Рассылка #{broadcast['id']}: {STATUS_TITLES.get(broadcast['status'], broadcast['status'])}\n\n"
+        f"Обработано: {processed} из {broadcast['total']}\n"
+        f"✅ Доставлено: {broadcast[SENT]}\n"
+        f"🚫 Заблокировали бота: {broadcast[BLOCKED]}\n"
+        f"👻 Удаленные аккаунты: {broadcast[DEACTIVATED]}\n"
+        f"❌ Ошибки: {broadcast[FAILED]}"
+    )
+
+
+async def _update_status(bot: Bot, broadcast: dict):
+    """Обновляет единственное сообщение админу с прогрессом рассылки"""
+    if not broadcast["status_message_id"]:
+        return
+    try:
+        await bot.edit_message_text(
+            _status_text(broadcast),
+            chat_id=broadcast["admin_id"],
+            message_id=broadcast["status_message_id"]
+        )
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.warning(f"Не удалось обновить статус рассылки {broadcast['id']}: {e}")
+    except Exception as e:
+        logger.warning(f"Не удалось обновить статус рассылки {broadcast['id']}: {e}")
+
+
+async def run_broadcast(bot: Bot, broadcast_id: int):
+    """
+    Отправляет рассылку пачками по BROADCAST_CONCURRENCY параллельных копий сообщения.
+    Общий лимит частоты соблюдает notifier. После каждой пачки сохраняется checkpoint,
+    поэтому после перезапуска повторно может уйти не больше одной пачки.
+    """
+    broadcast = await asyncio.to_thread(_get_broadcast, broadcast_id)
+    if not broadcast or broadcast["status"] != "running":
+        return
+
+    counters = {counter: broadcast[counter] for counter in COUNTERS}
+    cursor = _UserCursor(broadcast["last_user_id"])
+    last_status = 0.0
+
+    def copy_to(user_id: int):
+        return lambda: bot.copy_message(
+            chat_id=user_id,
+            from_chat_id=broadcast["from_chat_id"],
+            message_id=broadcast["message_id"]
+        )
+
+    while True:
+        chunk = await asyncio.to_thread(cursor.next_chunk)
+        if not chunk:
+            break
+
+        for i in range(0, len(chunk), BROADCAST_CONCURRENCY):
+            window = chunk[i:i + BROADCAST_CONCURRENCY]
+            results = await asyncio.gather(*(deliver(user_id, copy_to(user_id)) for user_id in window))
+            for result in results:
+                counters[result] += 1
+
+            if not await asyncio.to_thread(_save_checkpoint, broadcast_id, window[-1], counters):
+                logger.info(f"Рассылка {broadcast_id} остановлена")
+                await _update_status(bot, {**broadcast, **counters, "status": "cancelled"})
+                return
+
+            if time.monotonic() - last_status >= BROADCAST_STATUS_INTERVAL:
+                await _update_status(bot, {**broadcast, **counters})
+                last_status = time.monotonic()
+
+    await asyncio.to_thread(_finish_broadcast, broadcast_id)
+    await _update_status(bot, {**broadcast, **counters, "status": "done"})
+    logger.info(f"Рассылка {broadcast_id} завершена: {counters}")
+
+
+def _start(bot: Bot, broadcast_id: int):
+    task = asyncio.create_task(run_broadcast(bot, broadcast_id))
+    _running_broadcasts.add(task)
+    task.add_done_callback(_running_broadcasts.discard)
+
+
+async def resume_broadcasts(bot: Bot):
+    """Продолжает рассылки, прерванные перезапуском бота, с сохраненного checkpoint"""
+    try:
+        for broadcast_id in await asyncio.to_thread(_running_broadcast_ids):
+            logger.info(f"Продолжаем рассылку {broadcast_id}")
+            _start(bot, broadcast_id)
+    except Exception as e:
+        logger.error(f"Ошибка при возобновлении рассылок: {e}")
+
+
+@router.message(Command("broadcast"))
+async def broadcast_handler(message: Message, command: CommandObject, bot: Bot):
+    """Команда для админов - рассылка сообщения всем пользователям бота"""
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    if message.reply_to_message:
+        # Копируется сообщение, на которое ответил админ (можно с фото, файлами и т.д.)
+        source = message.reply_to_message
+    elif command.args:
+        source = await message.answer(command.args)
+    else:
+        await message.answer(
+            "📝 Использование:\n"
+            "/broadcast текст - разослать текст всем пользователям\n"
+            "ответ /broadcast на сообщение - разослать это сообщение\n"
+            "/broadcast_stop - остановить текущую рассылку"
+        )
+        return
+
+    try:
+        status = await message.answer("📣 Подготовка рассылки...")
+        broadcast_id = await asyncio.to_thread(
+            _create_broadcast, message.from_user.id, source.chat.id, source.message_id, status.message_id
+        )
+        if not broadcast_id:
+            await status.edit_text("❌ Уже идет другая рассылка. Остановите ее командой /broadcast_stop")
+            return
+
+        logger.info(f"Админ {message.from_user.id} запустил рассылку {broadcast_id}")
+        _start(bot, broadcast_id)
+    except Exception as e:
+        logger.error(f"Ошибка в broadcast_handler: {e}")
+        await message.answer("❌ Ошибка при запуске рассылки.")
+
+
+@router.message(Command("broadcast_stop"))
+async def broadcast_stop_handler(message: Message):
+    """Команда для админов - остановка текущей рассылки"""
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    if await asyncio.to_thread(_cancel_broadcasts):
+        await message.answer("⛔ Рассылка будет остановлена после текущей пачки сообщений.")
+    else:
+        await message.answer("ℹ️ Активных рассылок нет.")
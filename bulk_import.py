@@ -0,0 +1,224 @@
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import tempfile
+from contextlib import closing
+
+from aiogram import Router, Bot, F
+from aiogram.enums import ChatType
+from aiogram.types import Message, FSInputFile
+
+from config import ADMINS, CHANNEL_POSTS_PER_MINUTE, BULK_INSERT_BATCH, BULK_MAX_FILE_SIZE
+from db_connection import insert_user, enqueue_publications_batch
+from media import register_photo_source
+from publisher import wake_publisher
+from vacancy import validate_vacancy
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+CSV_EXTENSIONS = (".csv",)
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
+# Допустимые названия колонок в загружаемом файле
+COLUMN_ALIASES = {
+    "address": "address", "адрес": "address",
+    "title": "title", "задача": "title",
+    "payment": "payment", "оплата": "payment",
+    "contact": "contact", "контакт": "contact",
+    "extra": "extra", "примечание": "extra",
+    "photo": "photo", "фото": "photo",  # ссылка на картинку или file_id Telegram
+}
+
+# Ссылки на запущенные импорты, чтобы задачи не собрал сборщик мусора
+_running_imports: set[asyncio.Task] = set()
+
+
+def _normalize_row(raw: dict) -> tuple[dict | None, str | None]:
+    """Приводит строку файла к формату all_info и проверяет ее по правилам шаблона"""
+    data = {}
+    for key, value in raw.items():
+        field = COLUMN_ALIASES.get(str(key or "").strip().lower())
+        if not field or value is None:
+            continue
+        value = str(value).strip()
+        # Шаблон вакансии построчный, поэтому многострочные значения не допускаются
+        if "\n" in value or "\r" in value:
+            return None, f"Поле {field} содержит перенос строки"
+        if value:
+            data[field] = value
+
+    error = validate_vacancy(data)
+    if error:
+        return None, error
+    return data, None
+
+
+def iter_document_rows(path: str, kind: str):
+    """
+    Построчно читает CSV или JSON Lines, не загружая файл в память целиком.
+    Возвращает генератор кортежей (номер_строки, данные, ошибка).
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if kind == "csv":
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(f, dialect=dialect)
+            for row_no, raw in enumerate(reader, start=2):  # строка 1 — заголовок
+                data, error = _normalize_row(raw)
+                yield row_no, data, error
+        else:
+            for row_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_no, None, f"Некорректный JSON: {e.msg}"
+                    continue
+                if not isinstance(raw, dict):
+                    yield row_no, None, "Ожидается JSON-объект"
+                    continue
+                data, error = _normalize_row(raw)
+                yield row_no, data, error
+
+
+def _read_rows(rows, limit: int) -> list[tuple[int, dict | None, str | None]]:
+    """Следующие limit строк файла. Чтение и проверка строк идут в потоке, не в цикле событий"""
+    return list(itertools.islice(rows, limit))
+
+
+async def _flush(pending: list[tuple[int, dict]], admin_id: int, report: csv.writer) -> tuple[int, int]:
+    """
+    Ставит накопленные вакансии в очередь публикации: одна транзакция
+    и пакетная вставка на всю пачку. В той же транзакции вакансии проверяются
+    на дубли (и внутри пачки) и сохраняются их отпечатки. Результат дописывается в отчет.
+    """
+    if not pending:
+        return 0, 0
+    results = await asyncio.to_thread(
+        enqueue_publications_batch,
+        [(admin_id, data) for _, data in pending],
+        None,
+        False
+    )
+    if results:
+        queued = failed = 0
+        for (row_no, _), (job_id, duplicate) in zip(pending, results):
+            if duplicate:
+                report.writerow([row_no, "duplicate", "Такая вакансия уже публиковалась"])
+                failed += 1
+            else:
+                report.writerow([row_no, "queued", f"job {job_id}"])
+                queued += 1
+        if queued:
+            wake_publisher()
+    else:
+        for row_no, _ in pending:
+            report.writerow([row_no, "error", "Ошибка при сохранении в базу данных"])
+        queued, failed = 0, len(pending)
+    pending.clear()
+    return queued, failed
+
+
+async def run_import(bot: Bot, admin_id: int, path: str, kind: str, file_name: str):
+    """Импортирует вакансии из файла и отправляет админу построчный отчет"""
+    queued = failed = 0
+    pending: list[tuple[int, dict]] = []
+    report_fd, report_path = tempfile.mkstemp(prefix="import_report_", suffix=".csv")
+
+    try:
+        with os.fdopen(report_fd, "w", encoding="utf-8-sig", newline="") as report_file:
+            report = csv.writer(report_file)
+            report.writerow(["row", "status", "details"])
+
+            with closing(iter_document_rows(path, kind)) as rows:
+                while chunk := await asyncio.to_thread(_read_rows, rows, BULK_INSERT_BATCH):
+                    for row_no, data, error in chunk:
+                        if error:
+                            report.writerow([row_no, "invalid", error])
+                            failed += 1
+                            continue
+
+                        if data.get("photo"):
+                            # Одна и та же картинка во многих строках — одна запись media и одна загрузка
+                            data["photo"] = await asyncio.to_thread(register_photo_source, data["photo"])
+                        pending.append((row_no, data))
+                        if len(pending) >= BULK_INSERT_BATCH:
+                            ok, bad = await _flush(pending, admin_id, report)
+                            queued += ok
+                            failed += bad
+
+            ok, bad = await _flush(pending, admin_id, report)
+            queued += ok
+            failed += bad
+
+        await bot.send_document(
+            admin_id,
+            FSInputFile(report_path, filename=f"report_{os.path.splitext(file_name)[0]}.csv"),
+            caption=(
+                f"📥 Импорт {file_name} завершен\n\n"
+                f"⏳ Поставлено в очередь публикации: {queued}\n"
+                f"❌ С ошибками: {failed}\n\n"
+                f"Вакансии выходят в канал не чаще {CHANNEL_POSTS_PER_MINUTE:g} в минуту."
+            )
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при импорте {file_name}: {e}")
+        await bot.send_message(admin_id, f"❌ Импорт {file_name} прерван: {e}")
+    finally:
+        for tmp in (path, report_path):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+@router.message(F.document, F.chat.type == ChatType.PRIVATE, F.from_user.id.in_(ADMINS))
+async def import_document_handler(message: Message, bot: Bot):
+    """Команда для админов - массовый импорт вакансий из CSV / JSON Lines"""
+    document = message.document
+    file_name = document.file_name or "vacancies"
+    extension = os.path.splitext(file_name)[1].lower()
+
+    if extension in CSV_EXTENSIONS:
+        kind = "csv"
+    elif extension in JSONL_EXTENSIONS:
+        kind = "jsonl"
+    else:
+        await message.answer("❌ Поддерживаются только файлы .csv и .jsonl")
+        return
+
+    if document.file_size and document.file_size > BULK_MAX_FILE_SIZE:
+        await message.answer("❌ Файл слишком большой.")
+        return
+
+    await asyncio.to_thread(insert_user, message.from_user.id, message.from_user.username or "")
+
+    fd, path = tempfile.mkstemp(prefix="import_", suffix=extension)
+    os.close(fd)
+    try:
+        # Файл скачивается на диск и читается построчно
+        await bot.download(document, destination=path)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке файла импорта: {e}")
+        os.remove(path)
+        await message.answer("❌ Не удалось загрузить файл.")
+        return
+
+    task = asyncio.create_task(run_import(bot, message.from_user.id, path, kind, file_name))
+    _running_imports.add(task)
+    task.add_done_callback(_running_imports.discard)
+
+    await message.answer(
+        f"⏳ Импорт {file_name} начат.\n"
+        "Вакансии попадут в очередь публикации, по завершении придет отчет по каждой строке."
+    )
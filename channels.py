@@ -0,0 +1,104 @@
+import logging
+
+from config import CHANNEL_ID, CHANNEL_URL, CHANNEL_ROUTES, CHANNEL_POSTS_PER_MINUTE, CHANNEL_DELETE_RATE
+from dedup import normalize_text
+from ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+ROUTE_FIELDS = ("address", "title")
+
+
+class Channel:
+    """Канал для публикации вакансий со своими лимитами отправки и удаления"""
+
+    def __init__(self, chat_id: int, url: str = ""):
+        self.chat_id = chat_id
+        self.url = url.rstrip("/") or _private_url(chat_id)
+        # Лимит Telegram действует на каждый чат отдельно
+        self.post_limiter = RateLimiter(CHANNEL_POSTS_PER_MINUTE / 60)
+        self.delete_limiter = RateLimiter(CHANNEL_DELETE_RATE)
+
+    def post_url(self, message_id: int) -> str:
+        return f"{self.url}/{message_id}"
+
+
+class Route:
+    """Правило: вакансия, в поле field которой есть слово на один из keywords, идет в channel"""
+
+    def __init__(self, field: str, keywords: list[str], channel: Channel):
+        self.field = field
+        self.keywords = keywords
+        self.channel = channel
+
+    def matches(self, data: dict) -> bool:
+        words = normalize_text(data.get(self.field, "")).split()
+        return any(word.startswith(keyword) for keyword in self.keywords for word in words)
+
+
+def _private_url(chat_id: int) -> str:
+    # Ссылка на пост закрытого канала: t.me/c/<id без -100>/<message_id>
+    value = str(chat_id)
+    return f"https://t.me/c/{value[4:] if value.startswith('-100') else value.lstrip('-')}"
+
+
+def parse_routes(value: str) -> list[Route]:
+    """
+    Разбирает CHANNEL_ROUTES: правила через ";", каждое вида
+    "[поле:]слово1,слово2=chat_id|url". Поле — address (по умолчанию) или title.
+    Например: "бишкек,bishkek=-1001|https://t.me/jobs_bishkek; title:няня,сиделка=-1003|https://t.me/jobs_home"
+    """
+    routes = []
+    channels: dict[int, Channel] = {}
+    for item in value.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            match, target = item.rsplit("=", 1)
+            field = "address"
+            if ":" in match.split(",", 1)[0]:
+                field, match = match.split(":", 1)
+                field = field.strip()
+            if field not in ROUTE_FIELDS:
+                raise ValueError(f"неизвестное поле {field}")
+            chat_id, _, url = target.partition("|")
+            chat_id = int(chat_id)
+            keywords = [normalize_text(word) for word in match.split(",") if normalize_text(word)]
+            if not keywords:
+                raise ValueError("нет ключевых слов")
+        except ValueError as e:
+            logger.error(f"Пропущено правило маршрутизации каналов '{item}': {e}")
+            continue
+        channel = channels.setdefault(chat_id, Channel(chat_id, url.strip()))
+        routes.append(Route(field, keywords, channel))
+    return routes
+
+
+default_channel = Channel(CHANNEL_ID, CHANNEL_URL)
+routes = parse_routes(CHANNEL_ROUTES)
+_channels = {default_channel.chat_id: default_channel}
+for _route in routes:
+    _channels.setdefault(_route.channel.chat_id, _route.channel)
+
+
+def route_vacancy(data: dict) -> Channel:
+    """Канал для новой вакансии: первое подходящее правило, иначе основной канал"""
+    for route in routes:
+        if route.matches(data):
+            return route.channel
+    return default_channel
+
+
+def get_channel(chat_id: int | None) -> Channel:
+    """
+    Канал, в котором лежит пост. None — вакансии, опубликованные до маршрутизации
+    (основной канал). Канал, убранный из CHANNEL_ROUTES, по-прежнему доступен
+    для редактирования и удаления старых постов.
+    """
+    if chat_id is None:
+        return default_channel
+    channel = _channels.get(chat_id)
+    if channel is None:
+        channel = _channels[chat_id] = Channel(chat_id)
+    return channel
@@ -2,10 +2,17 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from logging_setup import setup_logging
+
 load_dotenv()
 
-# Настройка логирования для отладки проблем с переменными окружения
-logging.basicConfig(level=logging.INFO)
+# Логирование настраивается первым, чтобы попали и сообщения ниже
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json или text
+# Доля сохраняемых INFO-записей по логгерам, например "handlers.group=0.1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLING)
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -14,6 +21,9 @@ ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "")
 ADMINS = [int(x) for x in os.getenv("ADMINS", "").split(",") if x.strip()]
 CHANNEL_ID = int(os.getenv("CHANNEL_ID", 0))
 CHANNEL_URL = os.getenv("CHANNEL_URL", "")
+# Дополнительные каналы по региону (address) или категории (title), см. channels.parse_routes.
+# Вакансии, не подошедшие ни под одно правило, идут в CHANNEL_ID
+CHANNEL_ROUTES = os.getenv("CHANNEL_ROUTES", "")
 
 # Приоритетно используем DATABASE_URL (стандартная для Railway)
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -24,4 +34,98 @@ if not DATABASE_URL:
 else:
     # Логируем первые несколько символов для отладки (без паролей)
     masked_url = DATABASE_URL.split("@")[0][:10] + "..." if "@" in DATABASE_URL else DATABASE_URL[:10] + "..."
-    logger.info(f"DATABASE_URL обнаружен: {masked_url}")
\ No newline at end of file
+    logger.info(f"DATABASE_URL обнаружен: {masked_url}")
+
+# Необязательная реплика только для чтения (для проверки локально подойдет второй файл SQLite)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", 10))  # чтение своих записей из основной базы
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", 30))  # пауза после ошибки реплики
+
+# Режим SQLite (WAL, один поток-писатель, пул читателей)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # мс ожидания блокировки
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", 8))  # соединений в пуле читателей
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", 64))  # записей в одной транзакции писателя
+
+# Архивирование старых вакансий (0 — архивирование отключено)
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 90))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", 3600))  # секунды между проходами архиватора
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+CHANNEL_DELETE_RATE = float(os.getenv("CHANNEL_DELETE_RATE", 1))  # вызовов deleteMessages в секунду на канал
+ARCHIVE_DELETE_ATTEMPTS = int(os.getenv("ARCHIVE_DELETE_ATTEMPTS", 5))  # проходов, пытающихся удалить пост архивной вакансии
+
+# Публикация в канал и массовый импорт вакансий
+CHANNEL_POSTS_PER_MINUTE = float(os.getenv("CHANNEL_POSTS_PER_MINUTE", 20))  # для каждого канала отдельно
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", 20))  # сколько задач очереди забирать за раз
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", 5))
+PUBLISH_RETRY_BASE = float(os.getenv("PUBLISH_RETRY_BASE", 30))  # секунды, удваиваются с каждой попыткой
+PUBLISH_RETRY_MAX = float(os.getenv("PUBLISH_RETRY_MAX", 1800))
+BULK_INSERT_BATCH = int(os.getenv("BULK_INSERT_BATCH", 50))
+BULK_MAX_FILE_SIZE = int(os.getenv("BULK_MAX_FILE_SIZE", 20 * 1024 * 1024))  # лимит getFile для ботов
+
+# Поиск дублей вакансий
+DEDUP_WINDOW_DAYS = int(os.getenv("DEDUP_WINDOW_DAYS", 30))  # 0 — проверка отключена
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", 0.8))  # порог сходства для почти-дублей
+
+# Защита от повторной доставки апдейтов
+UPDATE_DEDUP_CACHE_SIZE = int(os.getenv("UPDATE_DEDUP_CACHE_SIZE", 10000))  # update_id в памяти
+UPDATE_WATERMARK_FLUSH_INTERVAL = float(os.getenv("UPDATE_WATERMARK_FLUSH_INTERVAL", 1))  # секунды
+# update_id намного меньше сохраненного watermark — Telegram начал нумерацию заново
+# (после недели без апдейтов следующий номер выбирается случайно)
+UPDATE_ID_RESET_GAP = int(os.getenv("UPDATE_ID_RESET_GAP", 100000))
+
+# Личные уведомления пользователям и проверка подписок
+USER_MESSAGES_PER_SECOND = float(os.getenv("USER_MESSAGES_PER_SECOND", 20))  # лимит Telegram — 30 в секунду
+SUBSCRIPTION_SWEEP_INTERVAL = int(os.getenv("SUBSCRIPTION_SWEEP_INTERVAL", 600))  # секунды между проходами
+SUBSCRIPTION_SWEEP_BATCH = int(os.getenv("SUBSCRIPTION_SWEEP_BATCH", 200))
+SUBSCRIPTION_REMIND_HOURS = int(os.getenv("SUBSCRIPTION_REMIND_HOURS", 24))  # за сколько часов напомнить о продлении
+# Об окончании подписки пишем, только если она истекла не раньше чем интервал проверки плюс этот запас
+# (простой бота); более старые подписки снимаются молча
+SUBSCRIPTION_EXPIRED_GRACE_HOURS = int(os.getenv("SUBSCRIPTION_EXPIRED_GRACE_HOURS", 24))
+
+# Массовая рассылка (/broadcast)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))  # одновременных отправок, после каждой пачки — checkpoint
+BROADCAST_FETCH_SIZE = int(os.getenv("BROADCAST_FETCH_SIZE", 500))  # строк users за одно чтение курсора
+BROADCAST_STATUS_INTERVAL = float(os.getenv("BROADCAST_STATUS_INTERVAL", 5))  # секунды между обновлениями прогресса
+
+# Выгрузка данных (/export)
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 1000))  # строк за одно чтение курсора
+EXPORT_MAX_FILE_SIZE = int(os.getenv("EXPORT_MAX_FILE_SIZE", 50 * 1024 * 1024))  # лимит sendDocument для ботов
+
+# Трассировка апдейтов (пустой TRACE_FILE — трассировка отключена)
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # например traces/trace.json
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", 5))
+
+# Контроль задержек event loop
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.25))  # секунды между замерами
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", 0.5))  # задержка, при которой снимается стек
+LOOP_LAG_REPORT_INTERVAL = int(os.getenv("LOOP_LAG_REPORT_INTERVAL", 60))  # секунды между метриками
+
+# Профилирование (/profile)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # секунды между сэмплами
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 300))
+
+# Инлайн-поиск вакансий (@bot запрос)
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", 20))  # результатов на страницу, Telegram допускает до 50
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 60))  # секунды кеширования ответа на стороне Telegram
+SEARCH_LOAD_BATCH = int(os.getenv("SEARCH_LOAD_BATCH", 1000))  # строк за одно чтение при загрузке индекса
+
+# Кеш пользователей, уже записанных в базу (повторный /start без запроса к базе)
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", 100000))
+
+# Фото вакансий
+MEDIA_MAX_SIZE = int(os.getenv("MEDIA_MAX_SIZE", 10 * 1024 * 1024))  # лимит sendPhoto для загрузки файла
+MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv("MEDIA_DOWNLOAD_TIMEOUT", 30))  # секунды на скачивание фото по ссылке
+
+# Учет активности пользователей (пишется в базу пачками)
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", 60))  # секунды между записями в базу
+ACTIVITY_FLUSH_BATCH = int(os.getenv("ACTIVITY_FLUSH_BATCH", 500))  # пользователей в одном UPDATE
+
+# Планировщик апдейтов: лимиты одновременной обработки по классам приоритета
+SCHED_MAX_CONCURRENCY = int(os.getenv("SCHED_MAX_CONCURRENCY", 100))  # всего апдейтов одновременно
+SCHED_ADMIN_CONCURRENCY = int(os.getenv("SCHED_ADMIN_CONCURRENCY", 10))
+SCHED_PRIVATE_CONCURRENCY = int(os.getenv("SCHED_PRIVATE_CONCURRENCY", 60))  # подача вакансий, оплата
+SCHED_CALLBACK_CONCURRENCY = int(os.getenv("SCHED_CALLBACK_CONCURRENCY", 30))  # кнопки и инлайн-поиск
+SCHED_GROUP_CONCURRENCY = int(os.getenv("SCHED_GROUP_CONCURRENCY", 10))  # модерация групп
+SCHED_GROUP_QUEUE = int(os.getenv("SCHED_GROUP_QUEUE", 100))  # сверх этого апдейты модерации отбрасываются
@@ -1,11 +1,32 @@
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from contextlib import contextmanager
+from functools import wraps
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from sqlalchemy.exc import SQLAlchemyError
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, DATABASE_REPLICA_URL, REPLICA_PIN_SECONDS, REPLICA_RETRY_SECONDS,
+    SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE, SQLITE_READERS, SQLITE_WRITE_BATCH
+)
+from logging_setup import log_context
+from sqlite_backend import configure_sqlite, writer_connection, SQLiteWriter
 
 logger = logging.getLogger(__name__)
 
+
+def _sqlite_pool_options(url: str) -> dict:
+    """Пул читателей SQLite: несколько соединений читают параллельно (WAL)"""
+    if not url.startswith("sqlite") or ":memory:" in url:
+        return {}
+    return {"pool_size": SQLITE_READERS, "max_overflow": SQLITE_READERS}
+
+
+def _prepare_engine(engine) -> None:
+    if engine.dialect.name == "sqlite":
+        configure_sqlite(engine, SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE)
+
+
 # Используем переменную окружения для подключения к базе данных
 try:
     if not DATABASE_URL:
@@ -16,8 +37,10 @@ try:
         DATABASE_URL,
         echo=False,
         future=True,
-        pool_pre_ping=True  # Добавляем проверку соединения перед использованием
+        pool_pre_ping=True,  # Добавляем проверку соединения перед использованием
+        **_sqlite_pool_options(DATABASE_URL)
     )
+    _prepare_engine(engine)
 
     # Проверяем соединение
     with engine.connect() as conn:
@@ -27,14 +50,149 @@ except (SQLAlchemyError, ValueError) as e:
     logger.error(f"Ошибка при подключении к базе данных: {str(e)}")
     # Создаем резервный SQLite движок для локальной разработки
     logger.warning("Использую SQLite в памяти как резервный вариант")
-    engine = create_engine("sqlite:///bot_database.db", echo=False, future=True)
+    engine = create_engine(
+        "sqlite:///bot_database.db", echo=False, future=True,
+        **_sqlite_pool_options("sqlite:///bot_database.db")
+    )
+    _prepare_engine(engine)
+
+# Запись в SQLite идет через один поток-писатель пакетными транзакциями
+sqlite_writer = None
+if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+    sqlite_writer = SQLiteWriter(engine, SQLITE_WRITE_BATCH)
 
 # Создаем фабрику сессий
-SessionLocal = sessionmaker(
+_session_factory = sessionmaker(
     bind=engine,
     autoflush=False,
 )
 
+
+def SessionLocal(**kwargs) -> Session:
+    """
+    Фабрика сессий основной базы. Внутри пакета писателя SQLite сессия
+    работает в его общей транзакции: commit фиксирует только свой SAVEPOINT.
+    """
+    connection = writer_connection.get()
+    if connection is not None:
+        return Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint", **kwargs)
+    return _session_factory(**kwargs)
+
+
+def serialized_write(fn):
+    """
+    Декоратор функций записи. В режиме SQLite вызов выполняется потоком-писателем
+    (в общей пакетной транзакции), для остальных СУБД — как обычно.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if sqlite_writer is None:
+            return fn(*args, **kwargs)
+        return sqlite_writer.call(fn, *args, **kwargs)
+    return wrapper
+
+# Необязательная реплика для чтения со своим пулом соединений
+replica_engine = None
+if DATABASE_REPLICA_URL:
+    try:
+        replica_engine = create_engine(
+            DATABASE_REPLICA_URL,
+            echo=False,
+            future=True,
+            pool_pre_ping=True,
+            **_sqlite_pool_options(DATABASE_REPLICA_URL)
+        )
+        _prepare_engine(replica_engine)
+        with replica_engine.connect() as conn:
+            logger.info("Соединение с репликой базы данных успешно установлено")
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при подключении к реплике, чтение пойдет в основную базу: {str(e)}")
+        replica_engine = None
+
+ReplicaSessionLocal = sessionmaker(
+    bind=replica_engine or engine,
+    autoflush=False,
+)
+
+# Read-your-writes: после своей записи пользователь какое-то время читает
+# из основной базы, пока реплика не догонит ее
+_pinned_users: dict[int, float] = {}
+_replica_down_until = 0.0
+
+
+def _current_user_id() -> int | None:
+    context = log_context.get()
+    return context.get("user_id") if context else None
+
+
+def pin_to_primary(user_id: int | None) -> None:
+    """Направляет чтения пользователя в основную базу на REPLICA_PIN_SECONDS"""
+    if user_id is not None and replica_engine is not None:
+        _pinned_users[user_id] = time.monotonic() + REPLICA_PIN_SECONDS
+
+
+def _is_pinned(user_id: int | None) -> bool:
+    if user_id is None:
+        return False
+    deadline = _pinned_users.get(user_id)
+    if deadline is None:
+        return False
+    if deadline < time.monotonic():
+        _pinned_users.pop(user_id, None)
+        return False
+    return True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_after_commit(session):
+    # Запись сделана в рамках апдейта пользователя — закрепляем его за основной базой
+    if session.info.pop("has_writes", False):
+        pin_to_primary(_current_user_id())
+
+
+@contextmanager
+def read_session(user_id: int | None = None) -> Session:
+    """
+    Сессия только для чтения. Идет в реплику, если она настроена и доступна,
+    иначе — в основную базу. Пользователь, недавно писавший в базу
+    (user_id или пользователь текущего апдейта), читает из основной базы.
+    """
+    global _replica_down_until
+    if user_id is None:
+        user_id = _current_user_id()
+
+    if replica_engine is None or _is_pinned(user_id) or time.monotonic() < _replica_down_until:
+        with SessionLocal() as session:
+            yield session
+        return
+
+    session = ReplicaSessionLocal()
+    try:
+        session.connection()
+    except SQLAlchemyError as e:
+        session.close()
+        logger.error(f"Реплика недоступна, чтение переключено на основную базу: {str(e)}")
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        with SessionLocal() as session:
+            yield session
+        return
+
+    try:
+        yield session
+    finally:
+        session.close()
+
 # Базовый класс для объявления моделей
 Base = declarative_base()
 
@@ -1,10 +1,14 @@
 import datetime
 import logging
-from sqlalchemy import select
-from sqlalchemy.exc import SQLAlchemyError
-from db_base import SessionLocal
-from models import User, Job
-from sqlalchemy import func, and_
+import threading
+from collections import Counter, OrderedDict
+from sqlalchemy import select, update, delete, inspect, text, literal, bindparam, MetaData
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from config import KNOWN_USERS_CACHE_SIZE
+from db_base import SessionLocal, read_session, serialized_write
+from dedup import check_vacancies, save_fingerprints, forget_fingerprints
+from models import User, Job, PublishTask, BotState
+from sqlalchemy import func, or_, case
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -18,43 +22,348 @@ def init_db():
     from db_base import Base, engine
     try:
         Base.metadata.create_all(bind=engine)
+        _sync_schema(engine)
         logger.info("База данных успешно инициализирована")
     except SQLAlchemyError as e:
         logger.error(f"Ошибка при инициализации базы данных: {str(e)}")
         raise
 
 
+def _sync_schema(engine):
+    """
+    create_all не трогает уже существующие таблицы, поэтому колонки и индексы,
+    добавленные в модели позже, создаем отдельно, а колонки, ставшие
+    необязательными, делаем NULL-able.
+    """
+    from db_base import Base
+    inspector = inspect(engine)
+    added = set()
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        db_columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in db_columns:
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(
+                        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {default}"
+                with engine.begin() as conn:
+                    conn.execute(text(ddl))
+                added.add(f"{table.name}.{column.name}")
+                logger.info(f"Добавлена колонка {table.name}.{column.name}")
+            elif column.nullable and not column.primary_key and not db_columns[column.name]["nullable"]:
+                _drop_not_null(engine, table, column, list(db_columns))
+                logger.info(f"Колонка {table.name}.{column.name} теперь допускает NULL")
+
+        existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                logger.info(f"Создан индекс {index.name}")
+
+    # Счетчики вакансий у существующих пользователей заполняются один раз
+    if "users.jobs_count" in added:
+        updated = backfill_job_counters(engine)
+        logger.info(f"Счетчики вакансий заполнены у {updated} пользователей")
+
+
+def _drop_not_null(engine, table, column, db_column_names: list[str]):
+    """Снимает NOT NULL с колонки. SQLite этого не умеет, поэтому таблица пересоздается"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL"))
+        elif dialect == "mysql":
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} MODIFY {column.name} {column_type} NULL"))
+        elif dialect == "sqlite":
+            # Копия таблицы под временным именем; ссылки внешних ключей должны разрешаться,
+            # поэтому копируем и связанные таблицы (сами они не создаются)
+            metadata = MetaData()
+            for other in table.metadata.sorted_tables:
+                if other is not table:
+                    other.to_metadata(metadata)
+            new_table = table.to_metadata(metadata, name=f"{table.name}__new")
+            for index in list(new_table.indexes):
+                new_table.indexes.discard(index)
+
+            new_table.create(conn)
+            columns = ", ".join(name for name in db_column_names if name in new_table.c)
+            conn.execute(text(f"INSERT INTO {new_table.name} ({columns}) SELECT {columns} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+            # Индексы создадутся заново в _sync_schema
+
+
+def backfill_job_counters(engine, batch: int = 1000) -> int:
+    """
+    Пересчитывает jobs_count, jobs_today и last_post_at по таблице jobs: один
+    проход с группировкой и обновление пачками. Нужен при появлении колонок и
+    после массовой загрузки вакансий в обход count_jobs_added.
+    """
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(
+                Job.user_id,
+                func.count(Job.id),
+                func.sum(case((Job.created_at >= today_start, 1), else_=0)),
+                func.max(Job.created_at),
+            ).group_by(Job.user_id)
+        ).all()
+        stmt = (
+            update(User)
+            .where(User.telegram_id == bindparam("uid"))
+            .values(jobs_count=bindparam("total"), jobs_today=bindparam("today"), last_post_at=bindparam("last"))
+        )
+        for i in range(0, len(rows), batch):
+            conn.execute(stmt, [
+                {"uid": user_id, "total": total, "today": today or 0, "last": last}
+                for user_id, total, today, last in rows[i:i + batch]
+            ])
+        conn.commit()
+    return len(rows)
+
+
+def count_jobs_added(session, user_ids: list[int]) -> None:
+    """
+    Учитывает новые вакансии в счетчиках авторов (по одному user_id на вакансию).
+    Вызывается в транзакции, которая вставляет вакансии.
+    """
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for user_id, added in Counter(user_ids).items():
+        # ordered_values: MySQL вычисляет SET слева направо, и last_post_at
+        # должен обновиться после того, как по нему пересчитан jobs_today
+        session.execute(
+            update(User)
+            .where(User.telegram_id == user_id)
+            .ordered_values(
+                (User.jobs_count, func.coalesce(User.jobs_count, 0) + added),
+                (User.jobs_today, case(
+                    (User.last_post_at >= today_start, func.coalesce(User.jobs_today, 0) + added),
+                    else_=added
+                )),
+                (User.last_post_at, now),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def count_jobs_removed(session, job_ids: list[int]) -> None:
+    """
+    Вычитает вакансии из счетчиков авторов. Вызывается в транзакции, которая
+    их удаляет, до самого удаления. last_post_at не откатывается: окно
+    антиспама считается от последней публикации, даже удаленной.
+    """
+    if not job_ids:
+        return
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = session.execute(
+        select(Job.user_id, func.count(Job.id), func.sum(case((Job.created_at >= today_start, 1), else_=0)))
+        .where(Job.id.in_(job_ids))
+        .group_by(Job.user_id)
+    ).all()
+    for user_id, total, today in rows:
+        today = today or 0
+        session.execute(
+            update(User)
+            .where(User.telegram_id == user_id)
+            .values(
+                jobs_count=case((User.jobs_count > total, User.jobs_count - total), else_=0),
+                jobs_today=case((User.jobs_today > today, User.jobs_today - today), else_=0),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def jobs_today(user: User) -> int:
+    """Сколько вакансий пользователь разместил сегодня — по счетчику, без запроса к jobs"""
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if user.last_post_at is None or user.last_post_at < today_start:
+        return 0
+    return user.jobs_today or 0
+
+
+def _upsert_user_stmt(dialect: str, user_id: int, username: str):
+    """
+    Один запрос "вставить или обновить username" для текущей СУБД.
+    Существующая строка перезаписывается только при смене username.
+    """
+    values = {"telegram_id": user_id, "username": username}
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(User).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"username": stmt.excluded.username},
+            where=User.username.is_distinct_from(stmt.excluded.username)
+        )
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(User).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"username": stmt.excluded.username},
+            where=User.username.is_distinct_from(stmt.excluded.username)
+        )
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(User).values(**values)
+        return stmt.on_duplicate_key_update(username=stmt.inserted.username)
+    return None
+
+
+@serialized_write
+def _upsert_user(user_id: int, username: str) -> bool:
+    try:
+        with SessionLocal() as session:
+            stmt = _upsert_user_stmt(session.get_bind().dialect.name, user_id, username)
+            if stmt is not None:
+                changed = session.execute(stmt).rowcount
+            else:
+                # Прочие СУБД: гонку двух вставок ловит уникальный индекс telegram_id
+                user = session.execute(select(User).where(User.telegram_id == user_id)).scalar_one_or_none()
+                changed = 0
+                if not user:
+                    session.add(User(telegram_id=user_id, username=username))
+                    changed = 1
+                elif user.username != username:
+                    user.username = username
+                    changed = 1
+            session.commit()
+        if changed:
+            logger.info(f"Сохранен пользователь: {user_id}")
+        return True
+    except IntegrityError:
+        # Пользователя параллельно создал другой апдейт
+        return True
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при добавлении пользователя {user_id}: {str(e)}")
+        return False
+
+
+# Пользователи, уже записанные в базу с этим username: telegram_id → username.
+# Повторный /start такого пользователя не обращается к базе, а смена
+# username подхватывается при следующем обращении (кеш не совпадет).
+_known_users: OrderedDict[int, str] = OrderedDict()
+_known_users_lock = threading.Lock()
+
+
 def insert_user(user_id: int, username: str) -> None:
     """
-    Создает запись о пользователе в базе данных, если она не существует.
+    Создает запись о пользователе в базе данных, если она не существует,
+    и обновляет username, если он изменился.
 
     Args:
         user_id: Telegram ID пользователя
         username: Username пользователя
     """
-    try:
-        with SessionLocal() as session:
-            # Проверяем существование пользователя
-            stmt = select(User).where(User.telegram_id == user_id)
-            user = session.execute(stmt).scalar_one_or_none()
+    with _known_users_lock:
+        if _known_users.get(user_id) == username:
+            _known_users.move_to_end(user_id)
+            return
 
-            if not user:
-                # Создаем нового пользователя
-                user = User(telegram_id=user_id, username=username)
-                session.add(user)
-                session.commit()
-                logger.info(f"Добавлен новый пользователь: {user_id}")
-    except SQLAlchemyError as e:
-        logger.error(f"Ошибка при добавлении пользователя {user_id}: {str(e)}")
+    if not _upsert_user(user_id, username):
+        return
+
+    with _known_users_lock:
+        _known_users[user_id] = username
+        _known_users.move_to_end(user_id)
+        while len(_known_users) > KNOWN_USERS_CACHE_SIZE:
+            _known_users.popitem(last=False)
 
 
-def update_invite_count(user_id: int):
+@serialized_write
+def update_invite_count(user_id: int) -> bool:
+    """
+    Засчитывает приглашение в группу: каждые 5 приглашений дают одну публикацию.
+    Возвращает False, если пригласившего нет в базе.
+    """
     with SessionLocal() as session:
         user = session.query(User).filter_by(telegram_id=user_id).first()
-        if user:
-            user.invites += 1
-            session.commit()
+        if not user:
+            return False
+        user.invites += 1
+        if user.invites >= 5 and user.invites % 5 == 0:
+            user.allowed_posts += 1
+        session.commit()
+        return True
+
+
+@serialized_write
+def revoke_invite() -> int | None:
+    """
+    Участник вышел из группы. Кто его пригласил, неизвестно, поэтому приглашение
+    снимается у пользователя с наибольшим их числом, а если их стало меньше 5 —
+    и бонусная публикация. Возвращает telegram_id этого пользователя.
+    """
+    with SessionLocal() as session:
+        inviter = session.query(User).filter(User.invites > 0).order_by(User.invites.desc()).first()
+        if not inviter:
+            return None
+        inviter.invites -= 1
+        if inviter.invites < 5 and inviter.allowed_posts > 0:
+            inviter.allowed_posts -= 1
+        telegram_id = inviter.telegram_id
+        session.commit()
+    return telegram_id
+
+
+@serialized_write
+def grant_invite_post(user_id: int) -> bool:
+    """Дает одну публикацию за 5+ приглашенных друзей и сбрасывает счетчик приглашений"""
+    with SessionLocal() as session:
+        granted = session.execute(
+            update(User)
+            .where(User.telegram_id == user_id, User.invites >= 5)
+            .values(allowed_posts=1, invites=0)
+        ).rowcount
+        session.commit()
+    return bool(granted)
 
+
+@serialized_write
+def grant_posting(user_identifier: str, mode: str) -> dict | None:
+    """
+    Выдает права публикации: mode — "permanent" (постоянное разрешение),
+    "month" (подписка на 30 дней) или "once" (еще одна разовая публикация).
+    user_identifier — @username или telegram_id. Возвращает прежние и новые
+    значения прав или None, если пользователь не найден.
+    """
+    with SessionLocal() as session:
+        if user_identifier.startswith("@"):
+            user = session.query(User).filter_by(username=user_identifier[1:]).first()
+        elif user_identifier.isdigit():
+            user = session.query(User).filter_by(telegram_id=int(user_identifier)).first()
+        else:
+            user = None
+        if not user:
+            return None
+
+        old = (user.can_post, user.can_post_until, user.allowed_posts)
+        if mode == "permanent":
+            user.can_post, user.can_post_until, user.allowed_posts = True, None, 0
+        elif mode == "month":
+            user.can_post, user.can_post_until, user.allowed_posts = False, datetime.now() + timedelta(days=30), 0
+        else:
+            user.can_post, user.can_post_until = False, None
+            user.allowed_posts += 1
+        rights = {
+            "telegram_id": user.telegram_id,
+            "old": old,
+            "can_post_until": user.can_post_until,
+            "allowed_posts": user.allowed_posts,
+        }
+        session.commit()
+    return rights
+
+
+@serialized_write
 def allow_user_posting(user_identifier: str) -> (bool, str):
     """
     Разрешить пользователю публиковать вакансии (can_post = True).
@@ -84,26 +393,426 @@ def allow_user_posting(user_identifier: str) -> (bool, str):
         return False, "Ошибка при обращении к базе данных."
 
 
+@serialized_write
 def save_job_db(user_id: int, message_id: int, all_info: dict) -> bool:
     try:
         with SessionLocal() as session:
             job = Job(user_id=user_id, message_id=message_id, all_info=all_info)
             session.add(job)
+            count_jobs_added(session, [user_id])
             session.commit()
         return True
     except SQLAlchemyError as e:
         logger.error(f"Ошибка при сохранении вакансии: {e}")
         return False
 
-def get_user_jobs_db(user_id: int) -> list[Job]:
+def reserve_post_quota(session, user_ids: list[int]) -> list[bool]:
+    """
+    Списывает разовые публикации под новые вакансии (по одному user_id на вакансию).
+    Вызывается в транзакции, которая их вставляет, до count_jobs_added: иначе
+    несколько отложенных вакансий прошли бы проверку с одной оставшейся публикацией.
+    Публикация не списывается за первую вакансию пользователя, при постоянном
+    разрешении и когда разовых публикаций не осталось. Возвращает по флагу на вакансию.
+    """
+    users = {
+        row.telegram_id: row
+        for row in session.execute(
+            select(User.telegram_id, User.can_post, User.allowed_posts, User.jobs_count)
+            .where(User.telegram_id.in_(set(user_ids)))
+            .with_for_update()
+        ).all()
+    }
+    added = Counter()
+    spent = Counter()
+    reserved = []
+    for user_id in user_ids:
+        user = users.get(user_id)
+        previous = (user.jobs_count or 0) + added[user_id] if user else 0
+        added[user_id] += 1
+        charge = bool(
+            user and previous and not user.can_post
+            and (user.allowed_posts or 0) > spent[user_id]
+        )
+        if charge:
+            spent[user_id] += 1
+        reserved.append(charge)
+    for user_id, count in spent.items():
+        session.execute(
+            update(User)
+            .where(User.telegram_id == user_id)
+            .values(allowed_posts=User.allowed_posts - count)
+            .execution_options(synchronize_session=False)
+        )
+    return reserved
+
+
+def refund_post_quota(session, job_ids: list[int]) -> None:
+    """
+    Возвращает разовые публикации, списанные под вакансии, которые так и не вышли.
+    Вызывается в транзакции, которая их удаляет, до самого удаления.
+    """
+    if not job_ids:
+        return
+    rows = session.execute(
+        select(PublishTask.user_id, func.count(PublishTask.id))
+        .where(PublishTask.job_id.in_(job_ids), PublishTask.quota_reserved == True)
+        .group_by(PublishTask.user_id)
+    ).all()
+    for user_id, count in rows:
+        session.execute(
+            update(User)
+            .where(User.telegram_id == user_id)
+            .values(allowed_posts=func.coalesce(User.allowed_posts, 0) + count)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _is_fingerprint_conflict(error: IntegrityError) -> bool:
+    """Ошибка уникального индекса по content_hash: отпечаток такой же вакансии уже записан"""
+    return "content_hash" in str(error.orig)
+
+
+def enqueue_publication(user_id: int, all_info: dict, publish_at: datetime | None = None,
+                        notify_user: bool = True) -> tuple[int | None, str | None]:
+    """
+    Создает вакансию и запись в очереди публикации одной транзакцией (outbox).
+    В той же транзакции списывается разовая публикация, если она нужна;
+    если вакансия не выйдет, fail_publication ее вернет.
+    message_id у вакансии появится после публикации.
+    Возвращает (id вакансии, вид дубля): дубль ("exact" / "near") не сохраняется,
+    при ошибке возвращается (None, None).
+    """
+    results = enqueue_publications_batch([(user_id, all_info)], publish_at, notify_user)
+    return results[0] if results else (None, None)
+
+
+@serialized_write
+def enqueue_publications_batch(items: list[tuple[int, dict]], publish_at: datetime | None = None,
+                               notify_user: bool = True) -> list[tuple[int | None, str | None]]:
+    """
+    То же, что enqueue_publication, но для пачки вакансий — одна транзакция на пачку.
+    items — список пар (user_id, all_info). Возвращает пары (id вакансии, вид дубля)
+    в том же порядке.
+    """
+    if not items:
+        return []
     try:
         with SessionLocal() as session:
+            # Проверка дублей и отпечатки — в той же транзакции, что и сами вакансии:
+            # одинаковые вакансии не проходят одновременно, а отпечаток есть только у сохраненных
+            duplicates, stale = check_vacancies(session, items)
+            accepted = [item for item, duplicate in zip(items, duplicates) if not duplicate]
+            job_ids = []
+            if accepted:
+                reserved = reserve_post_quota(session, [user_id for user_id, _ in accepted])
+                jobs = [Job(user_id=user_id, message_id=None, all_info=all_info) for user_id, all_info in accepted]
+                session.add_all(jobs)
+                session.flush()
+                session.add_all([
+                    PublishTask(
+                        job_id=job.id,
+                        user_id=job.user_id,
+                        all_info=job.all_info,
+                        publish_at=publish_at or datetime.now(),
+                        notify_user=notify_user,
+                        quota_reserved=quota_reserved,
+                    )
+                    for job, quota_reserved in zip(jobs, reserved)
+                ])
+                count_jobs_added(session, [user_id for user_id, _ in accepted])
+                save_fingerprints(session, [(job.user_id, job.id, job.all_info) for job in jobs], stale)
+                # id берутся до commit: после него каждая вакансия перечитывалась бы отдельным SELECT
+                job_ids = [job.id for job in jobs]
+                session.commit()
+            ids = iter(job_ids)
+            return [(None, duplicate) if duplicate else (next(ids), None) for duplicate in duplicates]
+    except IntegrityError as e:
+        if not _is_fingerprint_conflict(e):
+            logger.error(f"Ошибка при постановке вакансий в очередь: {e}")
+            return []
+        # Такую же вакансию одновременно принял другой экземпляр бота: повторная
+        # проверка увидит его отпечаток и вернет для нее "exact"
+        return enqueue_publications_batch(items, publish_at, notify_user)
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при постановке вакансий в очередь: {e}")
+        return []
+
+
+@serialized_write
+def claim_due_publications(limit: int) -> list[dict]:
+    """
+    Забирает в работу задачи, время публикации которых наступило:
+    переводит их в статус sending, чтобы после падения их можно было восстановить.
+    """
+    now = datetime.now()
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(PublishTask.id, PublishTask.job_id, PublishTask.user_id, PublishTask.all_info,
+                   PublishTask.attempts, PublishTask.notify_user)
+            .where(PublishTask.status == "pending", PublishTask.publish_at <= now)
+            .order_by(PublishTask.publish_at, PublishTask.id)
+            .limit(limit)
+        ).all()
+        if rows:
+            session.execute(
+                update(PublishTask)
+                .where(PublishTask.id.in_([row.id for row in rows]), PublishTask.status == "pending")
+                .values(status="sending", claimed_at=now)
+            )
+            session.commit()
+    return [row._asdict() for row in rows]
+
+
+def job_exists(job_id: int) -> bool:
+    """Есть ли еще вакансия (ее могли удалить, пока она ждала публикации)"""
+    with SessionLocal() as session:
+        return session.execute(select(Job.id).where(Job.id == job_id)).first() is not None
+
+
+@serialized_write
+def record_sent_message(task_id: int, message_id: int, channel_id: int) -> None:
+    """
+    Запоминает в задаче отправленный пост сразу после ответа Telegram, отдельной
+    записью: если бот упадет до complete_publication, восстановление закроет
+    задачу по этому message_id, не отправляя пост второй раз.
+    """
+    with SessionLocal() as session:
+        session.execute(
+            update(PublishTask)
+            .where(PublishTask.id == task_id)
+            .values(message_id=message_id, channel_id=channel_id)
+        )
+        session.commit()
+
+
+def _finish_task(session, task_id: int, job_id: int, message_id: int, channel_id: int | None) -> int:
+    """Записывает пост в вакансию и закрывает задачу. Возвращает число обновленных вакансий"""
+    updated = session.execute(
+        update(Job).where(Job.id == job_id).values(message_id=message_id, channel_id=channel_id)
+    ).rowcount
+    session.execute(
+        update(PublishTask)
+        .where(PublishTask.id == task_id)
+        .values(status="done", message_id=message_id, channel_id=channel_id, attempts=PublishTask.attempts + 1)
+    )
+    return updated
+
+
+@serialized_write
+def complete_publication(task_id: int, job_id: int, message_id: int, channel_id: int | None) -> bool:
+    """
+    Записывает message_id и канал в вакансию и закрывает задачу одной транзакцией.
+    Возвращает False, если вакансию успели удалить, пока она ждала публикации.
+    """
+    with SessionLocal() as session:
+        updated = _finish_task(session, task_id, job_id, message_id, channel_id)
+        session.commit()
+    return bool(updated)
+
+
+@serialized_write
+def retry_publication(task_id: int, error: str, delay: float):
+    """Возвращает задачу в очередь с отсрочкой"""
+    with SessionLocal() as session:
+        session.execute(
+            update(PublishTask)
+            .where(PublishTask.id == task_id)
+            .values(
+                status="pending",
+                publish_at=datetime.now() + timedelta(seconds=delay),
+                attempts=PublishTask.attempts + 1,
+                last_error=error,
+            )
+        )
+        session.commit()
+
+
+@serialized_write
+def fail_publication(task_id: int, job_id: int | None, error: str):
+    """
+    Окончательная ошибка публикации: задача помечается failed, неопубликованная
+    вакансия удаляется, а списанная под нее разовая публикация возвращается
+    """
+    with SessionLocal() as session:
+        session.execute(
+            update(PublishTask)
+            .where(PublishTask.id == task_id)
+            .values(status="failed", attempts=PublishTask.attempts + 1, last_error=error)
+        )
+        if job_id is not None:
+            unpublished = session.execute(
+                select(Job.id).where(Job.id == job_id, Job.message_id.is_(None))
+            ).scalars().all()
+            # Вакансия так и не вышла — она не должна занимать первую бесплатную публикацию
+            count_jobs_removed(session, unpublished)
+            if unpublished:
+                refund_post_quota(session, unpublished)
+                forget_fingerprints(session, unpublished)
+                session.execute(delete(Job).where(Job.id.in_(unpublished)))
+        session.commit()
+
+
+@serialized_write
+def recover_publications() -> int:
+    """
+    Восстановление после перезапуска: задачи, застрявшие в статусе sending.
+    Если пост успел записаться в задачу (record_sent_message), задача
+    закрывается без повторной отправки, иначе возвращается в очередь.
+    """
+    with SessionLocal() as session:
+        stuck = session.execute(
+            select(PublishTask.id, PublishTask.job_id, PublishTask.message_id, PublishTask.channel_id)
+            .where(PublishTask.status == "sending")
+        ).all()
+        for task_id, job_id, message_id, channel_id in stuck:
+            if message_id:
+                _finish_task(session, task_id, job_id, message_id, channel_id)
+            else:
+                session.execute(update(PublishTask).where(PublishTask.id == task_id).values(status="pending"))
+        session.commit()
+    return len(stuck)
+
+
+def get_next_publish_at() -> datetime | None:
+    """Время ближайшей запланированной публикации"""
+    with SessionLocal() as session:
+        return session.execute(
+            select(func.min(PublishTask.publish_at)).where(PublishTask.status == "pending")
+        ).scalar()
+
+
+def get_pending_publications(user_id: int) -> list[PublishTask]:
+    """Вакансии пользователя, которые еще ждут публикации"""
+    with read_session(user_id) as session:
+        return session.query(PublishTask).filter(
+            PublishTask.user_id == user_id,
+            PublishTask.status.in_(["pending", "sending"])
+        ).order_by(PublishTask.publish_at).all()
+
+
+def get_state_value(key: str) -> int | None:
+    """Читает служебное значение из bot_state"""
+    with SessionLocal() as session:
+        return session.execute(select(BotState.value).where(BotState.key == key)).scalar()
+
+
+@serialized_write
+def set_state_value(key: str, value: int) -> None:
+    """Записывает служебное значение как есть, в том числе меньше сохраненного"""
+    with SessionLocal() as session:
+        state = session.get(BotState, key)
+        if state is None:
+            session.add(BotState(key=key, value=value, updated_at=datetime.now()))
+        else:
+            state.value = value
+            state.updated_at = datetime.now()
+        session.commit()
+
+
+@serialized_write
+def advance_state_value(key: str, value: int) -> int:
+    """
+    Монотонно увеличивает служебное значение: запись меняется, только если
+    новое значение больше сохраненного, поэтому несколько экземпляров бота
+    могут обновлять его одновременно. Возвращает итоговое значение.
+    """
+    with SessionLocal() as session:
+        result = session.execute(
+            update(BotState)
+            .where(BotState.key == key, (BotState.value < value) | BotState.value.is_(None))
+            .values(value=value, updated_at=datetime.now())
+        )
+        if result.rowcount == 0 and session.get(BotState, key) is None:
+            session.add(BotState(key=key, value=value, updated_at=datetime.now()))
+            try:
+                session.commit()
+                return value
+            except IntegrityError:
+                # Запись одновременно создал другой экземпляр
+                session.rollback()
+                return advance_state_value(key, value)
+        session.commit()
+        return session.execute(select(BotState.value).where(BotState.key == key)).scalar()
+
+
+def get_user_jobs_db(user_id: int) -> list[Job]:
+    try:
+        with read_session(user_id) as session:
             jobs = session.query(Job).filter_by(user_id=user_id).order_by(Job.created_at.desc()).all()
         return jobs
     except SQLAlchemyError as e:
         logger.error(f"Ошибка при получении вакансий: {e}")
         return []
 
+@serialized_write
+def delete_user_job(user_id: int, job_id: int) -> tuple[bool, int | None, int | None]:
+    """
+    Удаляет вакансию владельца вместе с задачей в очереди публикации.
+    Возвращает (найдена, message_id, channel_id): пост из канала удаляет вызывающий.
+    """
+    with SessionLocal() as session:
+        job = session.query(Job).filter_by(id=job_id, user_id=user_id).first()
+        if not job:
+            return False, None, None
+        message_id, channel_id = job.message_id, job.channel_id
+        count_jobs_removed(session, [job_id])
+        if message_id is None:
+            refund_post_quota(session, [job_id])
+        forget_fingerprints(session, [job_id])
+        session.delete(job)
+        session.commit()
+    return True, message_id, channel_id
+
+
+@serialized_write
+def update_job_info(user_id: int, job_id: int, all_info: dict, queued: bool = False,
+                    publish_at: datetime | None = None) -> tuple[bool, str | None]:
+    """
+    Сохраняет новую версию вакансии вместе с ее отпечатком, проверяя в той же
+    транзакции дубли среди чужих вакансий. Возвращает (сохранено, вид дубля).
+
+    Для вакансии в очереди (queued) обновляется и ожидающая задача публикации
+    (и время публикации, если задано publish_at); дубль не сохраняется, а если публикатор уже забрал задачу, ничего не меняется
+    и возвращается (False, None) — в канал ушла бы прежняя версия.
+    Опубликованная вакансия сохраняется всегда: пост в канале уже изменен
+    (после проверки find_duplicate), а если за это время такую же вакансию
+    принял кто-то другой, у правки просто не будет своего отпечатка.
+    """
+    with SessionLocal() as session:
+        forget_fingerprints(session, [job_id])
+        (duplicate,), stale = check_vacancies(session, [(user_id, all_info)], exclude_user_id=user_id)
+        if queued:
+            if duplicate:
+                return False, duplicate
+            values = {"all_info": all_info}
+            if publish_at:
+                values["publish_at"] = publish_at
+            updated = session.execute(
+                update(PublishTask)
+                .where(PublishTask.job_id == job_id, PublishTask.user_id == user_id, PublishTask.status == "pending")
+                .values(**values)
+            ).rowcount
+            if not updated:
+                return False, None
+        updated = session.execute(
+            update(Job).where(Job.id == job_id, Job.user_id == user_id).values(all_info=all_info)
+        ).rowcount
+        if not updated:
+            return False, None
+        if not duplicate:
+            try:
+                save_fingerprints(session, [(user_id, job_id, all_info)], stale)
+            except IntegrityError as e:
+                if not _is_fingerprint_conflict(e):
+                    raise
+                # Такую же вакансию одновременно принял другой экземпляр бота — проверяем заново
+                session.rollback()
+                return update_job_info(user_id, job_id, all_info, queued, publish_at)
+        session.commit()
+    return True, None
+
+
+@serialized_write
 def delete_job_and_get_message(user_id: int, index: int) -> tuple[int | None, bool]:
     try:
         with SessionLocal() as session:
@@ -112,6 +821,10 @@ def delete_job_and_get_message(user_id: int, index: int) -> tuple[int | None, bo
                 return None, False
             job = jobs[index]
             message_id = job.message_id
+            count_jobs_removed(session, [job.id])
+            if message_id is None:
+                refund_post_quota(session, [job.id])
+            forget_fingerprints(session, [job.id])
             session.delete(job)
             session.commit()
             return message_id, True
@@ -121,7 +834,7 @@ def delete_job_and_get_message(user_id: int, index: int) -> tuple[int | None, bo
 
 def can_post_more(user_id: int, daily_limit: int = 1) -> bool:
     try:
-        with SessionLocal() as session:
+        with read_session(user_id) as session:
             user = session.query(User).filter_by(telegram_id=user_id).first()
             if not user:
                 return False  # пользователь не найден — запретить
@@ -130,16 +843,8 @@ def can_post_more(user_id: int, daily_limit: int = 1) -> bool:
             if user.can_post:
                 return True
 
-            # Считаем, сколько вакансий пользователь опубликовал сегодня
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            count_today = session.query(func.count(Job.id)).filter(
-                and_(
-                    Job.user_id == user_id,
-                    Job.created_at >= today_start
-                )
-            ).scalar()
-
-            return count_today < daily_limit
+            # Сколько вакансий пользователь опубликовал сегодня
+            return jobs_today(user) < daily_limit
     except Exception as e:
         logger.error(f"Ошибка при проверке can_post_more: {e}")
         return False
@@ -151,41 +856,38 @@ def can_post_more_extended(user_id: int) -> tuple[bool, str, int]:
     Возвращает: (может_публиковать, сообщение, количество_приглашений)
     """
     try:
-        with SessionLocal() as session:
+        # Только чтение: идет в реплику, а пользователь, недавно писавший в базу, — в основную
+        with read_session(user_id) as session:
             user = session.query(User).filter_by(telegram_id=user_id).first()
 
             if not user:
                 # Новый пользователь - первая публикация бесплатно
                 return True, "Первая публикация бесплатно!", 0
 
-            # Если у пользователя can_post = True - всегда можем
+            # Если у пользователя can_post = True - всегда можем публиковать
             if user.can_post:
-                return True, "У вас есть разрешение на публикацию", user.invites
-
-            now = datetime.now()
+                return True, "У вас есть постоянное разрешение на публикацию", user.invites
 
             # Проверка месячной подписки
-            if user.can_post_until and user.can_post_until > now:
-                return True, "У вас есть месячная подписка", user.invites
+            if user.can_post_until and user.can_post_until > datetime.now():
+                return True, f"У вас есть месячная подписка до {user.can_post_until.strftime('%d.%m.%Y %H:%M')}", user.invites
 
             # Проверка разовых публикаций
             if user.allowed_posts > 0:
                 return True, f"Осталось публикаций: {user.allowed_posts}", user.invites
 
             # Проверка первой бесплатной публикации
-            job_count = session.query(func.count(Job.id)).filter_by(user_id=user_id).scalar()
-            if job_count == 0:
+            if not user.jobs_count:
                 return True, "Первая публикация бесплатно!", user.invites
 
-            # Проверка приглашенных друзей (5+ друзей = 1 публикация)
-            if user.invites >= 5:
-                # Даем одну публикацию и сбрасываем счетчик приглашений
-                user.allowed_posts = 1
-                user.invites = 0  # Сбрасываем счетчик
-                session.commit()
-                return True, "Получена публикация за приглашение друзей!", 0
+            invites = user.invites
+
+        # Проверка приглашенных друзей (5+ друзей = 1 публикация): даем одну публикацию
+        # и сбрасываем счетчик приглашений — это запись, поэтому в основную базу
+        if invites >= 5 and grant_invite_post(user_id):
+            return True, "Получена публикация за приглашение друзей!", 0
 
-            return False, "Вы уже опубликовали бесплатную вакансию.", user.invites
+        return False, "У вас нет доступных публикаций.", invites
 
     except Exception as e:
         logger.error(f"Ошибка при can_post_more_extended для пользователя {user_id}: {e}")
@@ -211,17 +913,23 @@ def get_daily_stats():
             'daily_users': daily_users or 0
         }
 
-def update_user_last_activity(user_id: int):
-    """Обновление времени последней активности пользователя"""
+
+@serialized_write
+def touch_users_activity(touches: dict[int, datetime]) -> int:
+    """
+    Записывает время последней активности пачке пользователей одним UPDATE
+    (telegram_id → время). Время только сдвигается вперед. Возвращает число обновленных строк.
+    """
+    if not touches:
+        return 0
+    new_value = case(touches, value=User.telegram_id)
     with SessionLocal() as session:
-        try:
-            user = session.query(User).filter(User.user_id == user_id).first()
-            if user:
-                now = datetime.now()
-                user.last_activity = now
-                session.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении времени активности пользователя {user_id}: {str(e)}")
-            session.rollback()
-        return False
+        updated = session.execute(
+            update(User)
+            .where(User.telegram_id.in_(list(touches)))
+            .where(or_(User.last_activity.is_(None), User.last_activity < new_value))
+            .values(last_activity=new_value)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    return updated
@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import random
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import DEDUP_WINDOW_DAYS, DEDUP_SIMILARITY
+from db_base import SessionLocal, serialized_write
+from models import VacancyFingerprint, VacancyBand
+
+logger = logging.getLogger(__name__)
+
+# Параметры MinHash/LSH: 32 хеш-функции, разбитые на 8 корзин по 4 значения.
+# Кандидатом считается вакансия, совпавшая хотя бы в одной корзине,
+# окончательное решение принимается по оценке сходства Жаккара.
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MAX_CANDIDATES = 50
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240601)  # фиксированное зерно: подписи должны совпадать между запусками
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+_TEXT_FIELDS = ("title", "address", "payment", "extra")
+
+
+def normalize_text(value: str) -> str:
+    """Нижний регистр, без пунктуации и лишних пробелов"""
+    value = (value or "").lower().replace("ё", "е")
+    value = _PUNCT_RE.sub(" ", value)
+    return _SPACES_RE.sub(" ", value).strip()
+
+
+def _normalized_vacancy(data: dict) -> str:
+    return " | ".join(normalize_text(data.get(field, "")) for field in _TEXT_FIELDS)
+
+
+def content_hash(data: dict) -> str:
+    """Хеш нормализованного содержимого вакансии вместе с телефоном"""
+    contact = re.sub(r"\D", "", data.get("contact", ""))
+    payload = f"{_normalized_vacancy(data)} | {contact}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash_signature(data: dict) -> list[int]:
+    """MinHash-подпись по символьным шинглам нормализованного текста"""
+    text = _normalized_vacancy(data)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+    hashes = [_hash64(shingle) for shingle in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature: list[int]) -> list[int]:
+    """Ключи LSH-корзин подписи (номер корзины входит в ключ)"""
+    buckets = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        key = f"{band}:" + ",".join(map(str, chunk))
+        # Знаковый BigInteger: берем 63 бита
+        buckets.append(_hash64(key) & ((1 << 63) - 1))
+    return buckets
+
+
+def similarity(first: list[int], second: list[int]) -> float:
+    """Оценка сходства Жаккара по двум подписям"""
+    if len(first) != len(second):
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def find_duplicate(data: dict, exclude_user_id: int | None = None) -> str | None:
+    """
+    Ищет среди недавно принятых вакансий точный или почти-дубль.
+    Поиск идет по индексам: один запрос по content_hash и один по LSH-корзинам.
+    Возвращает "exact", "near" или None.
+    """
+    if DEDUP_WINDOW_DAYS <= 0:
+        return None
+
+    since = datetime.now() - timedelta(days=DEDUP_WINDOW_DAYS)
+    try:
+        with SessionLocal() as session:
+            exact = select(VacancyFingerprint.id).where(
+                VacancyFingerprint.content_hash == content_hash(data),
+                VacancyFingerprint.created_at >= since
+            )
+            if exclude_user_id is not None:
+                exact = exact.where(VacancyFingerprint.user_id != exclude_user_id)
+            if session.execute(exact.limit(1)).first():
+                return "exact"
+
+            signature = minhash_signature(data)
+            candidates = (
+                select(VacancyFingerprint.signature)
+                .join(VacancyBand, VacancyBand.fingerprint_id == VacancyFingerprint.id)
+                .where(
+                    VacancyBand.bucket.in_(band_buckets(signature)),
+                    VacancyFingerprint.created_at >= since
+                )
+                .limit(MAX_CANDIDATES)
+            )
+            if exclude_user_id is not None:
+                candidates = candidates.where(VacancyFingerprint.user_id != exclude_user_id)
+            for (candidate,) in session.execute(candidates):
+                if similarity(signature, candidate) >= DEDUP_SIMILARITY:
+                    return "near"
+    except SQLAlchemyError as e:
+        # Проверка дублей не должна мешать публикации
+        logger.error(f"Ошибка при поиске дублей вакансии: {e}")
+    return None
+
+
+def check_vacancies(session, items: list[tuple[int, dict]],
+                    exclude_user_id: int | None = None) -> tuple[list[str | None], list[int]]:
+    """
+    Проверяет пачку вакансий (user_id, data) на дубли внутри транзакции записи:
+    среди принятых раньше и внутри самой пачки. Два запроса на всю пачку —
+    по content_hash и по LSH-корзинам. Возвращает "exact", "near" или None
+    для каждой вакансии и id отпечатков с теми же хешами, которые дублем не считаются
+    (старше окна проверки или самого exclude_user_id): хеш уникален, поэтому
+    save_fingerprints заменяет их новыми.
+    """
+    if DEDUP_WINDOW_DAYS <= 0 or not items:
+        return [None] * len(items), []
+
+    since = datetime.now() - timedelta(days=DEDUP_WINDOW_DAYS)
+    hashes = [content_hash(data) for _, data in items]
+    signatures = [minhash_signature(data) for _, data in items]
+    buckets = [band_buckets(signature) for signature in signatures]
+
+    existing = {row.content_hash: row for row in session.execute(
+        select(
+            VacancyFingerprint.id, VacancyFingerprint.user_id,
+            VacancyFingerprint.content_hash, VacancyFingerprint.created_at
+        ).where(VacancyFingerprint.content_hash.in_(set(hashes)))
+    )}
+    known = {
+        digest for digest, row in existing.items()
+        if row.created_at >= since and row.user_id != exclude_user_id
+    }
+    candidates = (
+        select(VacancyBand.bucket, VacancyFingerprint.signature)
+        .join(VacancyFingerprint, VacancyBand.fingerprint_id == VacancyFingerprint.id)
+        .where(
+            VacancyBand.bucket.in_({bucket for item_buckets in buckets for bucket in item_buckets}),
+            VacancyFingerprint.created_at >= since
+        )
+        .limit(MAX_CANDIDATES * len(items))
+    )
+    if exclude_user_id is not None:
+        candidates = candidates.where(VacancyFingerprint.user_id != exclude_user_id)
+    by_bucket: dict[int, list[list[int]]] = {}
+    for bucket, signature in session.execute(candidates):
+        by_bucket.setdefault(bucket, []).append(signature)
+
+    result, stale = [], []
+    for digest, signature, item_buckets in zip(hashes, signatures, buckets):
+        if digest in known:
+            result.append("exact")
+        elif any(
+            similarity(signature, candidate) >= DEDUP_SIMILARITY
+            for bucket in item_buckets for candidate in by_bucket.get(bucket, ())
+        ):
+            result.append("near")
+        else:
+            result.append(None)
+            if digest in existing:
+                stale.append(existing[digest].id)
+            # Следующие вакансии пачки сравниваются и с этой
+            known.add(digest)
+            for bucket in item_buckets:
+                by_bucket.setdefault(bucket, []).append(signature)
+    return result, stale
+
+
+def save_fingerprints(session, items: list[tuple[int, int, dict]], stale: list[int]) -> None:
+    """
+    Сохраняет отпечатки принятых вакансий (user_id, job_id, data) в транзакции session,
+    предварительно удалив отпечатки stale из check_vacancies. Если тот же хеш
+    одновременно записал другой процесс, вставка упадет на уникальном индексе
+    и откатит транзакцию вместе с вакансией.
+    """
+    if DEDUP_WINDOW_DAYS <= 0 or not items:
+        return
+
+    if stale:
+        _delete_fingerprints(session, VacancyFingerprint.id.in_(stale))
+    now = datetime.now()
+    fingerprints = [
+        VacancyFingerprint(user_id=user_id, job_id=job_id, content_hash=content_hash(data),
+                           signature=minhash_signature(data), created_at=now)
+        for user_id, job_id, data in items
+    ]
+    session.add_all(fingerprints)
+    session.flush()
+    # Корзины одной вставкой: через ORM каждая шла бы отдельным INSERT ... RETURNING
+    session.execute(insert(VacancyBand), [
+        {"fingerprint_id": fingerprint.id, "bucket": bucket}
+        for fingerprint in fingerprints for bucket in band_buckets(fingerprint.signature)
+    ])
+
+
+def _delete_fingerprints(session, condition) -> int:
+    """Удаляет отпечатки по условию вместе с их корзинами (session — сессия или соединение)"""
+    session.execute(delete(VacancyBand).where(
+        VacancyBand.fingerprint_id.in_(select(VacancyFingerprint.id).where(condition))
+    ))
+    return session.execute(delete(VacancyFingerprint).where(condition)).rowcount
+
+
+def forget_fingerprints(session, job_ids: list[int]) -> None:
+    """Удаляет отпечатки удаленных вакансий, чтобы автор мог опубликовать их заново"""
+    if job_ids:
+        _delete_fingerprints(session, VacancyFingerprint.job_id.in_(job_ids))
+
+
+@serialized_write
+def prune_fingerprints() -> int:
+    """Удаляет отпечатки старше окна проверки дублей"""
+    if DEDUP_WINDOW_DAYS <= 0:
+        return 0
+
+    cutoff = datetime.now() - timedelta(days=DEDUP_WINDOW_DAYS)
+    with SessionLocal() as session:
+        pruned = _delete_fingerprints(session, VacancyFingerprint.created_at < cutoff)
+        session.commit()
+    return pruned
@@ -0,0 +1,124 @@
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, FSInputFile
+from sqlalchemy import select
+
+from config import ADMINS, EXPORT_FETCH_SIZE, EXPORT_MAX_FILE_SIZE
+from db_base import SessionLocal
+from models import User, Job
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+DATE_FORMAT = "%d.%m.%Y"
+VACANCY_FIELDS = ("title", "address", "payment", "contact", "extra")
+
+# Что можно выгрузить: модель и колонки CSV
+EXPORTS = {
+    "jobs": (Job, ["id", "user_id", "message_id", "created_at", *VACANCY_FIELDS]),
+    "users": (User, [
+        "id", "telegram_id", "username", "can_post", "can_post_until",
+        "allowed_posts", "invites", "created_at"
+    ]),
+}
+
+
+def parse_date_range(args: list[str]) -> tuple[datetime | None, datetime | None]:
+    """
+    Разбирает необязательные даты "с" и "по" в формате ДД.ММ.ГГГГ.
+    Дата "по" включается целиком. При неверном формате бросает ValueError.
+    """
+    if len(args) > 2:
+        raise ValueError("Слишком много параметров")
+    dates = [datetime.strptime(arg, DATE_FORMAT) for arg in args]
+    date_from = dates[0] if dates else None
+    date_to = dates[1] + timedelta(days=1) if len(dates) > 1 else None
+    return date_from, date_to
+
+
+def _row_values(kind: str, row, columns: list[str]) -> list:
+    if kind == "jobs":
+        info = row.all_info or {}
+        return [row.id, row.user_id, row.message_id, row.created_at, *(info.get(f, "") for f in VACANCY_FIELDS)]
+    return [getattr(row, column) for column in columns]
+
+
+def write_export(kind: str, path: str, date_from: datetime | None, date_to: datetime | None) -> int:
+    """
+    Пишет выгрузку в gzip-сжатый CSV. Строки читаются серверным курсором
+    пачками по EXPORT_FETCH_SIZE и сразу дописываются в файл, поэтому
+    память не растет вместе с таблицей. Фильтр по датам — диапазон по индексу created_at.
+    Возвращает количество выгруженных строк.
+    """
+    model, columns = EXPORTS[kind]
+    query = select(model).order_by(model.id)
+    if date_from:
+        query = query.where(model.created_at >= date_from)
+    if date_to:
+        query = query.where(model.created_at < date_to)
+
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8-sig", newline="") as file, SessionLocal() as session:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        result = session.execute(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        for partition in result.scalars().partitions():
+            writer.writerows(_row_values(kind, row, columns) for row in partition)
+            count += len(partition)
+            # Уже выгруженные объекты больше не нужны сессии
+            session.expunge_all()
+    return count
+
+
+@router.message(Command("export"))
+async def export_handler(message: Message, command: CommandObject):
+    """Команда для админов - выгрузка вакансий или пользователей в CSV"""
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    parts = (command.args or "").split()
+    if not parts or parts[0].lower() not in EXPORTS:
+        await message.answer(
+            "📝 Использование:\n"
+            "/export jobs - все вакансии\n"
+            "/export users - все пользователи\n"
+            "/export jobs 01.05.2025 31.05.2025 - за период (даты необязательны)"
+        )
+        return
+
+    kind = parts[0].lower()
+    try:
+        date_from, date_to = parse_date_range(parts[1:])
+    except ValueError:
+        await message.answer("❌ Неверный формат даты. Используйте ДД.ММ.ГГГГ")
+        return
+
+    await message.answer("⏳ Готовлю выгрузку...")
+    fd, path = tempfile.mkstemp(prefix=f"export_{kind}_", suffix=".csv.gz")
+    os.close(fd)
+    try:
+        count = await asyncio.to_thread(write_export, kind, path, date_from, date_to)
+        if os.path.getsize(path) > EXPORT_MAX_FILE_SIZE:
+            await message.answer("❌ Выгрузка слишком большая для отправки. Укажите период покороче.")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=f"{kind}_{datetime.now():%Y%m%d_%H%M}.csv.gz"),
+            caption=f"📤 Выгружено строк: {count}"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке {kind}: {e}")
+        await message.answer("❌ Ошибка при выгрузке данных.")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,236 @@
+"""
+Генератор синтетических данных в масштабе продакшена: users, jobs и очередь публикации
+с реалистичным перекосом — немного активных работодателей публикуют большую часть
+вакансий (распределение Ципфа), created_at растет со временем и идет всплесками
+(пиковые дни, дневной профиль по часам).
+
+Запуск (только на пустую базу — рабочую заполнить не получится):
+    python gen_dataset.py --database-url sqlite:///bench.db --users 1000000 --jobs 10000000
+    python gen_dataset.py --database-url postgresql://localhost/bench --users 2000000 --jobs 20000000
+
+Затем: python bench_queries.py --database-url sqlite:///bench.db
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+TITLES = [
+    "Грузчик", "Разнорабочий", "Сантехник", "Электрик", "Няня", "Сиделка", "Повар", "Официант",
+    "Курьер", "Водитель", "Продавец", "Кассир", "Уборщица", "Мойщик посуды", "Штукатур", "Плиточник",
+    "Сварщик", "Маляр", "Кровельщик", "Охранник", "Бариста", "Администратор", "Швея", "Садовник",
+]
+CITIES = [("Бишкек", 60), ("Ош", 12), ("Кара-Балта", 4), ("Токмок", 4), ("Каракол", 4),
+          ("Джалал-Абад", 5), ("Нарын", 2), ("Талас", 2), ("Баткен", 2), ("Чолпон-Ата", 5)]
+DISTRICTS = ["мкр Джал", "мкр Асанбай", "Аламедин-1", "Восток-5", "центр", "ж/м Ак-Орго", "ТЭЦ", "Кок-Жар"]
+PAYMENTS = ["1000 сом/день", "1500 сом/день", "2000 сом/день", "договорная", "30000 сом/мес",
+            "45000 сом/мес", "500 сом/час", "по факту работы"]
+EXTRAS = ["", "", "", "Опыт обязателен", "Обед за счет работодателя", "Оплата каждый день", "Можно без опыта"]
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 12, 14, 13, 11, 10, 10, 11, 11, 10, 11, 12, 10, 7, 5, 3, 2]
+
+
+def _cumulative(weights) -> list[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _spread(total: int, weights: list[float]) -> list[int]:
+    """Распределяет total по корзинам пропорционально весам (сумма точно равна total)"""
+    norm = sum(weights)
+    counts = [int(total * w / norm) for w in weights]
+    for i in random.sample(range(len(weights)), total - sum(counts)):
+        counts[i] += 1
+    return counts
+
+
+def _day_weights(days: int, burst_share: float) -> list[float]:
+    """Рост к концу периода, случайный шум и редкие пиковые дни"""
+    weights = []
+    for day in range(days):
+        weight = (1 + 3 * day / days) * random.lognormvariate(0, 0.35)
+        if random.random() < burst_share:
+            weight *= random.uniform(3, 8)
+        weights.append(weight)
+    return weights
+
+
+def _moment(day_start: datetime, hour_cum: list[float]) -> datetime:
+    hour = random.choices(range(24), cum_weights=hour_cum)[0]
+    return day_start + timedelta(hours=hour, seconds=random.randrange(3600))
+
+
+def _vacancy(city_cum: list[float]) -> dict:
+    city = random.choices(CITIES, cum_weights=city_cum)[0][0]
+    data = {
+        "title": random.choice(TITLES),
+        "address": f"{city}, {random.choice(DISTRICTS)}" if city == "Бишкек" else city,
+        "payment": random.choice(PAYMENTS),
+        "contact": f"+996{random.randrange(500_000_000, 999_999_999)}",
+    }
+    extra = random.choice(EXTRAS)
+    if extra:
+        data["extra"] = extra
+    return data
+
+
+def _progress(label: str, done: int, total: int, started: float) -> None:
+    rate = done / max(time.monotonic() - started, 1e-9)
+    print(f"\r{label}: {done}/{total} ({rate:,.0f} строк/с)", end="", file=sys.stderr, flush=True)
+
+
+def generate(engine, users: int, jobs: int, days: int, chunk: int, zipf: float, pending_share: float) -> None:
+    from sqlalchemy import insert
+    from models import User, Job, PublishTask
+
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    hour_cum = _cumulative(HOUR_WEIGHTS)
+    city_cum = _cumulative(weight for _, weight in CITIES)
+    first_id = 100_000_000
+
+    # Пользователи: регистрации растут со временем, telegram_id возрастает вместе с created_at
+    started = time.monotonic()
+    rows = []
+    done = 0
+    with engine.connect() as conn:
+        for day, count in enumerate(_spread(users, _day_weights(days, 0.02))):
+            day_start = start + timedelta(days=day)
+            for moment in sorted(_moment(day_start, hour_cum) for _ in range(count)):
+                telegram_id = first_id + done + len(rows)
+                roll = random.random()
+                rows.append({
+                    "telegram_id": telegram_id,
+                    "username": f"user{telegram_id}" if random.random() < 0.7 else None,
+                    "can_post": roll < 0.005,
+                    "invites": min(int(random.expovariate(0.7)), 40),
+                    "created_at": moment,
+                    "can_post_until": (
+                        datetime.now() + timedelta(days=random.uniform(0, 30)) if roll < 0.03
+                        else datetime.now() - timedelta(days=random.uniform(0, 300)) if roll < 0.08
+                        else None
+                    ),
+                    "allowed_posts": random.randint(1, 3) if random.random() < 0.1 else 0,
+                    "last_activity": (
+                        datetime.now() - timedelta(days=random.expovariate(1 / 20))
+                        if random.random() < 0.6 else None
+                    ),
+                })
+                if len(rows) >= chunk:
+                    conn.execute(insert(User), rows)
+                    conn.commit()
+                    done += len(rows)
+                    rows.clear()
+                    _progress("users", done, users, started)
+        if rows:
+            conn.execute(insert(User), rows)
+            conn.commit()
+            done += len(rows)
+            rows.clear()
+        _progress("users", done, users, started)
+        print(file=sys.stderr)
+
+        # Вакансии: авторы по закону Ципфа (первые по рангу публикуют больше всех),
+        # ранги перемешаны, чтобы активные работодатели не были самыми старыми пользователями
+        ranks = list(range(users))
+        random.shuffle(ranks)
+        poster_cum = _cumulative(1 / (rank + 1) ** zipf for rank in ranks)
+        poster_ids = range(first_id, first_id + users)
+
+        started = time.monotonic()
+        done = 0
+        message_id = 0
+        tasks = []
+        for day, count in enumerate(_spread(jobs, _day_weights(days, 0.05))):
+            day_start = start + timedelta(days=day)
+            authors = random.choices(poster_ids, cum_weights=poster_cum, k=count)
+            for author, moment in zip(authors, sorted(_moment(day_start, hour_cum) for _ in range(count))):
+                data = _vacancy(city_cum)
+                pending = day == days - 1 and random.random() < pending_share * days
+                if not pending:
+                    message_id += 1
+                rows.append({
+                    "user_id": author,
+                    "message_id": None if pending else message_id,
+                    "all_info": data,
+                    "created_at": moment,
+                })
+                if pending:
+                    tasks.append((len(rows) - 1, author, data))
+                if len(rows) >= chunk:
+                    done += _insert_jobs(conn, Job, PublishTask, rows, tasks)
+                    _progress("jobs", done, jobs, started)
+        if rows:
+            done += _insert_jobs(conn, Job, PublishTask, rows, tasks)
+        _progress("jobs", done, jobs, started)
+        print(file=sys.stderr)
+
+
+def _insert_jobs(conn, Job, PublishTask, rows: list[dict], tasks: list[tuple[int, int, dict]]) -> int:
+    """Вставляет пачку вакансий, а для неопубликованных — задачи очереди. Возвращает число вакансий"""
+    from sqlalchemy import insert
+    if tasks:
+        # id нужны только неопубликованным вакансиям, их немного — вставляем по одной
+        pending_rows = {index for index, _, _ in tasks}
+        bulk = [row for i, row in enumerate(rows) if i not in pending_rows]
+        if bulk:
+            conn.execute(insert(Job), bulk)
+        queue = []
+        for index, author, data in tasks:
+            job_id = conn.execute(insert(Job).values(**rows[index])).inserted_primary_key[0]
+            queue.append({
+                "job_id": job_id, "user_id": author, "all_info": data, "status": "pending",
+                "publish_at": datetime.now() + timedelta(minutes=random.randrange(0, 600)),
+                "attempts": 0, "notify_user": True,
+            })
+        conn.execute(insert(PublishTask), queue)
+    else:
+        conn.execute(insert(Job), rows)
+    conn.commit()
+    count = len(rows)
+    rows.clear()
+    tasks.clear()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочных проверок")
+    parser.add_argument("--database-url", required=True, help="например sqlite:///bench.db")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--jobs", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=730, help="за сколько дней назад раскидать данные")
+    parser.add_argument("--chunk", type=int, default=10_000, help="строк в одной вставке")
+    parser.add_argument("--zipf", type=float, default=1.1, help="перекос по авторам вакансий")
+    parser.add_argument("--pending-share", type=float, default=0.0005,
+                        help="доля вакансий, ждущих публикации (все — за последний день)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # База задается явно: иначе db_base взял бы DATABASE_URL рабочего бота из .env
+    os.environ["DATABASE_URL"] = args.database_url
+    random.seed(args.seed)
+
+    from sqlalchemy import select, func, make_url
+    from db_base import engine
+    from db_connection import init_db, backfill_job_counters
+    from models import User, Job
+
+    # При ошибке подключения db_base молча переключается на bot_database.db
+    if engine.url != make_url(args.database_url):
+        sys.exit(f"Не удалось подключиться к {make_url(args.database_url)!r}")
+    init_db()
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(User)).scalar() or \
+                conn.execute(select(func.count()).select_from(Job)).scalar():
+            sys.exit("База не пустая — генератор работает только с новой базой")
+
+    started = time.monotonic()
+    generate(engine, args.users, args.jobs, args.days, args.chunk, args.zipf, args.pending_share)
+    # Вакансии вставлены в обход count_jobs_added — счетчики пользователей считаем одним проходом
+    backfill_job_counters(engine)
+    print(f"Готово за {math.ceil(time.monotonic() - started)} с: {args.users} users, {args.jobs} jobs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
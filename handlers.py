@@ -1,4 +1,3 @@
-import re
 import asyncio
 import logging
 import signal
@@ -6,18 +5,31 @@ import sys
 
 from aiogram import Router, Bot, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, \
-    KeyboardButton
+    KeyboardButton, InputMediaPhoto
 from aiogram.filters import CommandStart, Command
 from aiogram.enums import ChatType, ParseMode
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import select, func
 
 from db_connection import *
-from config import CHANNEL_ID, CHANNEL_URL, ADMINS, ADMIN_USERNAME
+from config import CHANNEL_URL, ADMINS, ADMIN_USERNAME
+from channels import get_channel
+from vacancy import (
+    PHONE_RE, FIELD_NAMES, CAPTION_LIMIT, parse_vacancy_text, parse_publish_at, find_missing_fields,
+    format_vacancy_text, create_response_buttons, vacancy_hash
+)
+from publisher import wake_publisher
+from dedup import find_duplicate
+from search import vacancy_index
+from media import register_photo
+from activity import activity_tracker
 
 logger = logging.getLogger(__name__)
+# Модерация группы шумная: для этого логгера можно включить выборку (LOG_SAMPLING)
+group_logger = logging.getLogger(f"{__name__}.group")
 router = Router()
 
 
@@ -25,17 +37,6 @@ class VacancyForm(StatesGroup):
     all_info = State()
 
 
-# Шаблоны полей и телефонный формат
-TEMPLATE = {
-    "address": r"^📍\s*Адрес:\s*(.+)$",
-    "title": r"^📝\s*Задача:\s*(.+)$",
-    "payment": r"^💵\s*Оплата:\s*(.+)$",
-    "contact": r"^☎️\s*Контакт:\s*(.+)$",
-    "extra": r"^📌\s*Примечание:\s*(.*)$",
-}
-# Обновленное регулярное выражение для телефона (строго +996XXXXXXXXX)
-PHONE_RE = re.compile(r"^\+996\d{9}$")
-
 kb_menu = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="✉️ Выложить вакансию")],
@@ -52,7 +53,7 @@ kb_menu = ReplyKeyboardMarkup(
 async def cmd_start(msg: Message):
     """Приветствие и меню"""
     try:
-        insert_user(msg.from_user.id, msg.from_user.username or "")
+        await asyncio.to_thread(insert_user, msg.from_user.id, msg.from_user.username or "")
     except Exception as e:
         logger.error(f"Ошибка при добавлении пользователя: {e}")
 
@@ -84,7 +85,7 @@ async def prepare_vacancy_impl(msg: Message, state: FSMContext):
     user_id = msg.from_user.id if hasattr(msg, 'from_user') else msg.chat.id
 
     # Проверяем возможность публикации
-    can_post, message, invites_count = can_post_more_extended(user_id)
+    can_post, message, invites_count = await asyncio.to_thread(can_post_more_extended, user_id)
 
     if not can_post:
         if user_id not in ADMINS:
@@ -106,7 +107,9 @@ async def prepare_vacancy_impl(msg: Message, state: FSMContext):
         "📝 Задача: \n"
         "💵 Оплата: \n"
         "☎️ Контакт: \n"
-        "📌 Примечание: (необязательно)\n\n"
+        "📌 Примечание: (необязательно)\n"
+        "⏰ Публикация: (необязательно, ДД.ММ.ГГГГ ЧЧ:ММ)\n\n"
+        "📷 Можно приложить фото: отправьте шаблон подписью к нему.\n\n"
         "⚠️ Строго соблюдайте формат!",
         parse_mode=ParseMode.HTML
     )
@@ -117,41 +120,48 @@ async def prepare_vacancy_impl(msg: Message, state: FSMContext):
 async def my_vacancies(msg: Message):
     """Показать список вакансий пользователя"""
     try:
-        with SessionLocal() as session:
+        # Сессия закрывается до отправки сообщений: транзакция не держится через await
+        with read_session(msg.from_user.id) as session:
             jobs = session.query(Job).filter_by(user_id=msg.from_user.id).order_by(Job.created_at.desc()).all()
+        pending = {task.job_id: task for task in get_pending_publications(msg.from_user.id)}
+
+        if not jobs:
+            await msg.answer(
+                "📭 У вас пока нет опубликованных вакансий.",
+                reply_markup=kb_menu
+            )
+            return
+        
+        for job in jobs:
+            kb = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(text="✏️ Редактировать", callback_data=f"edit_job_{job.id}"),
+                    InlineKeyboardButton(text="🗑 Удалить", callback_data=f"delete_job_{job.id}")
+                ]
+            ])
             
-            if not jobs:
-                await msg.answer(
-                    "📭 У вас пока нет опубликованных вакансий.",
-                    reply_markup=kb_menu
-                )
-                return
+            job_text = (
+                f"<b>🔥 {job.all_info['title']}</b>\n\n"
+                f"📍 <b>Адрес:</b> {job.all_info['address']}\n"
+                f"💵 <b>Оплата:</b> {job.all_info['payment']}\n"
+                f"☎️ <b>Контакт:</b> {job.all_info['contact']}"
+            )
             
-            for job in jobs:
-                kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text="✏️ Редактировать", callback_data=f"edit_job_{job.id}"),
-                        InlineKeyboardButton(text="🗑 Удалить", callback_data=f"delete_job_{job.id}")
-                    ]
-                ])
-                
-                job_text = (
-                    f"<b>🔥 {job.all_info['title']}</b>\n\n"
-                    f"📍 <b>Адрес:</b> {job.all_info['address']}\n"
-                    f"💵 <b>Оплата:</b> {job.all_info['payment']}\n"
-                    f"☎️ <b>Контакт:</b> {job.all_info['contact']}"
-                )
-                
-                if job.all_info.get('extra'):
-                    job_text += f"\n📌 <b>Примечание:</b> {job.all_info['extra']}"
-                
+            if job.all_info.get('extra'):
+                job_text += f"\n📌 <b>Примечание:</b> {job.all_info['extra']}"
+            
+            if job.message_id:
                 job_text += f"\n\n📅 Опубликовано: {job.created_at.strftime('%d.%m.%Y %H:%M')}"
-                
-                await msg.answer(
-                    job_text,
-                    reply_markup=kb,
-                    parse_mode=ParseMode.HTML
-                )
+            elif job.id in pending:
+                job_text += f"\n\n⏳ Ожидает публикации: {pending[job.id].publish_at.strftime('%d.%m.%Y %H:%M')}"
+            else:
+                job_text += "\n\n⏳ Ожидает публикации"
+            
+            await msg.answer(
+                job_text,
+                reply_markup=kb,
+                parse_mode=ParseMode.HTML
+            )
     
     except Exception as e:
         logger.error(f"Ошибка при получении списка вакансий: {e}")
@@ -166,40 +176,40 @@ async def edit_job_callback(callback: CallbackQuery, state: FSMContext):
         
         with SessionLocal() as session:
             job = session.query(Job).filter_by(id=job_id, user_id=callback.from_user.id).first()
-            if not job:
-                await callback.answer("❌ Вакансия не найдена")
-                return
-            
-            # Сохраняем ID вакансии в состоянии
-            await state.update_data(editing_job_id=job_id)
-            
-            # Формируем текущий текст вакансии
-            current_text = (
-                "📄 Текущая вакансия:\n\n"
-                f"📍 Адрес: {job.all_info['address']}\n"
-                f"📝 Задача: {job.all_info['title']}\n"
-                f"💵 Оплата: {job.all_info['payment']}\n"
-                f"☎️ Контакт: {job.all_info['contact']}"
-            )
-            if job.all_info.get('extra'):
-                current_text += f"\n📌 Примечание: {job.all_info['extra']}"
-            
-            current_text += "\n\nОтправьте новую версию вакансии в том же формате:"
-            
-            # Обновляем кнопку отклика
-            response_button = create_response_buttons(
-                job.all_info['contact'],
-                callback.from_user.id,
-                callback.from_user.username
-            )
-            
-            await callback.message.edit_text(
-                current_text,
-                reply_markup=response_button
-            )
-            
-            await state.set_state(VacancyForm.all_info)
-            await callback.answer()
+        if not job:
+            await callback.answer("❌ Вакансия не найдена")
+            return
+        
+        # Сохраняем ID вакансии в состоянии
+        await state.update_data(editing_job_id=job_id)
+        
+        # Формируем текущий текст вакансии
+        current_text = (
+            "📄 Текущая вакансия:\n\n"
+            f"📍 Адрес: {job.all_info['address']}\n"
+            f"📝 Задача: {job.all_info['title']}\n"
+            f"💵 Оплата: {job.all_info['payment']}\n"
+            f"☎️ Контакт: {job.all_info['contact']}"
+        )
+        if job.all_info.get('extra'):
+            current_text += f"\n📌 Примечание: {job.all_info['extra']}"
+        
+        current_text += "\n\nОтправьте новую версию вакансии в том же формате:"
+        
+        # Обновляем кнопку отклика
+        response_button = create_response_buttons(
+            job.all_info['contact'],
+            callback.from_user.id,
+            callback.from_user.username
+        )
+        
+        await callback.message.edit_text(
+            current_text,
+            reply_markup=response_button
+        )
+        
+        await state.set_state(VacancyForm.all_info)
+        await callback.answer()
     
     except Exception as e:
         logger.error(f"Ошибка при редактировании вакансии: {e}")
@@ -212,30 +222,30 @@ async def delete_job_callback(callback: CallbackQuery):
     try:
         job_id = int(callback.data.split("_")[2])
         
-        with SessionLocal() as session:
-            job = session.query(Job).filter_by(id=job_id, user_id=callback.from_user.id).first()
-            if not job:
-                await callback.answer("❌ Вакансия не найдена")
-                return
-            
-            # Удаляем сообщение из канала
+        # Удаляем из базы вместе с задачей в очереди публикации, затем пост из канала
+        found, message_id, channel_id = await asyncio.to_thread(
+            delete_user_job, callback.from_user.id, job_id
+        )
+        if not found:
+            await callback.answer("❌ Вакансия не найдена")
+            return
+        vacancy_index.remove(job_id)
+        
+        # Удаляем сообщение из канала (если вакансия уже опубликована)
+        if message_id:
             try:
                 await callback.bot.delete_message(
-                    chat_id=CHANNEL_ID,
-                    message_id=job.message_id
+                    chat_id=get_channel(channel_id).chat_id,
+                    message_id=message_id
                 )
             except Exception as e:
                 logger.error(f"Не удалось удалить сообщение из канала: {e}")
-            
-            # Удаляем из базы
-            session.delete(job)
-            session.commit()
-            
-            await callback.message.edit_text(
-                "✅ Вакансия успешно удалена",
-                reply_markup=None
-            )
-            await callback.answer("✅ Вакансия удалена")
+        
+        await callback.message.edit_text(
+            "✅ Вакансия успешно удалена",
+            reply_markup=None
+        )
+        await callback.answer("✅ Вакансия удалена")
     
     except Exception as e:
         logger.error(f"Ошибка при удалении вакансии: {e}")
@@ -282,39 +292,8 @@ async def contact_admin_button(msg: Message):
     )
 
 
-def create_response_buttons(contact: str, user_id: int, username: str | None) -> InlineKeyboardMarkup:
-    """
-    Создает кнопки для отклика на вакансию
-    Args:
-        contact: Номер телефона из вакансии
-        user_id: ID пользователя, разместившего вакансию
-        username: Username пользователя, разместившего вакансию
-    Returns:
-        InlineKeyboardMarkup с кнопками для отклика
-    """
-    buttons = []
-    
-    # Проверяем валидность номера телефона
-    if PHONE_RE.match(contact):
-        # Если номер валидный, добавляем кнопку WhatsApp
-        whatsapp_number = contact.replace("+", "")  # Убираем + для WhatsApp
-        buttons.append([
-            InlineKeyboardButton(
-                text="📱WhatsApp",
-                url=f"https://wa.me/{whatsapp_number}"
-            )
-        ])
-    
-    # Добавляем кнопку Telegram для номера телефона
-    telegram_number = contact.replace("+", "").replace(" ", "")  # Убираем + и пробелы
-    buttons.append([
-        InlineKeyboardButton(
-            text="📨 Telegram",
-            url=f"https://t.me/+{telegram_number}"
-        )
-    ])
-        
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+def _duplicate_text(duplicate: str) -> str:
+    return "🚫 Такая вакансия уже публиковалась." if duplicate == "exact" else "🚫 Очень похожая вакансия уже публиковалась."
 
 
 # Обработка формы и публикация вакансии
@@ -328,83 +307,55 @@ async def process_vacancy(msg: Message, state: FSMContext, bot: Bot):
         
         uid = msg.from_user.id
 
-        # Проверяем существование пользователя в базе
-        with SessionLocal() as session:
-            user = session.query(User).filter_by(telegram_id=uid).first()
-            if not user:
-                # Если пользователя нет, создаем его
+        # Создаем пользователя, если его еще нет (для известных пользователей — без запроса к базе)
+        try:
+            await asyncio.to_thread(insert_user, uid, msg.from_user.username or "")
+        except Exception as e:
+            logger.error(f"Ошибка при создании пользователя {uid}: {e}")
+            # Отправляем ошибку админам
+            for admin_id in ADMINS:
                 try:
-                    insert_user(uid, msg.from_user.username or "")
-                    user = session.query(User).filter_by(telegram_id=uid).first()
-                except Exception as e:
-                    logger.error(f"Ошибка при создании пользователя {uid}: {e}")
-                    # Отправляем ошибку админам
-                    for admin_id in ADMINS:
-                        try:
-                            await bot.send_message(
-                                admin_id,
-                                f"❌ Ошибка при создании пользователя:\n"
-                                f"User ID: {uid}\n"
-                                f"Username: {msg.from_user.username}\n"
-                                f"Error: {str(e)}"
-                            )
-                        except Exception as admin_e:
-                            logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
-                    
-                    await msg.answer(
-                        "❌ Произошла ошибка. Пожалуйста, попробуйте позже или обратитесь к администратору.",
-                        reply_markup=kb_menu
+                    await bot.send_message(
+                        admin_id,
+                        f"❌ Ошибка при создании пользователя:\n"
+                        f"User ID: {uid}\n"
+                        f"Username: {msg.from_user.username}\n"
+                        f"Error: {str(e)}"
                     )
-                    await state.clear()
-                    return
+                except Exception as admin_e:
+                    logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
 
-        # Проверка на спам (только для новых вакансий)
+            await msg.answer(
+                "❌ Произошла ошибка. Пожалуйста, попробуйте позже или обратитесь к администратору.",
+                reply_markup=kb_menu
+            )
+            await state.clear()
+            return
+
+        # Проверка на спам (только для новых вакансий): время последней публикации хранится у пользователя
         if not editing_job_id:
             with SessionLocal() as session:
-                last_job = session.query(Job).filter(
-                    Job.user_id == uid,
-                    Job.created_at >= datetime.now() - timedelta(minutes=5)
-                ).first()
-                
-                if last_job and (datetime.now() - last_job.created_at).total_seconds() < 300:
-                    await msg.answer(
-                        "⏳ Подождите 5 минут перед публикацией следующей вакансии.",
-                        reply_markup=kb_menu
-                    )
-                    await state.clear()
-                    return
-
-        # Парсинг данных
-        data = {}
-        lines = msg.text.strip().splitlines()
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+                last_post_at = session.execute(
+                    select(User.last_post_at).where(User.telegram_id == uid)
+                ).scalar()
+            
+            if last_post_at and (datetime.now() - last_post_at).total_seconds() < 300:
+                await msg.answer(
+                    "⏳ Подождите 5 минут перед публикацией следующей вакансии.",
+                    reply_markup=kb_menu
+                )
+                await state.clear()
+                return
 
-            for key, pat in TEMPLATE.items():
-                m = re.match(pat, line)
-                if m:
-                    data[key] = m.group(1).strip()
-                    break
+        # Парсинг данных: шаблон приходит текстом или подписью к фото
+        data = parse_vacancy_text(msg.text or msg.caption or "")
+        photo = msg.photo[-1] if msg.photo else None
 
         # Валидация обязательных полей
-        required_fields = ["address", "title", "payment", "contact"]
-        missing_fields = []
-
-        for field in required_fields:
-            if field not in data or not data[field]:
-                missing_fields.append(field)
+        missing_fields = find_missing_fields(data)
 
         if missing_fields:
-            field_names = {
-                "address": "📍 Адрес",
-                "title": "📝 Задача",
-                "payment": "💵 Оплата",
-                "contact": "☎️ Контакт"
-            }
-            missing_names = [field_names[f] for f in missing_fields]
+            missing_names = [FIELD_NAMES[f] for f in missing_fields]
             await msg.reply(
                 f"❌ Не заполнены поля: {', '.join(missing_names)}\n\n"
                 "Пожалуйста, заполните форму заново по шаблону:"
@@ -421,8 +372,29 @@ async def process_vacancy(msg: Message, state: FSMContext, bot: Bot):
             await prepare_vacancy_impl(msg, state)
             return
 
+        # Валидация времени отложенной публикации
+        publish_field = data.pop('publish_at', None)
+        try:
+            publish_at = parse_publish_at(publish_field)
+        except ValueError as e:
+            await msg.reply(
+                f"❌ {e}\n"
+                "Пожалуйста, заполните форму заново:"
+            )
+            await prepare_vacancy_impl(msg, state)
+            return
+
+        # Текст вакансии с фото становится подписью, а у подписи свой лимит длины
+        if photo and len(format_vacancy_text(data)) > CAPTION_LIMIT:
+            await msg.reply(
+                f"❌ С фото текст вакансии должен быть не длиннее {CAPTION_LIMIT} символов.\n"
+                "Сократите текст и отправьте заново:"
+            )
+            await prepare_vacancy_impl(msg, state)
+            return
+
         # Повторная проверка возможности публикации
-        can_post, message, invites_count = can_post_more_extended(uid)
+        can_post, message, invites_count = await asyncio.to_thread(can_post_more_extended, uid)
         if not can_post and uid not in ADMINS:
             await msg.answer(
                 f"🔒 {message}\n"
@@ -435,183 +407,186 @@ async def process_vacancy(msg: Message, state: FSMContext, bot: Bot):
             await state.clear()
             return
 
+        if photo:
+            data['photo'] = await asyncio.to_thread(register_photo, photo)
+
         # Если это редактирование
         if editing_job_id:
+            # Сессия только читает и закрывается до запросов к Telegram,
+            # изменения записываются отдельно через update_job_info
             with SessionLocal() as session:
                 job = session.query(Job).filter_by(id=editing_job_id, user_id=msg.from_user.id).first()
-                if not job:
-                    await msg.answer("❌ Вакансия не найдена")
-                    await state.clear()
-                    return
-                
-                # Обновляем данные
-                job.all_info = data
-                
-                # Обновляем сообщение в канале
-                vacancy_text = (
-                    f"<b>Вакансия {data['title']}</b>\n\n"
-                    f"📍 <b>Адрес:</b> {data['address']}\n"
-                    f"💵 <b>Оплата:</b> {data['payment']}\n"
-                    f"☎️ <b>Контакт:</b> {data['contact']}"
-                )
-                
-                if data.get('extra'):
-                    vacancy_text += f"\n📌 <b>Примечание:</b> {data['extra']}"
-                
-                try:
-                    # Обновляем текст сообщения
-                    await bot.edit_message_text(
-                        chat_id=CHANNEL_ID,
-                        message_id=job.message_id,
-                        text=vacancy_text,
-                        parse_mode=ParseMode.HTML
-                    )
-                    
-                    # Обновляем кнопку отклика
-                    response_button = create_response_buttons(
-                        data['contact'],
-                        msg.from_user.id,
-                        msg.from_user.username
-                    )
-                    
-                    await bot.edit_message_reply_markup(
-                        chat_id=CHANNEL_ID,
-                        message_id=job.message_id,
-                        reply_markup=response_button
-                    )
-                    
-                    session.commit()
-                    await msg.answer(
-                        "✅ Вакансия успешно обновлена!",
-                        reply_markup=kb_menu
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка при обновлении сообщения в канале: {e}")
+            if not job:
+                await msg.answer("❌ Вакансия не найдена")
+                await state.clear()
+                return
+            
+            # Правка без фото сохраняет прежнее фото
+            old_photo = job.all_info.get('photo')
+            if not photo and old_photo:
+                data['photo'] = old_photo
+                if len(format_vacancy_text(data)) > CAPTION_LIMIT:
                     await msg.answer(
-                        "❌ Не удалось обновить вакансию в канале. Попробуйте позже.",
+                        f"❌ С фото текст вакансии должен быть не длиннее {CAPTION_LIMIT} символов.",
                         reply_markup=kb_menu
                     )
-        else:
-            try:
-                # Публикация в канал
-                vacancy_text = (
-                    f"<b>Вакансия {data['title']}</b>\n\n"
-                    f"📍 <b>Адрес:</b> {data['address']}\n"
-                    f"💵 <b>Оплата:</b> {data['payment']}\n"
-                    f"☎️ <b>Контакт:</b> {data['contact']}"
-                )
+                    await state.clear()
+                    return
+
+            # Опубликованный текстовый пост Telegram не дает превратить в пост с фото
+            photo_dropped = bool(job.message_id and photo and not old_photo)
+            if photo_dropped:
+                data.pop('photo')
+
+            # Новое время публикации у вакансии в очереди — тоже изменение
+            reschedule = bool(publish_field) and not job.message_id
 
-                if data.get('extra'):
-                    vacancy_text += f"\n📌 <b>Примечание:</b> {data['extra']}"
+            # Ничего не изменилось — не трогаем ни базу, ни канал
+            if vacancy_hash(data) == vacancy_hash(job.all_info) and not reschedule:
+                await msg.answer(
+                    "ℹ️ Изменений нет, вакансия осталась прежней.",
+                    reply_markup=kb_menu
+                )
+                await state.clear()
+                return
 
-                posted = await bot.send_message(
-                    chat_id=CHANNEL_ID,
-                    text=vacancy_text,
-                    parse_mode=ParseMode.HTML
+            # Вакансия еще в очереди: канал трогать не нужно, опубликуется новая версия
+            if not job.message_id:
+                # Время в прошлом означает "опубликовать сразу"
+                new_publish_at = (publish_at or datetime.now()) if reschedule else None
+                updated, duplicate = await asyncio.to_thread(
+                    update_job_info, uid, job.id, data, True, new_publish_at
                 )
+                if duplicate:
+                    text = _duplicate_text(duplicate)
+                elif updated and new_publish_at:
+                    wake_publisher()
+                    text = (
+                        "✅ Вакансия обновлена и будет опубликована "
+                        + (f"{publish_at.strftime('%d.%m.%Y %H:%M')}." if publish_at else "в ближайшее время.")
+                    )
+                elif updated:
+                    text = "✅ Вакансия обновлена и будет опубликована в новом виде."
+                else:
+                    text = "⏳ Вакансия уже публикуется. Отредактируйте ее после публикации."
+                await msg.answer(text, reply_markup=kb_menu)
+                await state.clear()
+                return
+            
+            # Дубли проверяются в той же записи, что сохраняет вакансию (enqueue_publication,
+            # update_job_info), но опубликованный пост меняется раньше — его проверяем заранее.
+            # Собственные вакансии пользователя не учитываются
+            duplicate = await asyncio.to_thread(find_duplicate, data, uid)
+            if duplicate:
+                await msg.answer(_duplicate_text(duplicate), reply_markup=kb_menu)
+                await state.clear()
+                return
 
-                # Кнопка отклика
-                response_button = create_response_buttons(
+            try:
+                # Текст (подпись) и кнопку отклика обновляем одним запросом.
+                # Пост остается в своем канале, даже если после правки адреса
+                # новая вакансия попала бы по маршрутизации в другой
+                chat_id = get_channel(job.channel_id).chat_id
+                reply_markup = create_response_buttons(
                     data['contact'],
                     msg.from_user.id,
                     msg.from_user.username
                 )
-
-                await bot.edit_message_reply_markup(
-                    chat_id=CHANNEL_ID,
-                    message_id=posted.message_id,
-                    reply_markup=response_button
-                )
-
-                # Сохранение в базу
-                try:
-                    saved = await asyncio.to_thread(save_job_db, uid, posted.message_id, data)
-                    if not saved:
-                        raise Exception("Не удалось сохранить вакансию в базу данных")
-                except Exception as e:
-                    # Отправляем ошибку админам
-                    for admin_id in ADMINS:
-                        try:
-                            await bot.send_message(
-                                admin_id,
-                                f"❌ Ошибка при сохранении вакансии:\n"
-                                f"User ID: {uid}\n"
-                                f"Message ID: {posted.message_id}\n"
-                                f"Error: {str(e)}\n"
-                                f"Data: {data}"
-                            )
-                        except Exception as admin_e:
-                            logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
-                    
-                    # Удаляем сообщение из канала, так как не смогли сохранить в базу
-                    try:
-                        await bot.delete_message(chat_id=CHANNEL_ID, message_id=posted.message_id)
-                    except Exception as delete_e:
-                        logger.error(f"Не удалось удалить сообщение из канала: {delete_e}")
-                    
+                if photo and data.get('photo') != old_photo:
+                    await bot.edit_message_media(
+                        chat_id=chat_id,
+                        message_id=job.message_id,
+                        media=InputMediaPhoto(
+                            media=photo.file_id,
+                            caption=format_vacancy_text(data),
+                            parse_mode=ParseMode.HTML
+                        ),
+                        reply_markup=reply_markup
+                    )
+                elif data.get('photo'):
+                    await bot.edit_message_caption(
+                        chat_id=chat_id,
+                        message_id=job.message_id,
+                        caption=format_vacancy_text(data),
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=reply_markup
+                    )
+                else:
+                    await bot.edit_message_text(
+                        chat_id=chat_id,
+                        message_id=job.message_id,
+                        text=format_vacancy_text(data),
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=reply_markup
+                    )
+            except TelegramBadRequest as e:
+                # Пост в канале уже совпадает с новой версией — сохраняем только базу
+                if "message is not modified" not in str(e):
+                    logger.error(f"Ошибка при обновлении сообщения в канале: {e}")
                     await msg.answer(
-                        "❌ Произошла ошибка при сохранении вакансии. Пожалуйста, попробуйте позже или обратитесь к администратору.",
+                        "❌ Не удалось обновить вакансию в канале. Попробуйте позже.",
                         reply_markup=kb_menu
                     )
                     await state.clear()
                     return
-
-                # Уменьшение счетчика публикаций (только если это не админ, не can_post=True и не первая публикация)
-                try:
-                    with SessionLocal() as session:
-                        user = session.query(User).filter_by(telegram_id=uid).first()
-                        if user:
-                            # Проверяем, первая ли это публикация
-                            job_count = session.query(func.count(Job.id)).filter_by(user_id=uid).scalar()
-                            
-                            # Уменьшаем счетчик только если:
-                            # 1. Это не первая публикация
-                            # 2. У пользователя нет постоянного разрешения (can_post=False)
-                            # 3. Есть доступные публикации
-                            if job_count > 1 and not user.can_post and user.allowed_posts > 0:
-                                user.allowed_posts -= 1
-                                session.commit()
-                                logger.info(f"Уменьшен счетчик публикаций для пользователя {uid}")
-                except Exception as e:
-                    logger.error(f"Ошибка при обновлении счетчика публикаций: {e}")
-                    # Отправляем ошибку админам
-                    for admin_id in ADMINS:
-                        try:
-                            await bot.send_message(
-                                admin_id,
-                                f"❌ Ошибка при обновлении счетчика публикаций:\n"
-                                f"User ID: {uid}\n"
-                                f"Error: {str(e)}"
-                            )
-                        except Exception as admin_e:
-                            logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
-
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении сообщения в канале: {e}")
                 await msg.answer(
-                    "✅ Ваша вакансия успешно опубликована!\n\n"
-                    f"📄 Ссылка: {CHANNEL_URL}/{posted.message_id}\n"
-                    "📋 Для управления вакансиями используйте 'Мои вакансии' \n Это даст возможность удалить или отредактировать вакансию",
+                    "❌ Не удалось обновить вакансию в канале. Попробуйте позже.",
                     reply_markup=kb_menu
                 )
+                await state.clear()
+                return
 
-            except Exception as e:
-                logger.error(f"Ошибка при публикации вакансии: {e}")
-                # Отправляем ошибку админам
+            updated, _ = await asyncio.to_thread(update_job_info, uid, job.id, data)
+            if not updated:
+                # Вакансию удалили, пока шла правка поста
+                await msg.answer("❌ Вакансия не найдена", reply_markup=kb_menu)
+                await state.clear()
+                return
+            vacancy_index.add(job.id, job.message_id, data, job.created_at, job.channel_id)
+            await msg.answer(
+                "✅ Вакансия успешно обновлена!" + (
+                    "\nℹ️ Фото нельзя добавить к уже опубликованной вакансии без фото."
+                    if photo_dropped else ""
+                ) + (
+                    "\nℹ️ Время публикации не изменено: вакансия уже опубликована."
+                    if publish_field else ""
+                ),
+                reply_markup=kb_menu
+            )
+        else:
+            # Публикацией занимается фоновый планировщик: он соблюдает лимиты канала
+            # и сам пришлет пользователю ссылку, как только пост выйдет
+            job_id, duplicate = await asyncio.to_thread(enqueue_publication, uid, data, publish_at)
+            if duplicate:
+                await msg.answer(_duplicate_text(duplicate), reply_markup=kb_menu)
+            elif not job_id:
                 for admin_id in ADMINS:
                     try:
                         await bot.send_message(
                             admin_id,
-                            f"❌ Ошибка при публикации вакансии:\n"
+                            f"❌ Ошибка при постановке вакансии в очередь:\n"
                             f"User ID: {uid}\n"
-                            f"Error: {str(e)}\n"
                             f"Data: {data}"
                         )
                     except Exception as admin_e:
                         logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
-                
+
                 await msg.answer(
                     "❌ Произошла ошибка при публикации вакансии. Пожалуйста, попробуйте позже или обратитесь к администратору.",
                     reply_markup=kb_menu
                 )
+            else:
+                wake_publisher()
+                if publish_at:
+                    text = f"🕒 Вакансия будет опубликована {publish_at.strftime('%d.%m.%Y %H:%M')}."
+                else:
+                    text = "⏳ Вакансия принята и поставлена в очередь на публикацию."
+                await msg.answer(
+                    f"{text}\n📄 Ссылку пришлю сразу после публикации.",
+                    reply_markup=kb_menu
+                )
 
         await state.clear()
 
@@ -636,51 +611,6 @@ async def process_vacancy(msg: Message, state: FSMContext, bot: Bot):
         await state.clear()
 
 
-def can_post_more_extended(user_id: int) -> tuple[bool, str, int]:
-    """
-    Расширенная проверка возможности публикации вакансии
-    Возвращает: (может_публиковать, сообщение, количество_приглашений)
-    """
-    try:
-        with SessionLocal() as session:
-            user = session.query(User).filter_by(telegram_id=user_id).first()
-
-            if not user:
-                # Новый пользователь - первая публикация бесплатно
-                return True, "Первая публикация бесплатно!", 0
-
-            # Если у пользователя can_post = True - всегда можем публиковать
-            if user.can_post:
-                return True, "У вас есть постоянное разрешение на публикацию", user.invites
-
-            # Проверка месячной подписки
-            if user.can_post_until and user.can_post_until > datetime.now():
-                return True, f"У вас есть месячная подписка до {user.can_post_until.strftime('%d.%m.%Y %H:%M')}", user.invites
-
-            # Проверка разовых публикаций
-            if user.allowed_posts > 0:
-                return True, f"Осталось публикаций: {user.allowed_posts}", user.invites
-
-            # Проверка первой бесплатной публикации
-            job_count = session.query(func.count(Job.id)).filter_by(user_id=user_id).scalar()
-            if job_count == 0:
-                return True, "Первая публикация бесплатно!", user.invites
-
-            # Проверка приглашенных друзей (5+ друзей = 1 публикация)
-            if user.invites >= 5:
-                # Даем одну публикацию и сбрасываем счетчик приглашений
-                user.allowed_posts = 1
-                user.invites = 0  # Сбрасываем счетчик
-                session.commit()
-                return True, "Получена публикация за приглашение друзей!", 0
-
-            return False, "У вас нет доступных публикаций.", user.invites
-
-    except Exception as e:
-        logger.error(f"Ошибка при can_post_more_extended для пользователя {user_id}: {e}")
-        return False, "Ошибка при проверке прав доступа.", 0
-
-
 @router.message(Command("allow_posting"))
 async def allow_posting_handler(message: Message):
     """Команда для админов - предоставление прав публикации"""
@@ -703,81 +633,47 @@ async def allow_posting_handler(message: Message):
         is_permanent = (len(parts) == 3 and parts[1].lower() == "permanent")
         username_or_id = parts[2] if (is_month or is_permanent) else parts[1]
 
-        with SessionLocal() as session:
-            user = None
-
-            if username_or_id.startswith("@"):
-                user = session.query(User).filter_by(username=username_or_id[1:]).first()
-            elif username_or_id.isdigit():
-                user = session.query(User).filter_by(telegram_id=int(username_or_id)).first()
+        mode = "permanent" if is_permanent else "month" if is_month else "once"
+        try:
+            rights = await asyncio.to_thread(grant_posting, username_or_id, mode)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении прав пользователя {username_or_id}: {e}")
+            await message.answer(
+                "❌ Произошла ошибка при обновлении прав. Пожалуйста, попробуйте еще раз или обратитесь к разработчику."
+            )
+            return
 
-            if not user:
-                await message.answer("❌ Пользователь не найден в базе.")
-                return
+        if not rights:
+            await message.answer("❌ Пользователь не найден в базе.")
+            return
 
-            # Сохраняем старые значения для логирования
-            old_can_post = user.can_post
-            old_can_post_until = user.can_post_until
-            old_allowed_posts = user.allowed_posts
+        telegram_id = rights["telegram_id"]
+        old_can_post, old_can_post_until, old_allowed_posts = rights["old"]
+        if is_permanent:
+            msg = f"✅ Пользователю {username_or_id} предоставлено постоянное разрешение на публикацию."
+            action = "выдал постоянное разрешение пользователю"
+        elif is_month:
+            msg = f"✅ Пользователю {username_or_id} предоставлен месяц публикаций до {rights['can_post_until'].strftime('%d.%m.%Y %H:%M')}"
+            action = "выдал месячную подписку пользователю"
+        else:
+            msg = f"✅ Пользователю {username_or_id} добавлена 1 публикация. Всего: {rights['allowed_posts']}"
+            action = "добавил публикацию пользователю"
+        logger.info(
+            f"Админ {message.from_user.id} {action} {telegram_id} "
+            f"(было: can_post={old_can_post}, can_post_until={old_can_post_until}, allowed_posts={old_allowed_posts})"
+        )
 
-            try:
-                if is_permanent:
-                    # Постоянное разрешение - устанавливаем can_post = True
-                    user.can_post = True
-                    user.can_post_until = None
-                    user.allowed_posts = 0
-                    msg = f"✅ Пользователю {username_or_id} предоставлено постоянное разрешение на публикацию."
-                    logger.info(
-                        f"Админ {message.from_user.id} выдал постоянное разрешение пользователю {user.telegram_id} "
-                        f"(было: can_post={old_can_post}, can_post_until={old_can_post_until}, allowed_posts={old_allowed_posts})"
-                    )
-                elif is_month:
-                    # Месячная подписка - сбрасываем can_post
-                    user.can_post = False
-                    user.can_post_until = datetime.now() + timedelta(days=30)
-                    user.allowed_posts = 0
-                    msg = f"✅ Пользователю {username_or_id} предоставлен месяц публикаций до {user.can_post_until.strftime('%d.%m.%Y %H:%M')}"
-                    logger.info(
-                        f"Админ {message.from_user.id} выдал месячную подписку пользователю {user.telegram_id} "
-                        f"(было: can_post={old_can_post}, can_post_until={old_can_post_until}, allowed_posts={old_allowed_posts})"
-                    )
-                else:
-                    # Разовая публикация - сбрасываем can_post
-                    user.can_post = False
-                    user.can_post_until = None
-                    user.allowed_posts += 1
-                    msg = f"✅ Пользователю {username_or_id} добавлена 1 публикация. Всего: {user.allowed_posts}"
-                    logger.info(
-                        f"Админ {message.from_user.id} добавил публикацию пользователю {user.telegram_id} "
-                        f"(было: can_post={old_can_post}, can_post_until={old_can_post_until}, allowed_posts={old_allowed_posts})"
-                    )
+        await message.answer(msg)
 
-                session.commit()
-                
-                # Проверяем, что изменения сохранились
-                session.refresh(user)
-                if is_permanent and not user.can_post:
-                    raise Exception("Не удалось установить постоянное разрешение")
-                
-                await message.answer(msg)
-                
-                # Отправляем уведомление пользователю
-                try:
-                    await message.bot.send_message(
-                        user.telegram_id,
-                        f"🎉 {msg}\n\n"
-                        "Теперь вы можете опубликовать вакансию через меню бота."
-                    )
-                except Exception as notify_e:
-                    logger.error(f"Не удалось отправить уведомление пользователю {user.telegram_id}: {notify_e}")
-                
-            except Exception as e:
-                logger.error(f"Ошибка при обновлении прав пользователя {user.telegram_id}: {e}")
-                session.rollback()
-                await message.answer(
-                    "❌ Произошла ошибка при обновлении прав. Пожалуйста, попробуйте еще раз или обратитесь к разработчику."
-                )
-                return
+        # Отправляем уведомление пользователю
+        try:
+            await message.bot.send_message(
+                telegram_id,
+                f"🎉 {msg}\n\n"
+                "Теперь вы можете опубликовать вакансию через меню бота."
+            )
+        except Exception as notify_e:
+            logger.error(f"Не удалось отправить уведомление пользователю {telegram_id}: {notify_e}")
 
     except Exception as e:
         logger.error(f"Ошибка в allow_posting_handler: {e}")
@@ -786,6 +682,20 @@ async def allow_posting_handler(message: Message):
         )
 
 
+GROUP_WARNING_TTL = 120  # секунды, через которые удаляется предупреждение в группе
+
+# Ссылки на отложенные удаления, чтобы задачи не собрал сборщик мусора
+_pending_deletions: set[asyncio.Task] = set()
+
+
+async def _delete_later(message: Message, delay: float):
+    await asyncio.sleep(delay)
+    try:
+        await message.delete()
+    except Exception as e:
+        group_logger.error(f"Не удалось удалить предупреждение: {e}")
+
+
 @router.message(F.chat.type.in_([ChatType.GROUP, ChatType.SUPERGROUP]))
 async def handle_group_messages(message: Message):
     """Обработка сообщений в группах"""
@@ -795,57 +705,30 @@ async def handle_group_messages(message: Message):
             for new_member in message.new_chat_members:
                 if not new_member.is_bot and message.from_user:
                     try:
-                        with SessionLocal() as session:
-                            # Получаем пользователя-приглашающего
-                            inviter = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-                            if not inviter:
-                                continue
-                            
-                            # Увеличиваем счетчик приглашений
-                            inviter.invites += 1
-                            
-                            # Если достигли 5 приглашений, даем публикацию
-                            if inviter.invites >= 5 and inviter.invites % 5 == 0:
-                                inviter.allowed_posts += 1
-                            
-                            session.commit()
-                            logger.info(f"Пользователь {message.from_user.id} пригласил {new_member.id}")
+                        # Увеличиваем счетчик приглашений (каждые 5 дают публикацию)
+                        if await asyncio.to_thread(update_invite_count, message.from_user.id):
+                            group_logger.info(f"Пользователь {message.from_user.id} пригласил {new_member.id}")
                     except Exception as e:
-                        logger.error(f"Ошибка при обновлении счетчика приглашений: {e}")
+                        group_logger.error(f"Ошибка при обновлении счетчика приглашений: {e}")
             return
 
         # Обработка выхода пользователей
         if message.left_chat_member:
             try:
-                with SessionLocal() as session:
-                    # Получаем пользователя, который пригласил ушедшего участника
-                    # (это может быть любой пользователь, который приглашал участников)
-                    inviter = session.query(User).filter(
-                        User.invites > 0  # Берем пользователя, у которого есть приглашения
-                    ).order_by(User.invites.desc()).first()
-                    
-                    if inviter:
-                        # Уменьшаем счетчик приглашений
-                        if inviter.invites > 0:
-                            inviter.invites -= 1
-                            
-                            # Если количество приглашений стало меньше 5,
-                            # отменяем бонусную публикацию
-                            if inviter.invites < 5 and inviter.allowed_posts > 0:
-                                inviter.allowed_posts -= 1
-                            
-                            session.commit()
-                            logger.info(f"Пользователь {message.left_chat_member.id} покинул группу")
+                # Уменьшаем счетчик приглашений (и отменяем бонусную публикацию, если их стало меньше 5)
+                if await asyncio.to_thread(revoke_invite):
+                    group_logger.info(f"Пользователь {message.left_chat_member.id} покинул группу")
             except Exception as e:
-                logger.error(f"Ошибка при обработке выхода пользователя: {e}")
+                group_logger.error(f"Ошибка при обработке выхода пользователя: {e}")
             return
 
         # Блокировка сообщений от не-админов
         if message.from_user and message.from_user.id not in ADMINS:
             await message.delete()
+            group_logger.info(f"Удалено сообщение пользователя {message.from_user.id} в чате {message.chat.id}")
 
             bot = message.bot
-            bot_info = await bot.get_me()
+            bot_info = await bot.me()
 
             kb = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(
@@ -862,15 +745,13 @@ async def handle_group_messages(message: Message):
                 parse_mode=ParseMode.HTML
             )
 
-            # Удаляем предупреждение через 2 минуты
-            await asyncio.sleep(120)
-            try:
-                await warn.delete()
-            except Exception as e:
-                logger.error(f"Не удалось удалить предупреждение: {e}")
+            # Удаляем предупреждение через 2 минуты в фоне: хендлер не держит слот планировщика
+            task = asyncio.create_task(_delete_later(warn, GROUP_WARNING_TTL))
+            _pending_deletions.add(task)
+            task.add_done_callback(_pending_deletions.discard)
 
     except Exception as e:
-        logger.error(f"Ошибка в handle_group_messages: {e}")
+        group_logger.error(f"Ошибка в handle_group_messages: {e}")
 
 
 @router.message(Command("stats"))
@@ -880,8 +761,17 @@ async def stats_handler(message: Message):
         return
 
     try:
-        with SessionLocal() as session:
+        # Недописанная активность сохраняется сразу, чтобы цифры были точными
+        await activity_tracker.flush()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        with read_session() as session:
             total_users = session.query(func.count(User.id)).scalar()
+            active_today = session.query(func.count(User.id)).filter(
+                User.last_activity >= today
+            ).scalar()
+            active_week = session.query(func.count(User.id)).filter(
+                User.last_activity >= datetime.now() - timedelta(days=7)
+            ).scalar()
             total_jobs = session.query(func.count(Job.id)).scalar()
             active_subscriptions = session.query(func.count(User.id)).filter(
                 User.can_post_until > datetime.now()
@@ -893,6 +783,8 @@ async def stats_handler(message: Message):
         await message.answer(
             f"📊 <b>Статистика бота:</b>\n\n"
             f"👥 Всего пользователей: {total_users}\n"
+            f"🟢 Активны сегодня: {active_today}\n"
+            f"📅 Активны за 7 дней: {active_week}\n"
             f"📄 Всего вакансий: {total_jobs}\n"
             f"💳 Активных подписок: {active_subscriptions}\n"
             f"🔐 Постоянных разрешений: {permanent_users}",
@@ -917,7 +809,7 @@ async def user_info_handler(message: Message):
 
         identifier = parts[1]
 
-        with SessionLocal() as session:
+        with read_session() as session:
             user = None
 
             if identifier.startswith("@"):
@@ -929,7 +821,7 @@ async def user_info_handler(message: Message):
                 await message.answer("❌ Пользователь не найден.")
                 return
 
-            job_count = session.query(func.count(Job.id)).filter_by(user_id=user.telegram_id).scalar()
+            job_count = user.jobs_count or 0
 
             info_text = (
                 f"👤 <b>Информация о пользователе:</b>\n\n"
@@ -972,7 +864,9 @@ async def post_all_handler(message: Message, state: FSMContext):
             "📝 Задача: \n"
             "💵 Оплата: \n"
             "☎️ Контакт: \n"
-            "📌 Примечание: (необязательно)"
+            "📌 Примечание: (необязательно)\n\n"
+            "📎 Можно также отправить файл .csv или .jsonl с колонками "
+            "address, title, payment, contact, extra — вакансии будут опубликованы по очереди."
         )
     except Exception as e:
         logger.error(f"Ошибка при включении режима автоматической публикации: {e}")
@@ -1001,91 +895,39 @@ async def handle_private_messages(message: Message, state: FSMContext):
         state_data = await state.get_data()
         if state_data.get('auto_posting') and message.from_user.id in ADMINS:
             # Проверяем, соответствует ли сообщение формату вакансии
-            lines = message.text.strip().splitlines()
-            data = {}
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                for key, pat in TEMPLATE.items():
-                    m = re.match(pat, line)
-                    if m:
-                        data[key] = m.group(1).strip()
-                        break
+            data = parse_vacancy_text(message.text)
 
             # Проверяем наличие всех обязательных полей
-            required_fields = ["address", "title", "payment", "contact"]
-            missing_fields = [field for field in required_fields if field not in data or not data[field]]
+            missing_fields = find_missing_fields(data)
 
             if not missing_fields and PHONE_RE.match(data['contact']):
-                # Если все поля на месте и телефон валидный, публикуем вакансию
+                # Если все поля на месте и телефон валидный, ставим вакансию в очередь публикации
                 try:
-                    # Публикация в канал
-                    vacancy_text = (
-                        f"<b>Вакансия {data['title']}</b>\n\n"
-                        f"📍 <b>Адрес:</b> {data['address']}\n"
-                        f"💵 <b>Оплата:</b> {data['payment']}\n"
-                        f"☎️ <b>Контакт:</b> {data['contact']}"
-                    )
-
-                    if data.get('extra'):
-                        vacancy_text += f"\n📌 <b>Примечание:</b> {data['extra']}"
-
-                    posted = await message.bot.send_message(
-                        chat_id=CHANNEL_ID,
-                        text=vacancy_text,
-                        parse_mode=ParseMode.HTML
-                    )
-
-                    # Кнопка отклика
-                    response_button = create_response_buttons(
-                        data['contact'],
+                    publish_at = parse_publish_at(data.pop('publish_at', None))
+                    job_id, duplicate = await asyncio.to_thread(
+                        enqueue_publication,
                         message.from_user.id,
-                        message.from_user.username
-                    )
-
-                    await message.bot.edit_message_reply_markup(
-                        chat_id=CHANNEL_ID,
-                        message_id=posted.message_id,
-                        reply_markup=response_button
+                        data,
+                        publish_at
                     )
 
-                    # Сохраняем в базу
-                    saved = await asyncio.to_thread(
-                        save_job_db,
-                        message.from_user.id,
-                        posted.message_id,
-                        data
-                    )
-
-                    if saved:
-                        await message.answer(
-                            f"✅ Вакансия опубликована!\n"
-                            f"📄 Ссылка: {CHANNEL_URL}/{posted.message_id}"
-                        )
+                    if duplicate:
+                        await message.answer(f"{_duplicate_text(duplicate)} Сообщение не будет опубликовано.")
+                    elif job_id:
+                        wake_publisher()
+                        await message.answer("✅ Вакансия поставлена в очередь, ссылку пришлю после публикации.")
                     else:
                         await message.answer("❌ Ошибка при сохранении вакансии в базу данных.")
-                        # Удаляем сообщение из канала
-                        try:
-                            await message.bot.delete_message(chat_id=CHANNEL_ID, message_id=posted.message_id)
-                        except Exception as delete_e:
-                            logger.error(f"Не удалось удалить сообщение из канала: {delete_e}")
 
+                except ValueError as e:
+                    await message.answer(f"❌ {e}\nСообщение не будет опубликовано.")
                 except Exception as e:
                     logger.error(f"Ошибка при публикации вакансии в режиме auto_posting: {e}")
                     await message.answer("❌ Ошибка при публикации вакансии.")
             else:
                 # Если формат не соответствует, отправляем сообщение об ошибке
                 if missing_fields:
-                    field_names = {
-                        "address": "📍 Адрес",
-                        "title": "📝 Задача",
-                        "payment": "💵 Оплата",
-                        "contact": "☎️ Контакт"
-                    }
-                    missing_names = [field_names[f] for f in missing_fields]
+                    missing_names = [FIELD_NAMES[f] for f in missing_fields]
                     await message.answer(
                         f"❌ Не заполнены поля: {', '.join(missing_names)}\n"
                         "Сообщение не будет опубликовано."
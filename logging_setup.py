@@ -0,0 +1,152 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+# Контекст текущего апдейта: update_id, user_id, handler.
+# Каждый апдейт aiogram обрабатывает в своей задаче, поэтому контексты не смешиваются.
+log_context: ContextVar[dict | None] = ContextVar("log_context", default=None)
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON с контекстом апдейта"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        context = getattr(record, "context", None)
+        if context:
+            entry.update(context)
+        # Числовые показатели, переданные через extra={"metrics": {...}}
+        metrics = getattr(record, "metrics", None)
+        if metrics:
+            entry["metrics"] = metrics
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат, к которому дописывается контекст апдейта"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            text += " [" + " ".join(f"{key}={value}" for key, value in context.items()) + "]"
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только часть записей INFO и ниже от указанных логгеров
+    (и их потомков). Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Более длинные имена проверяем первыми, чтобы "a.b" перекрывал "a"
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                return random.random() < rate
+        return True
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладет запись в очередь вместе с контекстом апдейта. В отличие от
+    стандартного QueueHandler сообщение здесь не форматируется — этим
+    занимается поток QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = log_context.get()
+        if context:
+            record.context = dict(context)
+        return record
+
+
+def parse_sampling(value: str) -> dict[str, float]:
+    """Разбирает строку вида "handlers.group=0.1,aiogram.event=0.05" """
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", sampling: str = "") -> None:
+    """
+    Настраивает логирование: все записи через очередь уходят в фоновый поток,
+    который форматирует их и пишет в stdout. Поток останавливается при выходе.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = ContextQueueHandler(queue.SimpleQueue())
+    rates = parse_sampling(sampling)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class LogContextMiddleware:
+    """
+    Заполняет контекст логов для апдейта. Как внешний middleware на dp.update
+    задает update_id и user_id, как внутренний на остальных событиях — имя хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any]
+    ) -> Any:
+        context = dict(log_context.get() or {})
+        if "handler" in data:
+            context["handler"] = data["handler"].callback.__name__
+        else:
+            context["update_id"] = getattr(event, "update_id", None)
+            user = data.get("event_from_user")
+            if user:
+                context["user_id"] = user.id
+
+        token = log_context.set(context)
+        try:
+            return await handler(event, data)
+        finally:
+            log_context.reset(token)
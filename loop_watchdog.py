@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Awaitable, Callable
+
+from config import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD, LOOP_LAG_REPORT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 25  # сколько последних кадров стека записывать при блокировке
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(share * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LoopWatchdog:
+    """
+    Следит за задержкой event loop.
+
+    Задача в loop засыпает на LOOP_LAG_INTERVAL и замеряет, насколько позже
+    проснулась, — это задержка, которую видят все апдейты. Отдельный поток
+    проверяет, когда задача просыпалась в последний раз: если loop не отвечает
+    дольше LOOP_LAG_THRESHOLD, поток снимает стек потока loop прямо во время
+    блокировки и находит в нем хендлер aiogram.
+    Раз в LOOP_LAG_REPORT_INTERVAL в лог пишутся перцентили задержки.
+
+    Этот же объект — внутренний middleware: он запоминает код хендлеров,
+    чтобы по стеку определить, какой хендлер заблокировал loop.
+    """
+
+    def __init__(self):
+        self._samples: list[float] = []
+        self._beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._handlers: dict[Any, str] = {}  # code object → имя хендлера
+        self._stop = threading.Event()
+        self._stalls = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any]
+    ) -> Any:
+        callback = data["handler"].callback
+        code = getattr(callback, "__code__", None)
+        if code is not None and code not in self._handlers:
+            self._handlers[code] = f"{callback.__module__}.{callback.__name__}"
+        return await handler(event, data)
+
+    async def run(self):
+        """Фоновая задача: замеры задержки и запуск потока-наблюдателя"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+        last_report = time.monotonic()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(LOOP_LAG_INTERVAL)
+                now = time.monotonic()
+                self._beat = now
+                self._samples.append(max(0.0, now - started - LOOP_LAG_INTERVAL))
+                if now - last_report >= LOOP_LAG_REPORT_INTERVAL:
+                    self._report()
+                    last_report = now
+        finally:
+            self._stop.set()
+
+    def _report(self):
+        samples = sorted(self._samples)
+        self._samples = []
+        stalls, self._stalls = self._stalls, 0
+        metrics = {
+            "loop_lag_p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+            "loop_lag_p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+            "loop_lag_p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+            "loop_lag_max_ms": round((samples[-1] if samples else 0.0) * 1000, 1),
+            "loop_stalls": stalls,
+        }
+        logger.info(
+            f"Задержка event loop: p50={metrics['loop_lag_p50_ms']} мс, "
+            f"p95={metrics['loop_lag_p95_ms']} мс, p99={metrics['loop_lag_p99_ms']} мс, "
+            f"max={metrics['loop_lag_max_ms']} мс, блокировок: {stalls}",
+            extra={"metrics": metrics}
+        )
+
+    def _find_handler(self, frame) -> str | None:
+        while frame is not None:
+            name = self._handlers.get(frame.f_code)
+            if name:
+                return name
+            frame = frame.f_back
+        return None
+
+    def _monitor(self):
+        """Поток-наблюдатель: снимает стек, пока loop заблокирован"""
+        reported_beat = None
+        check_every = min(LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD / 2)
+        while not self._stop.wait(check_every):
+            beat = self._beat
+            lag = time.monotonic() - beat - LOOP_LAG_INTERVAL
+            if lag < LOOP_LAG_THRESHOLD or beat == reported_beat:
+                continue
+
+            # Одна запись на каждую блокировку
+            reported_beat = beat
+            self._stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_list(traceback.extract_stack(frame)[-STACK_DEPTH:]))
+            handler = self._find_handler(frame) or "вне хендлеров"
+            logger.warning(
+                f"Event loop заблокирован уже {lag:.2f} с ({handler}), стек:\n{stack}",
+                extra={"metrics": {"loop_stall_ms": round(lag * 1000)}}
+            )
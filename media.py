@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+
+import aiohttp
+from aiogram.types import PhotoSize, BufferedInputFile
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from config import MEDIA_MAX_SIZE, MEDIA_DOWNLOAD_TIMEOUT
+from db_base import SessionLocal, serialized_write
+from models import Media
+
+logger = logging.getLogger(__name__)
+
+
+def _get_or_create(column, value, **fields) -> int:
+    """id записи media с column == value; создает ее, если такой еще нет"""
+    with SessionLocal() as session:
+        media_id = session.execute(select(Media.id).where(column == value)).scalar()
+        if media_id is not None:
+            return media_id
+        media = Media(**{column.key: value}, **fields)
+        session.add(media)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Ту же картинку параллельно сохранил другой апдейт
+            session.rollback()
+            return session.execute(select(Media.id).where(column == value)).scalar_one()
+        return media.id
+
+
+@serialized_write
+def register_photo(photo: PhotoSize) -> int:
+    """Запоминает фото из сообщения пользователя. Одно и то же фото — одна запись"""
+    return _get_or_create(
+        Media.file_unique_id, photo.file_unique_id,
+        file_id=photo.file_id, width=photo.width, height=photo.height, file_size=photo.file_size
+    )
+
+
+@serialized_write
+def register_photo_source(value: str) -> int:
+    """
+    Фото из файла массового импорта: ссылка на картинку или file_id Telegram.
+    По ссылке файл скачается только при первой публикации.
+    """
+    if value.startswith(("http://", "https://")):
+        return _get_or_create(Media.source_url, value)
+    with SessionLocal() as session:
+        media_id = session.execute(select(Media.id).where(Media.file_id == value).limit(1)).scalar()
+        if media_id is not None:
+            return media_id
+        media = Media(file_id=value)
+        session.add(media)
+        session.commit()
+        return media.id
+
+
+def get_media(media_id: int) -> dict | None:
+    with SessionLocal() as session:
+        media = session.get(Media, media_id)
+        if media is None:
+            return None
+        return {"file_id": media.file_id, "source_url": media.source_url}
+
+
+def find_file_id_by_hash(content_hash: str) -> str | None:
+    with SessionLocal() as session:
+        return session.execute(
+            select(Media.file_id)
+            .where(Media.content_hash == content_hash, Media.file_id.isnot(None))
+            .limit(1)
+        ).scalar()
+
+
+@serialized_write
+def save_uploaded(media_id: int, photo: PhotoSize, content_hash: str | None) -> None:
+    """Сохраняет file_id, который Telegram вернул после первой отправки фото"""
+    with SessionLocal() as session:
+        media = session.get(Media, media_id)
+        if media is None:
+            return
+        media.file_id = photo.file_id
+        media.width, media.height, media.file_size = photo.width, photo.height, photo.file_size
+        if content_hash:
+            media.content_hash = content_hash
+        # Та же картинка могла прийти раньше из сообщения — ее file_unique_id уже занят
+        taken = session.execute(
+            select(Media.id).where(Media.file_unique_id == photo.file_unique_id, Media.id != media_id)
+        ).scalar()
+        if taken is None:
+            media.file_unique_id = photo.file_unique_id
+        session.commit()
+
+
+async def _download(url: str) -> bytes:
+    timeout = aiohttp.ClientTimeout(total=MEDIA_DOWNLOAD_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        async with http.get(url) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > MEDIA_MAX_SIZE:
+                raise ValueError(f"Фото больше {MEDIA_MAX_SIZE // (1024 * 1024)} МБ: {url}")
+            content = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                content += chunk
+                if len(content) > MEDIA_MAX_SIZE:
+                    raise ValueError(f"Фото больше {MEDIA_MAX_SIZE // (1024 * 1024)} МБ: {url}")
+    return bytes(content)
+
+
+async def photo_source(media_id: int) -> tuple[str | BufferedInputFile | None, str | None, bool]:
+    """
+    Что передать в send_photo: file_id из кеша или, если картинка еще
+    не загружалась, скачанный файл. Файл с тем же содержимым (sha256), уже
+    загруженный в Telegram, повторно не отправляется.
+    Возвращает (фото, хеш содержимого, нужно ли сохранить file_id после отправки).
+    """
+    media = await asyncio.to_thread(get_media, media_id)
+    if media is None:
+        logger.error(f"Фото {media_id} не найдено, вакансия будет опубликована без фото")
+        return None, None, False
+    if media["file_id"]:
+        return media["file_id"], None, False
+
+    content = await _download(media["source_url"])
+    content_hash = hashlib.sha256(content).hexdigest()
+    file_id = await asyncio.to_thread(find_file_id_by_hash, content_hash)
+    if file_id:
+        return file_id, content_hash, True
+    return BufferedInputFile(content, filename=f"{content_hash[:16]}.jpg"), content_hash, True
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, BigInteger, ForeignKey,
-    DateTime, Boolean, Text, JSON
+    DateTime, Boolean, Text, String, JSON, Index
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
@@ -14,9 +14,16 @@ class User(Base):
     username = Column(Text)
     can_post = Column(Boolean, default=False)
     invites = Column(Integer, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    can_post_until = Column(DateTime, nullable=True)  # до какой даты можно постить без ограничений
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    can_post_until = Column(DateTime, nullable=True, index=True)  # до какой даты можно постить без ограничений
+    expiry_notified_until = Column(DateTime, nullable=True)  # подписка, о скором окончании которой уже напомнили
     allowed_posts = Column(Integer, default=0)
+    last_activity = Column(DateTime, nullable=True, index=True)  # пишется пачками, с задержкой до ACTIVITY_FLUSH_INTERVAL
+    # Счетчики вакансий: меняются в той же транзакции, что вставка и удаление jobs.
+    # Вакансии, ушедшие в архив, из jobs_count не вычитаются
+    jobs_count = Column(Integer, default=0)
+    jobs_today = Column(Integer, default=0)  # вакансии за день last_post_at; для другого дня — 0
+    last_post_at = Column(DateTime, nullable=True)
 
     jobs = relationship("Job", back_populates="user", cascade="all, delete-orphan")
 
@@ -24,8 +31,117 @@ class Job(Base):
     __tablename__ = "jobs"
     id           = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey("users.telegram_id", ondelete="CASCADE"), nullable=False)
-    message_id   = Column(BigInteger, nullable=False)
+    message_id   = Column(BigInteger, nullable=True)  # None — вакансия еще ждет публикации
+    channel_id   = Column(BigInteger, nullable=True)  # канал с постом; None — основной CHANNEL_ID
     all_info     = Column(JSON, nullable=False)
-    created_at   = Column(DateTime(timezone=True), server_default=func.now())
+    created_at   = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     user = relationship("User", back_populates="jobs")
+    publish_tasks = relationship("PublishTask", cascade="all, delete-orphan")
+
+
+class PublishTask(Base):
+    """
+    Запись outbox: вакансия, которую нужно опубликовать в канал.
+    Создается в одной транзакции с Job, публикуется фоновым воркером.
+    """
+    __tablename__ = "publish_queue"
+    id          = Column(Integer, primary_key=True)
+    job_id      = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"), nullable=False)
+    user_id     = Column(BigInteger, ForeignKey("users.telegram_id", ondelete="CASCADE"), nullable=False)
+    all_info    = Column(JSON, nullable=False)  # содержимое поста на момент публикации
+    publish_at  = Column(DateTime, nullable=False)  # не раньше этого времени (и время следующей попытки)
+    status      = Column(Text, nullable=False, default="pending")  # pending / sending / done / failed
+    attempts    = Column(Integer, nullable=False, default=0)
+    notify_user = Column(Boolean, nullable=False, default=True)  # прислать автору ссылку после публикации
+    quota_reserved = Column(Boolean, nullable=False, default=False)  # под вакансию списана разовая публикация
+    message_id  = Column(BigInteger, nullable=True)  # пишется сразу после отправки, до закрытия задачи
+    channel_id  = Column(BigInteger, nullable=True)  # канал, куда ушел пост
+    last_error  = Column(Text, nullable=True)
+    claimed_at  = Column(DateTime, nullable=True)
+    created_at  = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_publish_queue_status_publish_at", "status", "publish_at"),
+        Index("ix_publish_queue_user_id", "user_id"),
+        Index("ix_publish_queue_job_id", "job_id"),
+    )
+
+
+class VacancyFingerprint(Base):
+    """Отпечаток принятой вакансии для поиска дублей"""
+    __tablename__ = "vacancy_fingerprints"
+    id           = Column(Integer, primary_key=True)
+    user_id      = Column(BigInteger, nullable=False)
+    job_id       = Column(Integer, nullable=True, index=True)  # удаляется вместе с вакансией
+    content_hash = Column(Text, nullable=False)  # точное совпадение
+    signature    = Column(JSON, nullable=False)  # MinHash-подпись для почти-дублей
+    created_at   = Column(DateTime, nullable=False, index=True)
+
+    bands = relationship("VacancyBand", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Одинаковая вакансия не может быть принята дважды даже при одновременной записи
+        Index("uq_vacancy_fingerprints_content_hash", "content_hash", unique=True, mysql_length=64),
+    )
+
+
+class VacancyBand(Base):
+    """LSH-корзина MinHash-подписи: совпадение хотя бы одной корзины дает кандидата в дубли"""
+    __tablename__ = "vacancy_bands"
+    id             = Column(Integer, primary_key=True)
+    fingerprint_id = Column(Integer, ForeignKey("vacancy_fingerprints.id", ondelete="CASCADE"), nullable=False, index=True)
+    bucket         = Column(BigInteger, nullable=False, index=True)
+
+
+class BotState(Base):
+    """Служебные значения бота (ключ — число), общие для всех запущенных экземпляров"""
+    __tablename__ = "bot_state"
+    key        = Column(String(64), primary_key=True)
+    value      = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class Broadcast(Base):
+    """
+    Массовая рассылка всем пользователям бота. Пользователи обходятся
+    по возрастанию telegram_id, last_user_id — точка продолжения после перезапуска.
+    """
+    __tablename__ = "broadcasts"
+    id                = Column(Integer, primary_key=True)
+    admin_id          = Column(BigInteger, nullable=False)
+    from_chat_id      = Column(BigInteger, nullable=False)  # откуда копируется сообщение рассылки
+    message_id        = Column(BigInteger, nullable=False)
+    status_message_id = Column(BigInteger, nullable=True)  # сообщение админу с прогрессом
+    status            = Column(Text, nullable=False, default="running")  # running / done / cancelled
+    last_user_id      = Column(BigInteger, nullable=False, default=0)
+    total             = Column(Integer, nullable=False, default=0)
+    sent              = Column(Integer, nullable=False, default=0)
+    blocked           = Column(Integer, nullable=False, default=0)
+    deactivated       = Column(Integer, nullable=False, default=0)
+    failed            = Column(Integer, nullable=False, default=0)
+    created_at        = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at       = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_broadcasts_status", "status"),
+    )
+
+
+class Media(Base):
+    """
+    Фото вакансий. Telegram хранит файл сам, боту достаточно file_id:
+    одна и та же картинка загружается в Telegram не больше одного раза.
+    Повторы находятся по file_unique_id (фото из сообщений) и по sha256
+    содержимого (фото, скачанные по ссылке при массовом импорте).
+    """
+    __tablename__ = "media"
+    id             = Column(Integer, primary_key=True)
+    file_unique_id = Column(String(64), nullable=True, unique=True)
+    file_id        = Column(String(255), nullable=True)  # None — файл еще не загружен в Telegram
+    content_hash   = Column(String(64), nullable=True, index=True)
+    source_url     = Column(String(512), nullable=True, unique=True)
+    width          = Column(Integer, nullable=True)
+    height         = Column(Integer, nullable=True)
+    file_size      = Column(Integer, nullable=True)
+    created_at     = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from config import USER_MESSAGES_PER_SECOND
+from ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит личных сообщений от фоновых задач, чтобы не упереться во flood control
+user_limiter = RateLimiter(USER_MESSAGES_PER_SECOND)
+
+# Результаты доставки
+SENT = "sent"
+BLOCKED = "blocked"  # пользователь заблокировал бота
+DEACTIVATED = "deactivated"  # аккаунт удален или чат не найден
+FAILED = "failed"
+
+
+async def deliver(user_id: int, send: Callable[[], Awaitable]) -> str:
+    """
+    Выполняет отправку с учетом общего лимита частоты и flood control.
+    Возвращает один из результатов доставки: SENT, BLOCKED, DEACTIVATED или FAILED.
+    """
+    while True:
+        await user_limiter.acquire()
+        try:
+            await send()
+            return SENT
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood control при отправке уведомлений, ждем {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+        except TelegramForbiddenError as e:
+            logger.info(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+            return DEACTIVATED if "deactivated" in e.message else BLOCKED
+        except TelegramBadRequest as e:
+            logger.info(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+            return DEACTIVATED if "chat not found" in e.message else FAILED
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сообщения пользователю {user_id}: {e}")
+            return FAILED
+
+
+async def send_notice(bot: Bot, user_id: int, text: str, **kwargs) -> bool:
+    """
+    Отправляет личное сообщение с учетом общего лимита частоты.
+    Возвращает False, если сообщение не доставлено.
+    """
+    return await deliver(user_id, lambda: bot.send_message(user_id, text, **kwargs)) == SENT
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, BufferedInputFile
+
+from config import ADMINS, PROFILE_INTERVAL, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+TOP_FUNCTIONS = 40
+
+# Кадры, в которых поток ждет работы, а не выполняет ее: сам ожидающий вызов
+# написан на C, поэтому самый внутренний Python-кадр — вызывающая его функция
+IDLE_FRAMES = {
+    ("selectors", "select"),  # цикл событий ждет сокеты
+    ("threading", "wait"),  # Condition.wait / Event.wait, в том числе ожидание результата записи
+    ("queue", "get"),
+    ("logging.handlers", "dequeue"),  # QueueListener логов ждет записи
+    ("sqlite_backend", "_run"),  # писатель SQLite ждет пачку (сама запись идет глубже по стеку)
+    ("concurrent.futures.thread", "_worker"),  # свободный поток asyncio.to_thread
+}
+
+# Одновременно работает только один профайлер
+_profile_lock = asyncio.Lock()
+
+
+def _is_idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}.{code.co_name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профайлер: фоновый поток каждые PROFILE_INTERVAL секунд
+    снимает стеки всех потоков процесса через sys._current_frames().
+    Код бота не инструментируется, поэтому накладные расходы малы
+    и от длины профилирования не зависят. Стеки потоков, ждущих работы
+    (IDLE_FRAMES), в профиль не попадают — только в счетчик idle.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self.idle = 0
+
+    def run(self, seconds: float) -> None:
+        """Синхронно собирает сэмплы в течение seconds — вызывается в отдельном потоке"""
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if _is_idle(frame):
+                    self.idle += 1
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed (flamegraph.pl, speedscope, inferno)"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top(self, limit: int = TOP_FUNCTIONS) -> str:
+        """Таблица функций по собственному (self) и накопленному (cumulative) времени"""
+        own = Counter()
+        cumulative = Counter()
+        total = sum(self.stacks.values()) or 1
+        for stack, count in self.stacks.items():
+            # Первый элемент стека — имя потока
+            own[stack[-1]] += count
+            for name in set(stack[1:]):
+                cumulative[name] += count
+
+        def table(title: str, counter: Counter) -> list[str]:
+            lines = [title, f"{'сэмплов':>8} {'доля':>7}  функция"]
+            for name, count in counter.most_common(limit):
+                lines.append(f"{count:>8} {count / total:>7.1%}  {name}")
+            return lines
+
+        header = [
+            f"Сэмплов: {self.samples}, интервал: {self.interval * 1000:.0f} мс, стеков потоков: {total}, "
+            f"ожидающих стеков (не учтены): {self.idle}",
+            "",
+        ]
+        return "\n".join(
+            header
+            + table("По собственному времени (self):", own)
+            + [""]
+            + table("По накопленному времени (cumulative):", cumulative)
+        ) + "\n"
+
+
+@router.message(Command("profile"))
+async def profile_handler(message: Message, command: CommandObject):
+    """Команда для админов - профилирование работающего бота"""
+    if message.from_user.id not in ADMINS:
+        await message.answer("❌ У вас нет прав для этой команды.")
+        return
+
+    try:
+        seconds = float(command.args or 30)
+    except ValueError:
+        await message.answer("📝 Использование: /profile <секунды>, например /profile 30")
+        return
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await message.answer(f"❌ Длительность должна быть от 1 до {PROFILE_MAX_SECONDS} секунд.")
+        return
+
+    if _profile_lock.locked():
+        await message.answer("⏳ Профилирование уже идет, дождитесь результата.")
+        return
+
+    async with _profile_lock:
+        await message.answer(f"⏳ Профилирую {seconds:g} с...")
+        profiler = SamplingProfiler()
+        try:
+            await asyncio.to_thread(profiler.run, seconds)
+            stamp = time.strftime("%Y%m%d_%H%M%S")
+            await message.answer_document(
+                BufferedInputFile(profiler.top().encode("utf-8"), filename=f"profile_top_{stamp}.txt"),
+                caption=f"📊 Топ функций за {seconds:g} с"
+            )
+            await message.answer_document(
+                BufferedInputFile(profiler.collapsed().encode("utf-8"), filename=f"profile_{stamp}.collapsed"),
+                caption="🔥 Стеки для flame graph (flamegraph.pl, speedscope)"
+            )
+            logger.info(f"Админ {message.from_user.id} снял профиль за {seconds:g} с")
+        except Exception as e:
+            logger.error(f"Ошибка при профилировании: {e}")
+            await message.answer("❌ Ошибка при профилировании.")
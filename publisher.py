@@ -0,0 +1,212 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramRetryAfter
+
+from channels import Channel, route_vacancy
+from config import ADMINS, PUBLISH_BATCH_SIZE, PUBLISH_MAX_ATTEMPTS, PUBLISH_RETRY_BASE, PUBLISH_RETRY_MAX
+from db_connection import (
+    claim_due_publications, job_exists, record_sent_message, complete_publication,
+    retry_publication, fail_publication, recover_publications, get_next_publish_at
+)
+from db_base import pin_to_primary
+from media import photo_source, save_uploaded
+from search import vacancy_index
+from vacancy import format_vacancy_text, create_response_buttons
+
+logger = logging.getLogger(__name__)
+
+# Максимальное время сна планировщика, если очередь пуста
+IDLE_SLEEP = 60
+
+_wakeup = asyncio.Event()
+
+
+def wake_publisher() -> None:
+    """Будит планировщик после постановки новой вакансии в очередь"""
+    _wakeup.set()
+
+
+async def _notify_admins(bot: Bot, text: str):
+    for admin_id in ADMINS:
+        try:
+            await bot.send_message(admin_id, text)
+        except Exception as admin_e:
+            logger.error(f"Не удалось отправить сообщение админу {admin_id}: {admin_e}")
+
+
+async def _send_to_channel(bot: Bot, channel: Channel, task: dict) -> int:
+    """
+    Отправляет вакансию в канал одним запросом вместе с кнопками отклика.
+    У каждого канала свой лимит частоты: публикации в разные каналы не ждут друг друга.
+    Вакансия с фото уходит через send_photo с file_id из кеша media.
+    Отправленный пост сразу записывается в задачу — до любых других действий.
+    """
+    data = task["all_info"]
+    photo, content_hash, save_file_id = None, None, False
+    if data.get("photo"):
+        photo, content_hash, save_file_id = await photo_source(data["photo"])
+
+    while True:
+        await channel.post_limiter.acquire()
+        try:
+            if photo is not None:
+                posted = await bot.send_photo(
+                    chat_id=channel.chat_id,
+                    photo=photo,
+                    caption=format_vacancy_text(data),
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=create_response_buttons(data["contact"], task["user_id"], None)
+                )
+            else:
+                posted = await bot.send_message(
+                    chat_id=channel.chat_id,
+                    text=format_vacancy_text(data),
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=create_response_buttons(data["contact"], task["user_id"], None)
+                )
+            break
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood control при публикации, ждем {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+
+    try:
+        await asyncio.to_thread(record_sent_message, task["id"], posted.message_id, channel.chat_id)
+    except Exception as e:
+        # Пост уже в канале: повторять отправку нельзя, message_id запишет complete_publication
+        logger.error(f"Не удалось записать отправленный пост задачи {task['id']}: {e}")
+    if save_file_id and posted.photo:
+        try:
+            await asyncio.to_thread(save_uploaded, data["photo"], posted.photo[-1], content_hash)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить file_id фото {data['photo']}: {e}")
+    return posted.message_id
+
+
+async def _notify_user(bot: Bot, uid: int, text: str):
+    try:
+        await bot.send_message(uid, text)
+    except Exception as e:
+        logger.error(f"Не удалось отправить сообщение пользователю {uid}: {e}")
+
+
+async def publish_task(bot: Bot, task: dict):
+    """
+    Публикует одну задачу outbox. message_id поста записывается в задачу сразу
+    после отправки, и после падения такая задача закрывается без повторной
+    отправки. Пост может выйти дважды, только если бот упадет между ответом
+    Telegram и этой записью: ключа идемпотентности у Bot API нет.
+    """
+    uid = task["user_id"]
+    data = task["all_info"]
+
+    if not await asyncio.to_thread(job_exists, task["job_id"]):
+        # Вакансию удалили, пока она ждала публикации
+        await asyncio.to_thread(fail_publication, task["id"], None, "job deleted")
+        return
+
+    channel = route_vacancy(data)
+    try:
+        message_id = await _send_to_channel(bot, channel, task)
+    except Exception as e:
+        attempts = task["attempts"] + 1
+        if attempts < PUBLISH_MAX_ATTEMPTS:
+            delay = min(PUBLISH_RETRY_BASE * 2 ** (attempts - 1), PUBLISH_RETRY_MAX)
+            logger.warning(
+                f"Ошибка при публикации вакансии {task['job_id']} (попытка {attempts}), "
+                f"повтор через {delay:.0f} с: {e}"
+            )
+            await asyncio.to_thread(retry_publication, task["id"], str(e), delay)
+            return
+
+        logger.error(f"Не удалось опубликовать вакансию {task['job_id']} после {attempts} попыток: {e}")
+        await asyncio.to_thread(fail_publication, task["id"], task["job_id"], str(e))
+        await _notify_admins(
+            bot,
+            f"❌ Ошибка при публикации вакансии:\n"
+            f"User ID: {uid}\n"
+            f"Error: {str(e)}\n"
+            f"Data: {data}"
+        )
+        if task["notify_user"]:
+            await _notify_user(
+                bot, uid,
+                "❌ Произошла ошибка при публикации вакансии. Пожалуйста, попробуйте позже или обратитесь к администратору."
+            )
+        return
+
+    saved = await asyncio.to_thread(
+        complete_publication, task["id"], task["job_id"], message_id, channel.chat_id
+    )
+    # Публикация сделана за пользователя: "Мои вакансии" сразу должны показать ее из основной базы
+    pin_to_primary(uid)
+    if not saved:
+        # Вакансию удалили, пока шла отправка — убираем пост из канала
+        try:
+            await bot.delete_message(chat_id=channel.chat_id, message_id=message_id)
+        except Exception as delete_e:
+            logger.error(f"Не удалось удалить сообщение из канала: {delete_e}")
+        return
+    vacancy_index.add(task["job_id"], message_id, data, channel_id=channel.chat_id)
+
+    if task["notify_user"]:
+        await _notify_user(
+            bot, uid,
+            "✅ Ваша вакансия успешно опубликована!\n\n"
+            f"📄 Ссылка: {channel.post_url(message_id)}\n"
+            "📋 Для управления вакансиями используйте 'Мои вакансии' \n Это даст возможность удалить или отредактировать вакансию"
+        )
+
+
+async def _publish_tasks(bot: Bot, tasks: list[dict]):
+    for task in tasks:
+        try:
+            await publish_task(bot, task)
+        except Exception as e:
+            # Например, база недоступна: задача вернется в очередь при следующем запуске
+            logger.error(f"Ошибка при обработке задачи публикации {task['id']}: {e}")
+
+
+async def _wait_for_work():
+    """Спит до ближайшей запланированной публикации или до появления новой задачи"""
+    next_at = await asyncio.to_thread(get_next_publish_at)
+    timeout = IDLE_SLEEP
+    if next_at:
+        timeout = min(IDLE_SLEEP, max(0.0, (next_at - datetime.now()).total_seconds()))
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+async def run_publisher(bot: Bot):
+    """
+    Фоновый воркер outbox: публикует вакансии из очереди с ограничением частоты,
+    повторяет неудачные попытки с экспоненциальной задержкой.
+    Очередь хранится в базе, поэтому ожидающие вакансии переживают перезапуск.
+    """
+    try:
+        recovered = await asyncio.to_thread(recover_publications)
+        if recovered:
+            logger.info(f"Восстановлено незавершенных публикаций: {recovered}")
+    except Exception as e:
+        logger.error(f"Ошибка при восстановлении очереди публикаций: {e}")
+
+    while True:
+        try:
+            tasks = await asyncio.to_thread(claim_due_publications, PUBLISH_BATCH_SIZE)
+            if not tasks:
+                await _wait_for_work()
+                continue
+            # Каналы публикуются параллельно, внутри канала — по порядку очереди
+            by_channel: dict[int, list[dict]] = {}
+            for task in tasks:
+                by_channel.setdefault(route_vacancy(task["all_info"]).chat_id, []).append(task)
+            await asyncio.gather(*(_publish_tasks(bot, group) for group in by_channel.values()))
+        except Exception as e:
+            logger.error(f"Ошибка планировщика публикаций: {e}")
+            await asyncio.sleep(IDLE_SLEEP)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.enums import ChatType
+from aiogram.types import TelegramObject, Update
+
+from config import (
+    ADMINS, SCHED_MAX_CONCURRENCY, SCHED_ADMIN_CONCURRENCY, SCHED_PRIVATE_CONCURRENCY,
+    SCHED_CALLBACK_CONCURRENCY, SCHED_GROUP_CONCURRENCY, SCHED_GROUP_QUEUE
+)
+
+logger = logging.getLogger(__name__)
+
+SHED_LOG_EVERY = 100  # при сбросе нагрузки в лог пишется каждый сотый отброшенный апдейт
+
+
+class PriorityClass:
+    """Класс апдейтов со своим лимитом одновременной обработки и очередью ожидания"""
+
+    def __init__(self, name: str, limit: int, max_queue: int | None = None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue  # None — апдейты класса никогда не отбрасываются
+        self.running = 0
+        self.queue: deque[asyncio.Future] = deque()
+        self.shed = 0
+
+
+class PriorityScheduler(BaseMiddleware):
+    """
+    Внешний middleware диспетчера: планирует обработку апдейтов по приоритетам.
+
+    Классы по убыванию приоритета: команды админов, личные сообщения
+    (подача вакансий, оплата), callback и инлайн-запросы, модерация групп.
+    У каждого класса свой лимит одновременных апдейтов, плюс общий лимит
+    SCHED_MAX_CONCURRENCY. Освободившийся слот получает ожидающий апдейт
+    самого приоритетного класса.
+
+    Сброс нагрузки: апдейт модерации группы отбрасывается, если его очередь
+    заполнена или если общий лимит исчерпан и освободившиеся слоты достанутся
+    более важным апдейтам. Остальные классы ждут без потерь.
+    Ожидающие класса, упершегося в собственный лимит, другим классам не мешают:
+    они не могут занять свободный общий слот.
+    """
+
+    def __init__(self):
+        self.admin = PriorityClass("admin", SCHED_ADMIN_CONCURRENCY)
+        self.private = PriorityClass("private", SCHED_PRIVATE_CONCURRENCY)
+        self.callback = PriorityClass("callback", SCHED_CALLBACK_CONCURRENCY)
+        self.group = PriorityClass("group", SCHED_GROUP_CONCURRENCY, SCHED_GROUP_QUEUE)
+        self.classes = [self.admin, self.private, self.callback, self.group]
+        self.running = 0
+
+    def classify(self, update: Update, data: dict[str, Any]) -> PriorityClass:
+        user = data.get("event_from_user")
+        if user is not None and user.id in ADMINS:
+            return self.admin
+        if update.message is not None:
+            if update.message.chat.type == ChatType.PRIVATE:
+                return self.private
+            return self.group
+        if update.callback_query is not None or update.inline_query is not None:
+            return self.callback
+        if update.chat_member is not None or update.my_chat_member is not None:
+            return self.group
+        return self.callback
+
+    def _higher_waiting(self, cls: PriorityClass) -> bool:
+        """Ждут ли более важные апдейты, которым хватает лимита своего класса"""
+        return any(
+            higher.queue and higher.running < higher.limit
+            for higher in self.classes[:self.classes.index(cls)]
+        )
+
+    def _should_shed(self, cls: PriorityClass) -> bool:
+        if cls.max_queue is None:
+            return False
+        if len(cls.queue) >= cls.max_queue:
+            return True
+        return self.running >= SCHED_MAX_CONCURRENCY and self._higher_waiting(cls)
+
+    def _has_slot(self, cls: PriorityClass) -> bool:
+        return cls.running < cls.limit and self.running < SCHED_MAX_CONCURRENCY
+
+    def _dispatch(self) -> None:
+        """Отдает свободные слоты ожидающим апдейтам в порядке приоритета"""
+        for cls in self.classes:
+            while cls.queue and self._has_slot(cls):
+                waiter = cls.queue.popleft()
+                if waiter.done():
+                    continue
+                cls.running += 1
+                self.running += 1
+                waiter.set_result(None)
+            if self.running >= SCHED_MAX_CONCURRENCY:
+                return
+
+    async def _acquire(self, cls: PriorityClass) -> None:
+        # Без очереди — только если перед этим апдейтом никто из тех, кто может занять слот, не ждет
+        if self._has_slot(cls) and not cls.queue and not self._higher_waiting(cls):
+            cls.running += 1
+            self.running += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        cls.queue.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже выдан — возвращаем его
+                self._release(cls)
+            else:
+                try:
+                    cls.queue.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def _release(self, cls: PriorityClass) -> None:
+        cls.running -= 1
+        self.running -= 1
+        self._dispatch()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            cls.name: {"running": cls.running, "queued": len(cls.queue), "shed": cls.shed}
+            for cls in self.classes
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        cls = self.classify(event, data)
+        if self._should_shed(cls):
+            cls.shed += 1
+            if cls.shed % SHED_LOG_EVERY == 1:
+                logger.warning(
+                    f"Перегрузка: апдейты класса {cls.name} отбрасываются (всего отброшено {cls.shed})",
+                    extra={"metrics": {"sched_shed": cls.shed, "sched_class": cls.name}}
+                )
+            return None
+
+        await self._acquire(cls)
+        try:
+            return await handler(event, data)
+        finally:
+            self._release(cls)
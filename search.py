@@ -0,0 +1,212 @@
+import bisect
+import logging
+import math
+from datetime import datetime
+
+from aiogram import Router
+from aiogram.enums import ParseMode
+from aiogram.types import (
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent,
+    InlineKeyboardMarkup, InlineKeyboardButton
+)
+from sqlalchemy import select
+
+from channels import get_channel
+from config import INLINE_PAGE_SIZE, INLINE_CACHE_TIME, SEARCH_LOAD_BATCH
+from db_base import read_session
+from dedup import normalize_text
+from models import Job
+from vacancy import format_vacancy_text
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Вес совпадения по полю: слово из задачи важнее слова из адреса или оплаты
+FIELD_WEIGHTS = {"title": 3.0, "address": 2.0, "payment": 1.0}
+PREFIX_PENALTY = 0.7  # совпадение по началу слова ("сантех" → "сантехник") ценится меньше точного
+MAX_EXPANSIONS = 50  # сколько слов словаря может подставиться вместо одного префикса
+MIN_TERM_LENGTH = 2
+STEM_TRIM = 2  # сколько последних букв можно отбросить, если слово не нашлось ("бишкеке" → "бишкек")
+
+
+def tokenize(value: str) -> list[str]:
+    return [token for token in normalize_text(value).split() if len(token) >= MIN_TERM_LENGTH]
+
+
+class _Doc:
+    __slots__ = ("message_id", "channel_id", "data", "created_at", "terms")
+
+    def __init__(self, message_id: int, channel_id: int | None, data: dict, created_at: float,
+                 terms: dict[str, float]):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.data = data
+        self.created_at = created_at
+        self.terms = terms
+
+
+class VacancyIndex:
+    """
+    Инвертированный индекс опубликованных вакансий для инлайн-поиска.
+
+    Для каждого слова из задачи, адреса и оплаты хранится словарь
+    job_id → вес поля, плюс отсортированный словарь слов для поиска по префиксу.
+    Индекс загружается из jobs при старте и дальше меняется только
+    из event loop (публикация, редактирование, удаление, архив),
+    поэтому блокировки не нужны, а поиск не обращается к базе.
+    """
+
+    def __init__(self):
+        self.docs: dict[int, _Doc] = {}
+        self.postings: dict[str, dict[int, float]] = {}
+        self.vocabulary: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, job_id: int, message_id: int, data: dict, created_at: datetime | None = None,
+            channel_id: int | None = None) -> None:
+        """Добавляет вакансию или заменяет ее прежнюю версию"""
+        self.remove(job_id)
+        terms: dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(data.get(field, "")):
+                terms[token] = max(terms.get(token, 0.0), weight)
+
+        moment = (created_at or datetime.now()).timestamp()
+        self.docs[job_id] = _Doc(message_id, channel_id, data, moment, terms)
+        for token, weight in terms.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            posting[job_id] = weight
+
+    def remove(self, job_id: int) -> None:
+        doc = self.docs.pop(job_id, None)
+        if doc is None:
+            return
+        for token in doc.terms:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(job_id, None)
+            if not posting:
+                del self.postings[token]
+                index = bisect.bisect_left(self.vocabulary, token)
+                if index < len(self.vocabulary) and self.vocabulary[index] == token:
+                    del self.vocabulary[index]
+
+    def remove_many(self, job_ids) -> None:
+        for job_id in job_ids:
+            self.remove(job_id)
+
+    def _expand(self, term: str) -> list[tuple[str, float]]:
+        """Слова словаря, начинающиеся с term, с множителем точности совпадения"""
+        for trim in range(STEM_TRIM + 1):
+            prefix = term[:len(term) - trim] if trim else term
+            if len(prefix) < MIN_TERM_LENGTH + 1 and trim:
+                break
+            expansions = []
+            index = bisect.bisect_left(self.vocabulary, prefix)
+            while index < len(self.vocabulary) and len(expansions) < MAX_EXPANSIONS:
+                token = self.vocabulary[index]
+                if not token.startswith(prefix):
+                    break
+                expansions.append((token, 1.0 if token == term else PREFIX_PENALTY))
+                index += 1
+            if expansions:
+                return expansions
+        return []
+
+    def search(self, query: str) -> list[int]:
+        """
+        Возвращает job_id, отсортированные по релевантности.
+        Сначала идут вакансии, где нашлись все слова запроса, затем частичные
+        совпадения; внутри — по сумме весов TF-IDF, при равенстве — более свежие.
+        Пустой запрос — последние вакансии.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return sorted(self.docs, key=lambda job_id: self.docs[job_id].created_at, reverse=True)
+
+        total = len(self.docs) or 1
+        scores: dict[int, float] = {}
+        matched: dict[int, int] = {}
+        for term in terms:
+            best: dict[int, float] = {}
+            for token, exactness in self._expand(term):
+                posting = self.postings[token]
+                idf = math.log(1 + total / len(posting))
+                for job_id, weight in posting.items():
+                    score = weight * idf * exactness
+                    if score > best.get(job_id, 0.0):
+                        best[job_id] = score
+            for job_id, score in best.items():
+                scores[job_id] = scores.get(job_id, 0.0) + score
+                matched[job_id] = matched.get(job_id, 0) + 1
+
+        return sorted(
+            scores,
+            key=lambda job_id: (matched[job_id], scores[job_id], self.docs[job_id].created_at),
+            reverse=True
+        )
+
+    def load(self) -> int:
+        """Заполняет индекс опубликованными вакансиями из базы (вызывается в потоке при старте)"""
+        self.docs.clear()
+        self.postings.clear()
+        self.vocabulary.clear()
+        with read_session() as session:
+            rows = session.execute(
+                select(Job.id, Job.message_id, Job.channel_id, Job.all_info, Job.created_at)
+                .where(Job.message_id.isnot(None))
+                .execution_options(yield_per=SEARCH_LOAD_BATCH)
+            )
+            for job_id, message_id, channel_id, data, created_at in rows:
+                self.add(job_id, message_id, data, created_at, channel_id)
+        return len(self.docs)
+
+
+vacancy_index = VacancyIndex()
+
+
+def _build_result(job_id: int, doc: _Doc) -> InlineQueryResultArticle:
+    data = doc.data
+    post_url = get_channel(doc.channel_id).post_url(doc.message_id)
+    return InlineQueryResultArticle(
+        id=str(job_id),
+        title=data.get("title", "Вакансия"),
+        description=f"📍 {data.get('address', '')}\n💵 {data.get('payment', '')}",
+        input_message_content=InputTextMessageContent(
+            message_text=format_vacancy_text(data),
+            parse_mode=ParseMode.HTML
+        ),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📄 Открыть в канале", url=post_url)]
+        ])
+    )
+
+
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    """Инлайн-поиск вакансий: @bot сантехник Бишкек"""
+    try:
+        offset = max(0, int(query.offset or 0))
+    except ValueError:
+        offset = 0
+
+    found = vacancy_index.search(query.query)
+    page = found[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(found) else ""
+    results = [_build_result(job_id, vacancy_index.docs[job_id]) for job_id in page]
+
+    try:
+        await query.answer(
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=False,
+            next_offset=next_offset
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при ответе на инлайн-запрос '{query.query}': {e}")
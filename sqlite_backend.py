@@ -0,0 +1,147 @@
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Соединение потока-писателя: сессии, созданные внутри пакетной транзакции,
+# работают через него (каждая в своем SAVEPOINT)
+writer_connection: ContextVar[Connection | None] = ContextVar("writer_connection", default=None)
+
+
+def configure_sqlite(engine: Engine, busy_timeout_ms: int, mmap_size: int) -> None:
+    """
+    Настраивает соединения SQLite для работы в проде:
+    WAL (читатели не блокируют писателя и наоборот), synchronous=NORMAL
+    (в режиме WAL это безопасно и намного быстрее FULL), busy_timeout и mmap.
+
+    Драйвер pysqlite сам управляет транзакциями и ломает SAVEPOINT, поэтому
+    BEGIN выдаем сами: писатель берет блокировку сразу (BEGIN IMMEDIATE).
+    """
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.info.get("sqlite_writer") else "BEGIN")
+
+
+class _WriteJob:
+    __slots__ = ("fn", "args", "kwargs", "context", "future")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Контекст вызывающего (пользователь апдейта и т.п.) переносится в поток писателя
+        self.context = contextvars.copy_context()
+        self.future = Future()
+
+
+class SQLiteWriter:
+    """
+    Единственный поток, который пишет в SQLite.
+
+    Записи из всех потоков и хендлеров ставятся в очередь, поток забирает
+    до batch_size записей и выполняет их в одной транзакции: каждая функция —
+    в своем SAVEPOINT, поэтому ошибка одной записи не откатывает соседние.
+    Вызывающий получает результат только после общего COMMIT.
+    Так исчезают ошибки "database is locked" между писателями, а fsync
+    делается один раз на пачку, а не на каждую запись.
+    """
+
+    def __init__(self, engine: Engine, batch_size: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self._queue: queue.SimpleQueue[_WriteJob | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def call(self, fn, *args, **kwargs):
+        """Выполняет fn в потоке писателя и ждет результата"""
+        if threading.current_thread() is self._thread:
+            # Вложенный вызов изнутри пакета — уже в нужной транзакции
+            return fn(*args, **kwargs)
+        self.start()
+        job = _WriteJob(fn, args, kwargs)
+        self._queue.put(job)
+        return job.future.result()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._apply(batch)
+                    return
+                batch.append(job)
+            self._apply(batch)
+
+    def _apply(self, batch: list[_WriteJob]) -> None:
+        results = []
+        try:
+            with self.engine.connect() as conn:
+                conn.info["sqlite_writer"] = True
+                try:
+                    with conn.begin():
+                        for job in batch:
+                            results.append(self._execute(conn, job))
+                finally:
+                    conn.info.pop("sqlite_writer", None)
+        except Exception as e:
+            logger.error(f"Ошибка при записи пакета из {len(batch)} операций в SQLite: {e}")
+            for job in batch:
+                job.future.set_exception(e)
+            return
+
+        for job, (ok, value) in zip(batch, results):
+            if ok:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+    @staticmethod
+    def _execute(conn: Connection, job: _WriteJob) -> tuple[bool, object]:
+        def run():
+            token = writer_connection.set(conn)
+            try:
+                return job.fn(*job.args, **job.kwargs)
+            finally:
+                writer_connection.reset(token)
+
+        try:
+            return True, job.context.run(run)
+        except Exception as e:
+            return False, e
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from sqlalchemy import select, update
+
+from config import (
+    SUBSCRIPTION_SWEEP_INTERVAL, SUBSCRIPTION_SWEEP_BATCH, SUBSCRIPTION_REMIND_HOURS, SUBSCRIPTION_EXPIRED_GRACE_HOURS
+)
+from db_base import SessionLocal, serialized_write
+from models import User
+from notifier import send_notice
+
+logger = logging.getLogger(__name__)
+
+
+def _load_expiring_batch(now: datetime, horizon: datetime, limit: int) -> list[tuple[int, datetime]]:
+    """
+    Подписки, которые закончатся до horizon и о которых еще не напомнили.
+    Диапазонный запрос по индексу can_post_until.
+    """
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(User.telegram_id, User.can_post_until)
+            .where(
+                User.can_post_until > now,
+                User.can_post_until <= horizon,
+                (User.expiry_notified_until.is_(None)) | (User.expiry_notified_until != User.can_post_until)
+            )
+            .order_by(User.can_post_until)
+            .limit(limit)
+        ).all()
+    return [tuple(row) for row in rows]
+
+
+@serialized_write
+def _mark_notified(rows: list[tuple[int, datetime]]) -> None:
+    """Отмечает подписки, о скором окончании которых напомнили"""
+    with SessionLocal() as session:
+        for telegram_id, until in rows:
+            session.execute(
+                update(User)
+                .where(User.telegram_id == telegram_id, User.can_post_until == until)
+                .values(expiry_notified_until=until)
+            )
+        session.commit()
+
+
+@serialized_write
+def _expire_batch(now: datetime, limit: int) -> list[tuple[int, datetime]]:
+    """Снимает истекшие подписки пачкой и возвращает (telegram_id, когда истекла)"""
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(User.telegram_id, User.can_post_until)
+            .where(User.can_post_until <= now)
+            .order_by(User.can_post_until)
+            .limit(limit)
+        ).all()
+        if rows:
+            session.execute(
+                update(User)
+                .where(User.telegram_id.in_([telegram_id for telegram_id, _ in rows]), User.can_post_until <= now)
+                .values(can_post_until=None, expiry_notified_until=None)
+            )
+            session.commit()
+    return [tuple(row) for row in rows]
+
+
+async def sweep_subscriptions(bot: Bot) -> tuple[int, int]:
+    """
+    Один проход: напоминает о подписках, которые скоро закончатся,
+    и снимает истекшие. Возвращает (напомнили, сняли).
+    Отметка в базе ставится до отправки, поэтому повторных напоминаний не бывает.
+    Владельцам давно истекших подписок (например, на старой базе при первом
+    запуске) не пишем: их подписки снимаются молча.
+    """
+    now = datetime.now()
+    horizon = now + timedelta(hours=SUBSCRIPTION_REMIND_HOURS)
+    notify_since = now - timedelta(seconds=SUBSCRIPTION_SWEEP_INTERVAL, hours=SUBSCRIPTION_EXPIRED_GRACE_HOURS)
+    reminded = expired = 0
+
+    while True:
+        rows = await asyncio.to_thread(_load_expiring_batch, now, horizon, SUBSCRIPTION_SWEEP_BATCH)
+        if not rows:
+            break
+        await asyncio.to_thread(_mark_notified, rows)
+        for telegram_id, until in rows:
+            await send_notice(
+                bot, telegram_id,
+                f"⏰ Ваша месячная подписка на публикации заканчивается {until.strftime('%d.%m.%Y %H:%M')}.\n"
+                "Чтобы продлить ее, обратитесь к администратору."
+            )
+        reminded += len(rows)
+        if len(rows) < SUBSCRIPTION_SWEEP_BATCH:
+            break
+
+    while True:
+        rows = await asyncio.to_thread(_expire_batch, now, SUBSCRIPTION_SWEEP_BATCH)
+        if not rows:
+            break
+        for telegram_id, until in rows:
+            if until < notify_since:
+                continue
+            await send_notice(
+                bot, telegram_id,
+                "⌛ Ваша месячная подписка на публикации закончилась.\n"
+                "Чтобы продлить ее, обратитесь к администратору."
+            )
+        expired += len(rows)
+        if len(rows) < SUBSCRIPTION_SWEEP_BATCH:
+            break
+
+    return reminded, expired
+
+
+async def run_subscription_sweeper(bot: Bot):
+    """Фоновая задача: периодически проверяет сроки месячных подписок"""
+    while True:
+        try:
+            reminded, expired = await sweep_subscriptions(bot)
+            if reminded or expired:
+                logger.info(f"Подписки: напомнили о продлении {reminded}, истекло {expired}")
+        except Exception as e:
+            logger.error(f"Ошибка при проверке подписок: {e}")
+        await asyncio.sleep(SUBSCRIPTION_SWEEP_INTERVAL)
@@ -0,0 +1,291 @@
+"""
+Бюджеты SQL-запросов для хендлеров бота.
+
+Каждый сценарий прогоняет апдейт через диспетчер с теми же роутерами, что
+и в bot.py, но с подставным Bot: запросы к Telegram не уходят, а возвращают
+готовые ответы. Запросы к базе считаются событием before_cursor_execute на
+db_base.engine, включая записи через поток-писатель SQLite. Если хендлер
+выполнил больше запросов, чем заявлено в BUDGETS, тест сценария падает
+и показывает выполненные запросы. Так N+1 (ленивые связи, повторные выборки
+пользователя) не пройдут незамеченными.
+
+У автора в сценариях 50 вакансий, поэтому запрос на каждую вакансию сразу
+выбьет из бюджета.
+
+Запуск (база создается во временном каталоге, рабочая не трогается):
+    python -m pytest test_query_budget.py
+"""
+import asyncio
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+# Окружение задается до импорта config: временная база, без реплики, свой админ
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='query_budget_'), 'budget.db')}"
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ["ADMINS"] = "1"
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+os.environ["TRACE_FILE"] = ""
+
+ADMIN_ID = 1  # совпадает с ADMINS в окружении выше
+POSTER_ID = 1001  # может публиковать без ограничений
+HEAVY_ID = 1002  # автор с большим числом вакансий
+NEWCOMER_ID = 1003  # еще не писал боту
+GROUP_ID = -100500
+HEAVY_JOBS = 50
+HEAVY_PENDING = 5
+
+# Сколько SQL-запросов может выполнить хендлер в сценарии. Бюджет поднимается
+# только вместе с объяснением, на что уходит каждый новый запрос
+BUDGETS = {
+    "/start: новый пользователь": 1,  # upsert
+    "/start: повторно": 0,  # пользователь уже в кеше известных
+    "Мои вакансии": 2,  # вакансии + очередь, независимо от их числа
+    "Выложить вакансию": 1,
+    # upsert, спам, права, 2 проверки дублей (точный + похожие), резерв разовой
+    # публикации, вакансия + счетчики + очередь, отпечаток + корзины
+    "Новая вакансия": 11,
+    "Редактирование: кнопка": 1,
+    # Upsert, права, вакансия, проверка дублей заранее (2), старый отпечаток (2),
+    # проверка дублей в записи (2), вакансия, новый отпечаток (2). +4 к прежним 8 (user-030):
+    # старый отпечаток удаляется, иначе прежняя версия считалась бы чужим дублем, а дубли
+    # проверяются и в самой записи — ловят такую же вакансию, принятую за время правки поста.
+    # Проверка заранее остается: правку поста в канале не откатить
+    "Редактирование: опубликованная": 12,
+    # Права, вакансия, старый отпечаток (2), проверка дублей (2), задача в очереди,
+    # вакансия, новый отпечаток (2)
+    "Редактирование: в очереди": 10,
+    # Вакансия, ее задачи в очереди и автор (каскады ORM), удаление — это прежние 4.
+    # +2 (user-050): счетчики вакансий автора, выборка и UPDATE в той же транзакции.
+    # +2 (user-030): отпечаток и его корзины, иначе удаленная вакансия считалась бы дублем
+    "Удаление вакансии": 8,
+    "/stats": 6,
+    "/user_info": 1,
+    "/allow_posting": 2,
+    "Сообщение в группе": 0,
+    "Новый участник группы": 2,
+    "Участник вышел из группы": 2,
+}
+
+# Служебные команды транзакций не считаются
+SERVICE_STATEMENTS = ("SAVEPOINT", "RELEASE", "ROLLBACK", "BEGIN", "COMMIT", "PRAGMA")
+
+VACANCY_TEXT = (
+    "📍 Адрес: Бишкек, мкр Джал\n"
+    "📝 Задача: {title}\n"
+    "💵 Оплата: 1500 сом/день\n"
+    "☎️ Контакт: +996555123456"
+)
+
+
+class QueryCounter:
+    """Считает SQL-запросы движка, пока открыт блок count()"""
+
+    def __init__(self, engine):
+        self._lock = threading.Lock()
+        self._active = False
+        self.statements: list[str] = []
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not self._active or statement.lstrip().upper().startswith(SERVICE_STATEMENTS):
+            return
+        with self._lock:
+            self.statements.append(" ".join(statement.split()))
+
+    @contextmanager
+    def count(self):
+        self.statements = []
+        self._active = True
+        try:
+            yield self
+        finally:
+            self._active = False
+
+
+def _fake_session_class():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Message, Chat, User
+
+    class FakeSession(BaseSession):
+        """Сессия Bot без сети: Message-методы возвращают сообщение, остальные — True"""
+
+        def __init__(self):
+            super().__init__()
+            self._message_id = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            returning = method.__returning__
+            if returning is User:
+                return User(id=42, is_bot=True, first_name="Bot", username="test_bot").as_(bot)
+            if returning is Message:
+                self._message_id += 1
+                chat_id = int(getattr(method, "chat_id", 0) or 0)
+                return Message(
+                    message_id=self._message_id, date=datetime.now(),
+                    chat=Chat(id=chat_id, type="private" if chat_id > 0 else "supergroup"),
+                ).as_(bot)
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession
+
+
+def _user(user_id: int, username: str | None = None):
+    from aiogram.types import User
+    return User(id=user_id, is_bot=False, first_name="Test", username=username)
+
+
+def _message(update_id: int, user_id: int, text: str | None = None, chat_id: int | None = None, **fields):
+    from aiogram.types import Update, Message, Chat
+    chat_id = chat_id or user_id
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id, date=datetime.now(), text=text,
+        chat=Chat(id=chat_id, type="private" if chat_id > 0 else "supergroup"),
+        from_user=_user(user_id, f"user{user_id}"), **fields
+    ))
+
+
+def _callback(update_id: int, user_id: int, data: str):
+    from aiogram.types import Update, CallbackQuery, Message, Chat
+    return Update(update_id=update_id, callback_query=CallbackQuery(
+        id=str(update_id), chat_instance="test", data=data, from_user=_user(user_id, f"user{user_id}"),
+        message=Message(message_id=update_id, date=datetime.now(), text="вакансия",
+                        chat=Chat(id=user_id, type="private")),
+    ))
+
+
+def seed() -> dict:
+    """Пользователи сценариев и вакансии активного автора. Возвращает id нужных вакансий"""
+    from sqlalchemy import insert, select
+    from db_base import engine
+    from db_connection import backfill_job_counters
+    from models import User, Job, PublishTask
+
+    old = datetime.now() - timedelta(days=3)
+    with engine.begin() as conn:
+        # У строк одной вставки должен быть одинаковый набор ключей
+        conn.execute(insert(User), [
+            {"telegram_id": ADMIN_ID, "username": "admin", "can_post": True, "invites": 0,
+             "allowed_posts": 0, "can_post_until": None},
+            {"telegram_id": POSTER_ID, "username": f"user{POSTER_ID}", "can_post": True, "invites": 3,
+             "allowed_posts": 0, "can_post_until": None},
+            {"telegram_id": HEAVY_ID, "username": f"user{HEAVY_ID}", "can_post": False, "invites": 0,
+             "allowed_posts": 0, "can_post_until": datetime.now() + timedelta(days=10)},
+        ])
+        conn.execute(insert(Job), [
+            {"user_id": HEAVY_ID, "message_id": None if i < HEAVY_PENDING else 1000 + i,
+             "all_info": {"title": f"Грузчик {i}", "address": "Бишкек", "payment": "1000 сом",
+                          "contact": "+996555000000"},
+             "created_at": old + timedelta(minutes=i)}
+            for i in range(HEAVY_JOBS)
+        ])
+        pending = conn.execute(
+            select(Job.id, Job.all_info).where(Job.user_id == HEAVY_ID, Job.message_id.is_(None))
+        ).all()
+        conn.execute(insert(PublishTask), [
+            {"job_id": job_id, "user_id": HEAVY_ID, "all_info": all_info, "status": "pending",
+             "publish_at": datetime.now() + timedelta(hours=1), "attempts": 0, "notify_user": True}
+            for job_id, all_info in pending
+        ])
+        published = conn.execute(
+            select(Job.id).where(Job.user_id == HEAVY_ID, Job.message_id.isnot(None)).order_by(Job.id)
+        ).scalars().all()
+    backfill_job_counters(engine)
+    return {"pending": pending[0].id, "published": published[0], "to_delete": published[1]}
+
+
+async def run() -> dict[str, tuple[bool, list[str]]]:
+    """Прогоняет сценарии по порядку. Возвращает {сценарий: (обработан, запросы)}"""
+    from aiogram import Bot, Dispatcher
+    from aiogram.dispatcher.event.bases import UNHANDLED
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from db_base import engine
+    from db_connection import init_db
+
+    init_db()
+    jobs = seed()
+    counter = QueryCounter(engine)
+
+    session = _fake_session_class()()
+    bot = Bot(token="42:TEST", session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    # Те же роутеры и в том же порядке, что в bot.py
+    from bulk_import import router as bulk_import_router
+    from broadcast import router as broadcast_router
+    from export import router as export_router
+    from profiler import router as profiler_router
+    from search import router as search_router
+    from handlers import router, VacancyForm
+    for item in (bulk_import_router, broadcast_router, export_router, profiler_router, search_router, router):
+        dp.include_router(item)
+
+    async def editing(user_id: int, job_id: int | None = None):
+        state = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+        await state.set_state(VacancyForm.all_info)
+        await state.set_data({"editing_job_id": job_id} if job_id else {})
+
+    scenarios = [
+        ("/start: новый пользователь", None, _message(1, NEWCOMER_ID, "/start")),
+        ("/start: повторно", None, _message(2, NEWCOMER_ID, "/start")),
+        ("Мои вакансии", None, _message(3, HEAVY_ID, "📋 Мои вакансии")),
+        ("Выложить вакансию", None, _message(4, POSTER_ID, "✉️ Выложить вакансию")),
+        ("Новая вакансия", editing(POSTER_ID),
+         _message(5, POSTER_ID, VACANCY_TEXT.format(title="Разнорабочий на стройку"))),
+        ("Редактирование: кнопка", None, _callback(6, HEAVY_ID, f"edit_job_{jobs['published']}")),
+        ("Редактирование: опубликованная", editing(HEAVY_ID, jobs["published"]),
+         _message(7, HEAVY_ID, VACANCY_TEXT.format(title="Сантехник на объект"))),
+        ("Редактирование: в очереди", editing(HEAVY_ID, jobs["pending"]),
+         _message(8, HEAVY_ID, VACANCY_TEXT.format(title="Электрик в офис"))),
+        ("Удаление вакансии", None, _callback(9, HEAVY_ID, f"delete_job_{jobs['to_delete']}")),
+        ("/stats", None, _message(10, ADMIN_ID, "/stats")),
+        ("/user_info", None, _message(11, ADMIN_ID, f"/user_info @user{HEAVY_ID}")),
+        ("/allow_posting", None, _message(12, ADMIN_ID, f"/allow_posting @user{HEAVY_ID}")),
+        ("Сообщение в группе", None, _message(13, POSTER_ID, "куплю диван", chat_id=GROUP_ID)),
+        ("Новый участник группы", None,
+         _message(14, POSTER_ID, chat_id=GROUP_ID, new_chat_members=[_user(2001)])),
+        ("Участник вышел из группы", None,
+         _message(15, POSTER_ID, chat_id=GROUP_ID, left_chat_member=_user(2002))),
+    ]
+
+    results = {}
+    try:
+        for name, prepare, update in scenarios:
+            if prepare is not None:
+                await prepare
+            with counter.count():
+                result = await dp.feed_update(bot, update)
+            results[name] = (result is not UNHANDLED, list(counter.statements))
+    finally:
+        await bot.session.close()
+    return results
+
+
+@pytest.fixture(scope="module")
+def scenario_results():
+    from sqlalchemy import make_url
+    from db_base import engine
+    # При ошибке подключения db_base молча переключается на bot_database.db
+    if engine.url != make_url(os.environ["DATABASE_URL"]):
+        pytest.fail("Не удалось создать временную базу")
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("name", list(BUDGETS))
+def test_query_budget(scenario_results, name):
+    handled, statements = scenario_results[name]
+    assert handled, f"{name}: апдейт не обработан"
+    assert len(statements) <= BUDGETS[name], (
+        f"{name}: {len(statements)} запросов при бюджете {BUDGETS[name]}\n"
+        + "\n".join(f"    {statement[:160]}" for statement in statements)
+    )
@@ -0,0 +1,187 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logging_setup import ContextQueueHandler
+
+# Легковесная трассировка апдейтов: span хендлера, SQL-запросов и вызовов Bot API.
+# Спаны пишутся в формате Chrome Trace Event (JSON-массив, одно событие на строку),
+# файл открывается в chrome://tracing, Perfetto и speedscope.
+# Незакрытая "]" в конце файла этими просмотрщиками допускается.
+
+# (trace_id, span_id) текущего спана; None — трассировка для этого кода не ведется
+_current: ContextVar[tuple[int, int] | None] = ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+_pid = os.getpid()
+
+_span_logger = logging.getLogger("tracing.spans")
+_span_logger.propagate = False
+_listener: logging.handlers.QueueListener | None = None
+
+SQL_PREVIEW = 200  # сколько символов запроса сохранять в спане
+
+
+class TraceFileHandler(logging.handlers.RotatingFileHandler):
+    """Файл с ротацией, каждый новый файл начинается с "[" — начала JSON-массива"""
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write("[\n")
+        return stream
+
+
+class TraceFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.span, ensure_ascii=False, default=str) + ","
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _emit(name: str, category: str, start_us: int, duration_us: int,
+          trace_id: int, span_id: int, parent_id: int | None, args: dict) -> None:
+    # Сериализация и запись в файл — в потоке QueueListener
+    _span_logger.info(name, extra={"span": {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": start_us,
+        "dur": duration_us,
+        "pid": _pid,
+        "tid": trace_id,  # каждый апдейт — отдельная дорожка в просмотрщике
+        "args": {"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, **args},
+    }})
+
+
+@contextmanager
+def span(name: str, category: str, **args):
+    """
+    Дочерний спан текущей трассировки. Вне трассировки ничего не записывает.
+    Работает и в потоках asyncio.to_thread: контекст копируется туда автоматически.
+    """
+    parent = _current.get()
+    if parent is None or _listener is None:
+        yield
+        return
+
+    trace_id, parent_id = parent
+    span_id = next(_ids)
+    token = _current.set((trace_id, span_id))
+    start_us = _now_us()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        _emit(name, category, start_us, int((time.perf_counter() - started) * 1_000_000),
+              trace_id, span_id, parent_id, args)
+
+
+@contextmanager
+def trace(name: str, **args):
+    """Корневой спан новой трассировки (один апдейт)"""
+    if _listener is None:
+        yield
+        return
+
+    trace_id = next(_ids)
+    token = _current.set((trace_id, trace_id))
+    start_us = _now_us()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        _emit(name, "update", start_us, int((time.perf_counter() - started) * 1_000_000),
+              trace_id, trace_id, None, args)
+
+
+class TracingMiddleware:
+    """
+    Как внешний middleware на dp.update начинает трассировку апдейта,
+    как внутренний на остальных событиях — открывает спан хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any]
+    ) -> Any:
+        if "handler" in data:
+            with span(f"handler {data['handler'].callback.__name__}", "handler"):
+                return await handler(event, data)
+
+        with trace(f"update {getattr(event, 'event_type', '')}", update_id=getattr(event, "update_id", None)):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Спан на каждый вызов Bot API через сессию бота"""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        with span(f"api {method.__api_method__}", "telegram"):
+            return await make_request(bot, method)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("trace_started", []).append((_now_us(), time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    started = conn.info.get("trace_started")
+    if parent is None or not started:
+        return
+    start_us, start = started.pop()
+    trace_id, parent_id = parent
+    _emit(f"sql {statement.split(None, 1)[0].upper()}", "sql", start_us,
+          int((time.perf_counter() - start) * 1_000_000),
+          trace_id, next(_ids), parent_id, {"statement": statement[:SQL_PREVIEW]})
+
+
+def setup_tracing(path: str, max_bytes: int, backup_count: int, engine: Engine, bot: Bot) -> None:
+    """Включает запись спанов в файл и подключает SQLAlchemy и сессию бота"""
+    global _listener
+    if _listener is not None:
+        return
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    output = TraceFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    output.setFormatter(TraceFormatter())
+
+    handler = ContextQueueHandler(queue.SimpleQueue())
+    _span_logger.handlers.clear()
+    _span_logger.addHandler(handler)
+    _span_logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    bot.session.middleware(TracingRequestMiddleware())
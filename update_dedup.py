@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import UPDATE_DEDUP_CACHE_SIZE, UPDATE_WATERMARK_FLUSH_INTERVAL, UPDATE_ID_RESET_GAP
+from db_connection import get_state_value, advance_state_value, set_state_value
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = "last_update_id"
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """
+    Внешний middleware диспетчера: отбрасывает апдейты, которые уже обрабатывались.
+
+    Недавние update_id хранятся в ограниченном LRU в памяти, а максимальный
+    принятый update_id (watermark) периодически сохраняется в bot_state.
+    После перезапуска сохраненный watermark отсекает повторную доставку
+    первой пачки апдейтов; как только принят первый новый апдейт, дубли
+    в пределах работы ловит только LRU. Проверка — O(1) без обращения
+    к базе, запись watermark идет в фоне.
+
+    Telegram может начать нумерацию заново со случайного числа (после недели
+    без апдейтов). update_id, который меньше watermark больше чем на
+    UPDATE_ID_RESET_GAP, считается новым, а watermark в базе перезаписывается.
+    """
+
+    def __init__(self, cache_size: int = UPDATE_DEDUP_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._watermark = 0  # сохраненный в базе максимум; 0 — проверка по нему уже не нужна
+        self._max_seen = 0  # максимум, принятый этим экземпляром
+        self._reset = False  # нумерация началась заново: watermark в базе надо перезаписать
+        self._dirty = asyncio.Event()
+
+    def load_watermark(self) -> None:
+        """Читает сохраненный watermark при запуске бота"""
+        try:
+            self._watermark = get_state_value(WATERMARK_KEY) or 0
+        except Exception as e:
+            logger.error(f"Не удалось прочитать watermark апдейтов: {e}")
+        self._max_seen = max(self._max_seen, self._watermark)
+        logger.info(f"Последний обработанный update_id: {self._watermark}")
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """Проверяет апдейт и, если он новый, запоминает его"""
+        if update_id in self._seen:
+            return True
+
+        if self._watermark:
+            if update_id <= self._watermark and self._watermark - update_id <= UPDATE_ID_RESET_GAP:
+                return True
+            if update_id < self._watermark:
+                logger.warning(
+                    f"update_id {update_id} намного меньше сохраненного {self._watermark}: "
+                    f"Telegram начал нумерацию заново"
+                )
+                self._max_seen = 0
+                self._reset = True
+            # Первый новый апдейт после запуска: дальше достаточно LRU
+            self._watermark = 0
+
+        self._seen[update_id] = None
+        if len(self._seen) > self.cache_size:
+            self._seen.popitem(last=False)
+        if update_id > self._max_seen:
+            self._max_seen = update_id
+            self._dirty.set()
+        return False
+
+    async def flush(self) -> None:
+        """Сохраняет watermark; после смены нумерации перезаписывает его меньшим значением"""
+        self._dirty.clear()
+        try:
+            if self._reset:
+                await asyncio.to_thread(set_state_value, WATERMARK_KEY, self._max_seen)
+                self._reset = False
+            else:
+                await asyncio.to_thread(advance_state_value, WATERMARK_KEY, self._max_seen)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить watermark апдейтов: {e}")
+            self._dirty.set()
+
+    async def run_flusher(self) -> None:
+        """Фоновая задача: записывает watermark не чаще раза в UPDATE_WATERMARK_FLUSH_INTERVAL"""
+        try:
+            while True:
+                await self._dirty.wait()
+                await self.flush()
+                await asyncio.sleep(UPDATE_WATERMARK_FLUSH_INTERVAL)
+        finally:
+            # При остановке сохраняем последнее значение, чтобы не обработать хвост повторно
+            if self._dirty.is_set():
+                await self.flush()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update) and self.is_duplicate(event.update_id):
+            logger.warning(f"Повторный апдейт {event.update_id} пропущен")
+            return None
+        return await handler(event, data)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+# Шаблоны полей и телефонный формат
+TEMPLATE = {
+    "address": r"^📍\s*Адрес:\s*(.+)$",
+    "title": r"^📝\s*Задача:\s*(.+)$",
+    "payment": r"^💵\s*Оплата:\s*(.+)$",
+    "contact": r"^☎️\s*Контакт:\s*(.+)$",
+    "extra": r"^📌\s*Примечание:\s*(.*)$",
+    "publish_at": r"^⏰\s*Публикация:\s*(.*)$",
+}
+# Обновленное регулярное выражение для телефона (строго +996XXXXXXXXX)
+PHONE_RE = re.compile(r"^\+996\d{9}$")
+
+REQUIRED_FIELDS = ["address", "title", "payment", "contact"]
+FIELD_NAMES = {
+    "address": "📍 Адрес",
+    "title": "📝 Задача",
+    "payment": "💵 Оплата",
+    "contact": "☎️ Контакт",
+}
+
+# Насколько далеко вперед можно запланировать публикацию
+PUBLISH_MAX_DAYS_AHEAD = 30
+
+# Лимит Telegram на подпись к фото (текст без фото может быть до 4096 символов)
+CAPTION_LIMIT = 1024
+
+
+def parse_vacancy_text(text: str) -> dict:
+    """Разбирает текст вакансии по шаблону TEMPLATE"""
+    data = {}
+    for line in text.strip().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        for key, pat in TEMPLATE.items():
+            m = re.match(pat, line)
+            if m:
+                data[key] = m.group(1).strip()
+                break
+    return data
+
+
+def parse_publish_at(value: str | None) -> datetime | None:
+    """
+    Разбирает время отложенной публикации: "ДД.ММ.ГГГГ ЧЧ:ММ", "ДД.ММ ЧЧ:ММ" или "ЧЧ:ММ".
+    Пустое значение — публикация сразу. При неверном формате бросает ValueError.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+
+    now = datetime.now()
+    for fmt in ("%d.%m.%Y %H:%M", "%d.%m %H:%M", "%H:%M"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%d.%m %H:%M":
+            parsed = parsed.replace(year=now.year)
+        elif fmt == "%H:%M":
+            parsed = now.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+            if parsed < now:
+                parsed += timedelta(days=1)
+        break
+    else:
+        raise ValueError("Неверный формат времени публикации. Используйте ДД.ММ.ГГГГ ЧЧ:ММ")
+
+    if parsed > now + timedelta(days=PUBLISH_MAX_DAYS_AHEAD):
+        raise ValueError(f"Публикацию можно запланировать не более чем на {PUBLISH_MAX_DAYS_AHEAD} дней вперед")
+    # Время в прошлом означает "опубликовать сразу"
+    return parsed if parsed > now else None
+
+
+def find_missing_fields(data: dict) -> list[str]:
+    """Возвращает список незаполненных обязательных полей"""
+    return [field for field in REQUIRED_FIELDS if field not in data or not data[field]]
+
+
+def validate_vacancy(data: dict) -> str | None:
+    """
+    Проверяет разобранную вакансию.
+    Возвращает текст ошибки или None, если вакансия корректна.
+    """
+    missing_fields = find_missing_fields(data)
+    if missing_fields:
+        return f"Не заполнены поля: {', '.join(FIELD_NAMES[f] for f in missing_fields)}"
+    if not PHONE_RE.match(data["contact"]):
+        return "Неверный формат телефона. Используйте формат: +996XXXXXXXXX"
+    if data.get("photo") and len(format_vacancy_text(data)) > CAPTION_LIMIT:
+        return f"С фото текст вакансии должен быть не длиннее {CAPTION_LIMIT} символов"
+    return None
+
+
+def vacancy_hash(data: dict) -> str:
+    """
+    Хеш содержимого вакансии. Учитываются только поля шаблона без лишних пробелов,
+    так что одинаковые по смыслу версии дают одинаковый хеш.
+    """
+    normalized = {
+        key: str(data.get(key) or "").strip()
+        for key in TEMPLATE
+        if key != "publish_at"
+    }
+    if data.get("photo"):
+        normalized["photo"] = data["photo"]
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def format_vacancy_text(data: dict) -> str:
+    """Текст вакансии для публикации в канале"""
+    vacancy_text = (
+        f"<b>Вакансия {data['title']}</b>\n\n"
+        f"📍 <b>Адрес:</b> {data['address']}\n"
+        f"💵 <b>Оплата:</b> {data['payment']}\n"
+        f"☎️ <b>Контакт:</b> {data['contact']}"
+    )
+
+    if data.get('extra'):
+        vacancy_text += f"\n📌 <b>Примечание:</b> {data['extra']}"
+    return vacancy_text
+
+
+def create_response_buttons(contact: str, user_id: int, username: str | None) -> InlineKeyboardMarkup:
+    """
+    Создает кнопки для отклика на вакансию
+    Args:
+        contact: Номер телефона из вакансии
+        user_id: ID пользователя, разместившего вакансию
+        username: Username пользователя, разместившего вакансию
+    Returns:
+        InlineKeyboardMarkup с кнопками для отклика
+    """
+    buttons = []
+
+    # Проверяем валидность номера телефона
+    if PHONE_RE.match(contact):
+        # Если номер валидный, добавляем кнопку WhatsApp
+        whatsapp_number = contact.replace("+", "")  # Убираем + для WhatsApp
+        buttons.append([
+            InlineKeyboardButton(
+                text="📱WhatsApp",
+                url=f"https://wa.me/{whatsapp_number}"
+            )
+        ])
+
+    # Добавляем кнопку Telegram для номера телефона
+    telegram_number = contact.replace("+", "").replace(" ", "")  # Убираем + и пробелы
+    buttons.append([
+        InlineKeyboardButton(
+            text="📨 Telegram",
+            url=f"https://t.me/+{telegram_number}"
+        )
+    ])
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)